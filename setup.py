@@ -8,6 +8,16 @@ from setuptools import setup, find_packages
 from cmake_build_extension import BuildExtension, CMakeExtension
 import os
 
+# The Python runtime: codegreen_runtime and the codegreen_* modules it imports
+RUNTIME_MODULES = [
+    'codegreen_runtime',
+    'codegreen_backend',
+    'codegreen_sysfs',
+    'codegreen_calibration',
+    'codegreen_tasks',
+    'codegreen_regions',
+]
+
 # Read version from pyproject.toml
 def get_version():
     import re
@@ -63,7 +73,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/SMART-Dal/codegreen",
     packages=find_packages(),
-    py_modules=['codegreen_runtime'],
+    py_modules=RUNTIME_MODULES,
     python_requires=">=3.8",
     install_requires=[
         "typer>=0.17.0",
@@ -93,7 +103,7 @@ setup(
     # Include the CLI binary and runtime files
     data_files=[
         ('bin', ['bin/codegreen']),
-        ('bin/runtime', ['src/instrumentation/language_runtimes/python/codegreen_runtime.py']),
+        ('bin/runtime', [f'src/instrumentation/language_runtimes/python/{module}.py' for module in RUNTIME_MODULES]),
         ('config', ['config/codegreen.json']),
     ],
     # C++ extensions for integrated builds
@@ -15,11 +15,13 @@ Features:
 """
 
 import os
+import re
 import sys
 import subprocess
 import platform
 import shutil
 import json
+import glob
 import tempfile
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Annotated, Union
@@ -79,6 +81,12 @@ class Precision(str, Enum):
     medium = "medium"
     high = "high"
 
+class MeasureMode(str, Enum):
+    """How checkpoints are collected from Python programs."""
+    instrument = "instrument"  # Rewrite the script with checkpoint calls
+    monitoring = "monitoring"  # sys.monitoring callbacks, no rewriting (Python 3.12+)
+    sampling = "sampling"      # Power-weighted stack sampling, no checkpoints
+
 def get_binary_path() -> Optional[Path]:
     """
     Get the path to the CodeGreen binary.
@@ -742,6 +750,7 @@ def measure_energy(
     timeout: Annotated[Optional[int], typer.Option("--timeout", "-t", help="Timeout in seconds")] = None,
     no_cleanup: Annotated[bool, typer.Option("--no-cleanup", help="Keep temporary files")] = False,
     is_instrumented: Annotated[bool, typer.Option("--instrumented", help="Script is already instrumented")] = False,
+    mode: Annotated[MeasureMode, typer.Option("--mode", "-m", help="Python checkpoint collection mode")] = MeasureMode.instrument,
     args: Annotated[Optional[List[str]], typer.Argument(help="Arguments to pass to the script")] = None,
 ):
     """
@@ -758,9 +767,12 @@ def measure_energy(
     • [cyan]codegreen measure python app.py --precision high --verbose[/cyan]
     • [cyan]codegreen measure python main.py --timeout 60 --output results.json[/cyan]
     • [cyan]codegreen measure python main.py --json[/cyan]
+    • [cyan]codegreen measure python main.py --mode monitoring[/cyan]
+    • [cyan]codegreen measure python main.py --mode sampling[/cyan]
     
     [bold]Sensor Types:[/bold] rapl, nvidia, amd_gpu, amd_cpu
     [bold]Precision Levels:[/bold] low, medium, high
+    [bold]Modes (Python):[/bold] instrument, monitoring, sampling
     """
     
     if not script.exists():
@@ -798,15 +810,35 @@ def measure_energy(
         # Step 2: Handle Instrumentation
         run_path = script
         temp_dir = None
+        manifest_path = None
+        owns_manifest = False
         
-        if language == Language.python and not is_instrumented:
+        if language == Language.python and mode == MeasureMode.sampling:
+            # The sampling profiler needs neither rewriting nor a manifest
+            pass
+        elif language == Language.python and mode == MeasureMode.monitoring and not is_instrumented:
+            # No rewriting: the analysis only selects which functions the runtime monitors
+            manifest_path = _get_manifest_path(script.with_name(f'{script.stem}_monitored{script.suffix}'))
+            engine.write_monitoring_manifest(
+                manifest_path, result.instrumentation_points, language.value, source_file=str(script)
+            )
+            owns_manifest = True
+        elif language == Language.python and not is_instrumented:
             # Python MUST be pre-instrumented because the measurement is done via runtime hooks
             if not json_output:
                 console.print(f"\n[green]Instrumenting Python code...[/green]")
-            instrumented_code = engine.instrument_code(source_code, result.instrumentation_points, language.value)
             run_path = script.with_name(f'{script.stem}_instrumented{script.suffix}')
+            manifest_path = _get_manifest_path(run_path)
+            instrumented_code = engine.instrument_code(
+                source_code, result.instrumentation_points, language.value,
+                manifest_path=manifest_path, source_file=str(script)
+            )
             with open(run_path, 'w', encoding='utf-8') as f:
                 f.write(instrumented_code)
+            owns_manifest = True
+        elif language == Language.python and _get_manifest_path(script).exists():
+            # Pre-instrumented script run with its manifest alongside it
+            manifest_path = _get_manifest_path(script)
         elif not is_instrumented:
             # For C/C++/Java, we let the C++ binary handle instrumentation and execution
             # This avoids double-instrumentation bugs and handles Java filename requirements
@@ -819,8 +851,13 @@ def measure_energy(
                 if not json_output:
                     console.print(f"\n[green]Running energy measurement...[/green]")
                 measurement_result = _run_energy_measurement(
-                    run_path, language, sensors, verbose and not json_output, timeout, args, json_output
+                    run_path, language, sensors, verbose and not json_output, timeout, args, json_output,
+                    mode=mode, manifest_path=manifest_path
                 )
+                if manifest_path:
+                    _resolve_process_checkpoint_names(measurement_result, manifest_path)
+                _apply_overhead_compensation(measurement_result)
+                _apply_thread_breakdown(measurement_result)
                 
                 if output:
                     _save_measurement_results(output, result, measurement_result)
@@ -844,13 +881,28 @@ def measure_energy(
                 }
                 print(json.dumps(combined_results, indent=2))
             else:
+                if measurement_result and measurement_result.get('functions'):
+                    _display_function_energy(measurement_result['functions'], measurement_result['calibration'])
+                if measurement_result and measurement_result.get('thread_energy'):
+                    _display_thread_energy(measurement_result['thread_energy'])
+                if measurement_result and measurement_result.get('aggregates'):
+                    _display_checkpoint_aggregates(measurement_result['aggregates'])
+                if measurement_result and measurement_result.get('sampling'):
+                    _display_sampling_profile(measurement_result['sampling'])
+                if measurement_result and measurement_result.get('processes'):
+                    _display_process_summary(measurement_result['processes'])
                 if measurement_result and measurement_result.get('success'):
                     console.print(f"\n[green]✓ CodeGreen measurement completed successfully![/green]")
         finally:
             # Cleanup
-            if not no_cleanup and run_path != script:
-                if run_path.exists():
+            if not no_cleanup:
+                if run_path != script and run_path.exists():
                     os.remove(run_path)
+                if owns_manifest and manifest_path.exists():
+                    os.remove(manifest_path)
+                if owns_manifest:
+                    for shard in _process_shards(manifest_path):
+                        os.remove(shard)
         
     except FileNotFoundError as e:
         if not json_output:
@@ -876,27 +928,478 @@ def _should_run_actual_measurement(sensors: Optional[List[SensorType]]) -> bool:
     return binary_path is not None and binary_path.exists()
 
 
-def _parse_runtime_measurements(output: str) -> List[Dict[str, Any]]:
-    """Extract structured energy measurements from process output"""
-    measurements = []
+def _get_manifest_path(instrumented_path: Path) -> Path:
+    """Checkpoint manifest location for an instrumented script"""
+    return instrumented_path.with_name(f'{instrumented_path.stem}.manifest.json')
+
+
+def _resolve_checkpoint_names(measurements: List[Dict[str, Any]], manifest_path: Path) -> None:
+    """Replace integer checkpoint IDs with their 'type:name:id' signal names in place"""
+    from ..instrumentation.language_engine import load_checkpoint_manifest
     
-    # Look for the JSON blob between markers
-    start_marker = "--- CODEGREEN_RESULT_START ---"
-    end_marker = "--- CODEGREEN_RESULT_END ---"
+    try:
+        manifest = load_checkpoint_manifest(manifest_path)
+    except (OSError, ValueError):
+        return
     
-    if start_marker in output and end_marker in output:
-        try:
-            start_idx = output.find(start_marker) + len(start_marker)
-            end_idx = output.find(end_marker)
-            json_str = output[start_idx:end_idx].strip()
-            
-            data = json.loads(json_str)
-            measurements = data.get("measurements", [])
-        except Exception:
-            # Silently fail if parsing fails
-            pass
-            
-    return measurements
+    for measurement in measurements:
+        numeric_id, sep, suffix = measurement.get('checkpoint_id', '').partition('#')
+        if not numeric_id.isdigit():
+            continue
+        entry = manifest.get(int(numeric_id))
+        if entry is None:
+            continue
+        measurement['checkpoint_id'] = f"{entry['type']}:{entry['name']}:{entry['checkpoint_id']}{sep}{suffix}"
+        measurement['line'] = entry.get('line')
+
+
+# Run the unmodified script under sys.monitoring or the sampling profiler (see codegreen_runtime)
+_MONITORING_BOOTSTRAP = "import sys, codegreen_runtime; codegreen_runtime.run_monitored(sys.argv[1], sys.argv[2:])"
+_SAMPLING_BOOTSTRAP = "import sys, codegreen_runtime; codegreen_runtime.run_sampled(sys.argv[1], sys.argv[2:])"
+
+
+def _read_runtime_results(result_path: Path) -> Dict[str, Any]:
+    """Load the results the runtime wrote to its result file"""
+    try:
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # No checkpoints recorded, or the program died before reporting
+        return {}
+
+
+def _process_shards(path: Path) -> List[Path]:
+    """Per-process shards (<path>.<pid>) that child processes wrote beside path"""
+    prefix = f'{path.name}.'
+    return sorted(
+        (p for p in path.parent.glob(f'{glob.escape(path.name)}.*') if p.name[len(prefix):].isdigit()),
+        key=lambda p: int(p.name[len(prefix):])
+    )
+
+
+def _merge_process_results(result_path: Path) -> Dict[str, Any]:
+    """
+    Merge the measured process's results with the shards of its child processes.
+
+    Checkpoints, aggregates and thread table entries are tagged with the PID of
+    the process that recorded them; when children reported, 'processes'
+    summarises each one.
+    """
+    reports = [_read_runtime_results(result_path)]
+    reports.extend(_read_runtime_results(shard) for shard in _process_shards(result_path))
+    reports = [r for r in reports if r]
+    if not reports:
+        return {}
+
+    merged: Dict[str, Any] = {'measurements': []}
+    processes = []
+    for report in reports:
+        pid = report.get('pid')
+        measurements = report.get('measurements', [])
+        for section in ('measurements', 'aggregates', 'threads'):
+            for entry in report.get(section, []):
+                if pid is not None:
+                    entry['pid'] = pid
+                merged.setdefault(section, []).append(entry)
+        # Other sections describe the whole run and come from the measured process
+        for section, value in report.items():
+            if section not in merged and section not in ('pid', 'parent_pid'):
+                merged[section] = value
+        ordered = sorted(measurements, key=lambda m: m['timestamp'])
+        processes.append({
+            'pid': pid,
+            'parent_pid': report.get('parent_pid'),
+            'checkpoints': len(measurements),
+            'aggregates': len(report.get('aggregates', [])),
+            'duration_s': (ordered[-1]['timestamp'] - ordered[0]['timestamp']) / 1e9 if ordered else 0.0,
+            'energy_joules': ordered[-1]['joules'] - ordered[0]['joules'] if ordered else 0.0,
+        })
+    if len(processes) > 1:
+        merged['processes'] = processes
+    return merged
+
+
+def _resolve_process_checkpoint_names(measurement: Dict[str, Any], manifest_path: Path) -> None:
+    """Resolve integer checkpoint IDs, using a child's own manifest shard where it wrote one"""
+    shards = {int(p.name.rpartition('.')[2]): p for p in _process_shards(manifest_path)}
+    for section in ('checkpoints', 'aggregates'):
+        by_manifest: Dict[Path, List[Dict[str, Any]]] = {}
+        for entry in measurement.get(section) or []:
+            by_manifest.setdefault(shards.get(entry.get('pid'), manifest_path), []).append(entry)
+        for path, entries in by_manifest.items():
+            _resolve_checkpoint_names(entries, path)
+
+
+def _function_energy(checkpoints: List[Dict[str, Any]], calibration: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Per-function inclusive and exclusive energy from resolved enter/exit checkpoints.
+
+    The calibrated cost of one checkpoint is subtracted once for the span's own
+    enter/exit pair and once for every checkpoint recorded inside it on the
+    same thread; exclusive energy is inclusive energy minus that of direct callees.
+    Checkpoints that carry per-domain energy ('domains') also give each function
+    a per-domain breakdown; the calibration only covers the total, so domain
+    figures are uncompensated.
+    """
+    cost_joules = calibration.get('checkpoint_joules', 0.0)
+    cost_ns = calibration.get('checkpoint_ns', 0.0)
+    by_thread: Dict[str, List[Dict[str, Any]]] = {}
+    for checkpoint in checkpoints:
+        base, _, suffix = checkpoint.get('checkpoint_id', '').rpartition('#inv_')
+        kind, _, rest = base.partition(':')
+        by_thread.setdefault(suffix.rpartition('_t')[2], []).append((kind, rest.partition(':')[0], checkpoint))
+
+    # function -> [calls, raw J, inclusive J, exclusive J, inclusive ns]
+    totals: Dict[str, List[float]] = {}
+    # function -> domain -> [inclusive J, exclusive J]
+    domain_totals: Dict[str, Dict[str, List[float]]] = {}
+    for records in by_thread.values():
+        records.sort(key=lambda r: r[2]['timestamp'])
+        # [function, enter checkpoint, index of enter, callees' inclusive J, callees' J per domain]
+        frames: List[List[Any]] = []
+        for index, (kind, function, checkpoint) in enumerate(records):
+            if kind == 'enter':
+                frames.append([function, checkpoint, index, 0.0, {}])
+                continue
+            if kind != 'exit':
+                continue
+            # Frames left open by exceptions are dropped on the way down
+            while frames:
+                name, enter, enter_index, callees, domain_callees = frames.pop()
+                if name != function:
+                    continue
+                overhead = index - enter_index
+                raw = checkpoint['joules'] - enter['joules']
+                inclusive = max(0.0, raw - overhead * cost_joules)
+                duration = max(0.0, checkpoint['timestamp'] - enter['timestamp'] - overhead * cost_ns)
+                stats = totals.setdefault(function, [0, 0.0, 0.0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += raw
+                stats[2] += inclusive
+                stats[3] += max(0.0, inclusive - callees)
+                stats[4] += duration
+                if frames:
+                    frames[-1][3] += inclusive
+                enter_domains = enter.get('domains') or {}
+                for domain, joules in (checkpoint.get('domains') or {}).items():
+                    if domain not in enter_domains:
+                        continue
+                    domain_inclusive = max(0.0, joules - enter_domains[domain])
+                    domain_stats = domain_totals.setdefault(function, {}).setdefault(domain, [0.0, 0.0])
+                    domain_stats[0] += domain_inclusive
+                    domain_stats[1] += max(0.0, domain_inclusive - domain_callees.get(domain, 0.0))
+                    if frames:
+                        frames[-1][4][domain] = frames[-1][4].get(domain, 0.0) + domain_inclusive
+                break
+
+    functions = [
+        {
+            'name': function,
+            'calls': stats[0],
+            'raw_joules': stats[1],
+            'inclusive_joules': stats[2],
+            'exclusive_joules': stats[3],
+            'inclusive_ns': stats[4],
+        }
+        for function, stats in totals.items()
+    ]
+    for function in functions:
+        domains = domain_totals.get(function['name'])
+        if domains:
+            function['domains'] = {
+                domain: {'inclusive_joules': stats[0], 'exclusive_joules': stats[1]}
+                for domain, stats in sorted(domains.items())
+            }
+    functions.sort(key=lambda f: f['exclusive_joules'], reverse=True)
+    return functions
+
+
+def _compensate_aggregates(aggregates: List[Dict[str, Any]], calibration: Dict[str, Any]) -> None:
+    """
+    Subtract one calibrated checkpoint per call from aggregated spans in place.
+
+    Aggregation keeps no per-call spans, so checkpoints of callees stay included.
+    """
+    for section, cost in (('energy_joules', calibration.get('checkpoint_joules', 0.0)),
+                          ('duration_ns', calibration.get('checkpoint_ns', 0.0))):
+        for aggregate in aggregates:
+            stats = aggregate[section]
+            stats['sum'] = max(0.0, stats['sum'] - aggregate['count'] * cost)
+            for key in ('min', 'max', 'mean'):
+                stats[key] = max(0.0, stats[key] - cost)
+
+
+def _apply_overhead_compensation(measurement: Dict[str, Any]) -> None:
+    """Remove the calibrated checkpoint cost from resolved checkpoints and aggregates"""
+    calibration = measurement.get('calibration')
+    if not calibration:
+        return
+    if measurement.get('checkpoints'):
+        functions = _function_energy(measurement['checkpoints'], calibration)
+        if functions:
+            measurement['functions'] = functions
+    if measurement.get('aggregates'):
+        _compensate_aggregates(measurement['aggregates'], calibration)
+
+
+def _display_function_energy(functions: List[Dict[str, Any]], calibration: Dict[str, Any], limit: int = 15) -> None:
+    """Print per-function energy after checkpoint overhead compensation"""
+    console.print(
+        f"\n[bold]Function energy[/bold] ({len(functions)} functions, "
+        f"{calibration['checkpoint_ns']:.0f} ns / {calibration['checkpoint_joules'] * 1e6:.3f} µJ "
+        f"per checkpoint subtracted)"
+    )
+    table = Table()
+    table.add_column("Function", style="green")
+    table.add_column("Calls", style="cyan", justify="right")
+    table.add_column("Exclusive J", style="yellow", justify="right")
+    table.add_column("Inclusive J", style="yellow", justify="right")
+    table.add_column("Uncompensated J", style="dim", justify="right")
+    table.add_column("Inclusive ms", style="blue", justify="right")
+    # Exclusive energy per domain (e.g. intel_rapl/dram), uncompensated
+    domains = sorted({domain for function in functions[:limit] for domain in function.get('domains', {})})
+    for domain in domains:
+        table.add_column(f"{domain} excl. J", style="magenta", justify="right")
+
+    for function in functions[:limit]:
+        function_domains = function.get('domains', {})
+        table.add_row(
+            function['name'],
+            str(function['calls']),
+            f"{function['exclusive_joules']:.6f}",
+            f"{function['inclusive_joules']:.6f}",
+            f"{function['raw_joules']:.6f}",
+            f"{function['inclusive_ns'] / 1e6:.3f}",
+            *(f"{function_domains[domain]['exclusive_joules']:.6f}" if domain in function_domains else "-"
+              for domain in domains)
+        )
+
+    console.print(table)
+
+
+# Thread tag of an exported checkpoint ID ("...#inv_N_t<key>"), or '' when it has none
+_THREAD_TAG = re.compile(r'^.*?(?:#inv_\d+_t(\d+))?$', re.MULTILINE)
+
+
+def _thread_tags(checkpoint_ids: List[str]) -> List[str]:
+    """Thread tags of all checkpoint IDs, parsed in a single regex pass"""
+    if not checkpoint_ids:
+        return []
+    return _THREAD_TAG.findall('\n'.join(checkpoint_ids))
+
+
+def _thread_pool(name: str) -> str:
+    """Pool a thread belongs to: executor workers are named '<prefix>_<n>'"""
+    return re.sub(r'_\d+$', '', name)
+
+
+def _thread_energy(checkpoints: List[Dict[str, Any]], threads: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Per-thread and per-pool energy from checkpoint thread tags and the runtime's thread table.
+
+    Package energy is shared by every thread of a process, so each thread is
+    attributed the process's energy in proportion to its CPU time. Span energy
+    (from the thread's first to its last checkpoint) is kept alongside; spans
+    of concurrent threads overlap.
+    """
+    # (pid, key) -> [name, checkpoints, CPU ns, first checkpoint, last checkpoint]
+    rows: Dict[Any, List[Any]] = {}
+    for entry in threads:
+        # Tasks outside the Python runtime tag no checkpoints and are keyed by native ID
+        key = entry['key'] or f"task-{entry['native_id']}"
+        thread = rows.setdefault((entry.get('pid'), key), [entry['name'], 0, 0, None, None])
+        thread[0] = entry['name']
+        thread[2] += entry.get('cpu_ns') or 0
+
+    def widen(span, first, checkpoint):
+        # span[first] and span[first + 1] are the earliest and latest checkpoints seen
+        if span[first] is None or checkpoint['timestamp'] < span[first]['timestamp']:
+            span[first] = checkpoint
+        if span[first + 1] is None or checkpoint['timestamp'] > span[first + 1]['timestamp']:
+            span[first + 1] = checkpoint
+
+    # pid -> [first checkpoint, last checkpoint]
+    processes: Dict[Any, List[Any]] = {}
+    tags = _thread_tags([c.get('checkpoint_id', '') for c in checkpoints])
+    for checkpoint, tag in zip(checkpoints, tags):
+        pid = checkpoint.get('pid')
+        widen(processes.setdefault(pid, [None, None]), 0, checkpoint)
+        if tag:
+            thread = rows.setdefault((pid, int(tag)), [f't{tag}', 0, 0, None, None])
+            thread[1] += 1
+            widen(thread, 3, checkpoint)
+
+    def energy(first, last):
+        return last['joules'] - first['joules'] if first else 0.0
+
+    cpu_totals: Dict[Any, int] = {}
+    for (pid, _), thread in rows.items():
+        cpu_totals[pid] = cpu_totals.get(pid, 0) + thread[2]
+
+    thread_rows = []
+    pools: Dict[Any, Dict[str, Any]] = {}
+    for (pid, key), (name, count, cpu_ns, first, last) in rows.items():
+        share = cpu_ns / cpu_totals[pid] if cpu_totals[pid] else 0.0
+        joules = energy(*processes.get(pid, [None, None])) * share
+        thread_rows.append({
+            'pid': pid,
+            'thread': name,
+            'pool': _thread_pool(name),
+            'key': key,
+            'checkpoints': count,
+            'cpu_s': cpu_ns / 1e9,
+            'cpu_share': share,
+            'joules': joules,
+            'span_joules': energy(first, last),
+            'span_s': (last['timestamp'] - first['timestamp']) / 1e9 if first else 0.0,
+        })
+        pool = pools.setdefault((pid, _thread_pool(name)), {
+            'pid': pid, 'pool': _thread_pool(name), 'threads': 0, 'checkpoints': 0, 'cpu_s': 0.0, 'joules': 0.0,
+        })
+        pool['threads'] += 1
+        pool['checkpoints'] += count
+        pool['cpu_s'] += cpu_ns / 1e9
+        pool['joules'] += joules
+
+    thread_rows.sort(key=lambda t: t['joules'], reverse=True)
+    return {
+        'threads': thread_rows,
+        'pools': sorted(pools.values(), key=lambda p: p['joules'], reverse=True),
+    }
+
+
+def _apply_thread_breakdown(measurement: Dict[str, Any]) -> None:
+    """Add per-thread and per-pool energy when the runtime reported its thread table"""
+    if measurement.get('threads') and measurement.get('checkpoints'):
+        measurement['thread_energy'] = _thread_energy(measurement['checkpoints'], measurement['threads'])
+
+
+def _display_thread_energy(thread_energy: Dict[str, List[Dict[str, Any]]], limit: int = 15) -> None:
+    """Print the threads and thread pools that were attributed the most energy"""
+    pools = [p for p in thread_energy['pools'] if p['threads'] > 1]
+    if pools:
+        console.print(f"\n[bold]Thread pool energy[/bold] ({len(pools)} pools)")
+        table = Table(caption="Energy: each process's package energy split by CPU time")
+        table.add_column("Pool", style="green")
+        table.add_column("Threads", style="cyan", justify="right")
+        table.add_column("Checkpoints", style="cyan", justify="right")
+        table.add_column("CPU s", style="blue", justify="right")
+        table.add_column("Energy J", style="yellow", justify="right")
+        for pool in pools[:limit]:
+            table.add_row(
+                pool['pool'],
+                str(pool['threads']),
+                str(pool['checkpoints']),
+                f"{pool['cpu_s']:.3f}",
+                f"{pool['joules']:.4f}"
+            )
+        console.print(table)
+
+    threads = thread_energy['threads']
+    console.print(f"\n[bold]Thread energy[/bold] ({len(threads)} threads)")
+    table = Table(caption="Energy: each process's package energy split by CPU time; span energy overlaps between threads")
+    table.add_column("Thread", style="green")
+    table.add_column("PID", style="dim", justify="right")
+    table.add_column("Checkpoints", style="cyan", justify="right")
+    table.add_column("CPU s", style="blue", justify="right")
+    table.add_column("CPU %", style="blue", justify="right")
+    table.add_column("Energy J", style="yellow", justify="right")
+    table.add_column("Span J", style="dim", justify="right")
+    for thread in threads[:limit]:
+        table.add_row(
+            thread['thread'],
+            str(thread['pid'] or ''),
+            str(thread['checkpoints']),
+            f"{thread['cpu_s']:.3f}",
+            f"{thread['cpu_share'] * 100:.1f}",
+            f"{thread['joules']:.4f}",
+            f"{thread['span_joules']:.4f}"
+        )
+    console.print(table)
+
+
+def _display_process_summary(processes: List[Dict[str, Any]]) -> None:
+    """Print per-process checkpoint counts when the program started child processes"""
+    console.print(f"\n[bold]Processes[/bold] ({len(processes)} reported)")
+    table = Table(caption="Energy: system-wide, between each process's first and last checkpoint")
+    table.add_column("PID", style="green", justify="right")
+    table.add_column("Parent", style="dim", justify="right")
+    table.add_column("Checkpoints", style="cyan", justify="right")
+    table.add_column("Duration s", style="blue", justify="right")
+    table.add_column("Energy J", style="yellow", justify="right")
+
+    for process in processes:
+        table.add_row(
+            str(process['pid']),
+            str(process['parent_pid']),
+            str(process['checkpoints'] or process['aggregates']),
+            f"{process['duration_s']:.3f}",
+            f"{process['energy_joules']:.4f}"
+        )
+
+    console.print(table)
+
+
+def _display_checkpoint_aggregates(aggregates: List[Dict[str, Any]], limit: int = 15) -> None:
+    """Print per-function energy statistics from an aggregation run"""
+    console.print(f"\n[bold]Aggregated checkpoint energy[/bold] ({len(aggregates)} functions)")
+    table = Table()
+    table.add_column("Checkpoint", style="green")
+    table.add_column("Calls", style="cyan", justify="right")
+    table.add_column("Total J", style="yellow", justify="right")
+    table.add_column("Mean J", style="yellow", justify="right")
+    table.add_column("Std J", style="yellow", justify="right")
+    table.add_column("Mean ms", style="blue", justify="right")
+
+    ranked = sorted(aggregates, key=lambda a: a['energy_joules']['sum'], reverse=True)
+    for aggregate in ranked[:limit]:
+        energy = aggregate['energy_joules']
+        table.add_row(
+            aggregate['checkpoint_id'],
+            str(aggregate['count']),
+            f"{energy['sum']:.4f}",
+            f"{energy['mean']:.6f}",
+            f"{energy['variance'] ** 0.5:.6f}",
+            f"{aggregate['duration_ns']['mean'] / 1e6:.3f}"
+        )
+
+    console.print(table)
+
+
+def _display_sampling_profile(sampling: Dict[str, Any], limit: int = 15) -> None:
+    """Print the functions that drew the most energy in a sampling run"""
+    console.print(
+        f"\n[bold]Sampled energy profile[/bold] "
+        f"({sampling.get('samples', 0)} samples, {sampling.get('total_joules', 0.0):.3f} J)"
+    )
+    table = Table()
+    table.add_column("Function", style="green")
+    table.add_column("Location", style="dim")
+    table.add_column("Self J", style="yellow", justify="right")
+    table.add_column("Total J", style="yellow", justify="right")
+    table.add_column("Samples", style="cyan", justify="right")
+
+    for function in sampling.get('functions', [])[:limit]:
+        table.add_row(
+            function['name'],
+            f"{Path(function['file']).name}:{function['line']}",
+            f"{function['self_joules']:.4f}",
+            f"{function['total_joules']:.4f}",
+            str(function['self_samples'])
+        )
+
+    console.print(table)
+
+
+_COROUTINE_DEF = re.compile(r'^\s*async\s+def\s', re.MULTILINE)
+
+
+def _defines_coroutines(script_path: Path) -> bool:
+    """Whether a Python script defines coroutine functions"""
+    try:
+        return bool(_COROUTINE_DEF.search(script_path.read_text(errors='replace')))
+    except OSError:
+        return False
 
 
 def _run_energy_measurement(
@@ -907,7 +1410,9 @@ def _run_energy_measurement(
     timeout: Optional[int],
     args: Optional[List[str]],
     json_output: bool = False,
-    no_cleanup: bool = False
+    no_cleanup: bool = False,
+    mode: MeasureMode = MeasureMode.instrument,
+    manifest_path: Optional[Path] = None
 ) -> Dict[str, Any]:
     """Run actual energy measurement on instrumented code"""
 
@@ -918,7 +1423,17 @@ def _run_energy_measurement(
         if not runtime_path and not json_output:
             console.print("[yellow]Warning: Runtime module path not found, execution may fail[/yellow]")
 
-        cmd = ['python3', str(instrumented_path)]
+        if mode == MeasureMode.monitoring:
+            cmd = ['python3', '-c', _MONITORING_BOOTSTRAP, str(instrumented_path)]
+        elif mode == MeasureMode.sampling:
+            cmd = ['python3', '-c', _SAMPLING_BOOTSTRAP, str(instrumented_path)]
+        else:
+            cmd = ['python3', str(instrumented_path)]
+        if manifest_path:
+            env['CODEGREEN_MANIFEST_FILE'] = str(manifest_path)
+        # Coroutines share threads, so checkpoints are keyed by asyncio task
+        if 'CODEGREEN_ASYNC_TASKS' not in env and _defines_coroutines(instrumented_path):
+            env['CODEGREEN_ASYNC_TASKS'] = '1'
         if args:
             cmd.extend(args)
 
@@ -949,58 +1464,42 @@ def _run_energy_measurement(
         if args:
             cmd.extend(args)
     
+    # Results come back through a side-channel file, so the program's output is
+    # streamed straight through instead of being captured and scraped
+    fd, result_file = tempfile.mkstemp(prefix='codegreen_result_', suffix='.json')
+    os.close(fd)
+    result_path = Path(result_file)
+    env['CODEGREEN_RESULT_FILE'] = str(result_path)
+
     try:
+        if verbose:
+            console.print(f"Command: [dim]{' '.join(cmd)}[/dim]")
+
+        # Keep our own stdout clean for the JSON report
+        result = subprocess.run(
+            cmd,
+            stdout=sys.stderr if json_output else None,
+            timeout=timeout,
+            env=env
+        )
+        runtime_results = _merge_process_results(result_path)
+
         if not json_output:
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                console=console,
-            ) as progress:
-                task = progress.add_task("Running energy measurement...", total=None)
-                
-                if verbose:
-                    console.print(f"Command: [dim]{' '.join(cmd)}[/dim]")
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    env=env
-                )
-                
-                progress.update(task, completed=True)
-                
-                if result.returncode == 0:
-                    console.print("[green]✓ Energy measurement completed![/green]")
-                    measurements = _parse_runtime_measurements(result.stdout)
-                    return {
-                        'success': True, 
-                        'output': result.stdout,
-                        'checkpoints': measurements
-                    }
-                else:
-                    console.print(f"[yellow]Warning: Measurement had issues (exit code {result.returncode})[/yellow]")
-                    if verbose and result.stderr:
-                        console.print(f"[dim]Stderr: {result.stderr}[/dim]")
-                    return {'success': False, 'error': result.stderr, 'output': result.stdout}
-        else:
-            # Silent execution for JSON output
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                env=env
-            )
-            measurements = _parse_runtime_measurements(result.stdout)
-            return {
-                'success': result.returncode == 0,
-                'output': result.stdout,
-                'error': result.stderr if result.returncode != 0 else None,
-                'returncode': result.returncode,
-                'checkpoints': measurements
-            }
+            if result.returncode == 0:
+                console.print("[green]✓ Energy measurement completed![/green]")
+            else:
+                console.print(f"[yellow]Warning: Measurement had issues (exit code {result.returncode})[/yellow]")
+
+        measurement = {
+            'success': result.returncode == 0,
+            'error': f"exit code {result.returncode}" if result.returncode != 0 else None,
+            'returncode': result.returncode,
+            'checkpoints': runtime_results.get('measurements', [])
+        }
+        for section in ('aggregates', 'sampling', 'processes', 'calibration', 'threads'):
+            if section in runtime_results:
+                measurement[section] = runtime_results[section]
+        return measurement
                 
     except subprocess.TimeoutExpired:
         if not json_output:
@@ -1010,6 +1509,10 @@ def _run_energy_measurement(
         if not json_output:
             console.print(f"[red]Energy measurement failed: {e}[/red]")
         return {'success': False, 'error': str(e)}
+    finally:
+        result_path.unlink(missing_ok=True)
+        for shard in _process_shards(result_path):
+            shard.unlink(missing_ok=True)
 
 
 def _save_measurement_results(
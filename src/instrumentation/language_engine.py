@@ -13,6 +13,7 @@ This engine handles:
 - Performance optimization analysis
 """
 
+import json
 import logging
 import time
 import re
@@ -42,6 +43,15 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Checkpoint type passed to the runtime for each instrumentation point type
+# (mirrors the third argument of the string-based checkpoint templates)
+RUNTIME_CHECKPOINT_TYPES = {
+    'function_enter': 'enter',
+    'function_exit': 'exit',
+}
+
+CHECKPOINT_MANIFEST_VERSION = 1
+
 
 @dataclass
 class InstrumentationPoint:
@@ -61,6 +71,7 @@ class InstrumentationPoint:
     insertion_mode: str = 'before'  # 'before', 'after', 'inside_start', 'inside_end'
     node: Optional['Node'] = None  # Tree-sitter node for precise AST-based operations
     priority: int = 999  # Priority for deduplication (lower = higher priority)
+    numeric_id: Optional[int] = None  # Dense integer ID emitted into instrumented code
     
     @property
     def is_energy_intensive(self) -> bool:
@@ -308,6 +319,8 @@ class LanguageAgnosticInstrumentationGenerator:
         # to avoid issues with literal braces in templates (like Java class_enter)
         instrumentation_code = template
         instrumentation_code = instrumentation_code.replace("{checkpoint_id}", point.id)
+        if point.numeric_id is not None:
+            instrumentation_code = instrumentation_code.replace("{numeric_id}", str(point.numeric_id))
         instrumentation_code = instrumentation_code.replace("{name}", point.name)
         instrumentation_code = instrumentation_code.replace("{function_name}", point.name)
         instrumentation_code = instrumentation_code.replace("{loop_name}", point.name)
@@ -2032,15 +2045,23 @@ class LanguageEngine:
         self, 
         source_code: str, 
         points: List[InstrumentationPoint], 
-        language: str
+        language: str,
+        manifest_path: Optional[Union[str, Path]] = None,
+        source_file: Optional[str] = None
     ) -> str:
         """
         Instrument source code with measurement calls at specified points.
         
+        Every emitted point is assigned a dense integer ID (``numeric_id``) so
+        the runtime only has to record integers. The ID -> checkpoint mapping
+        is written to ``manifest_path`` and resolved when the report is built.
+        
         Args:
             source_code: Original source code
             points: Instrumentation points to add
             language: Language identifier
+            manifest_path: Where to write the checkpoint manifest (optional)
+            source_file: Original source path recorded in the manifest
             
         Returns:
             Instrumented source code with measurement calls
@@ -2050,6 +2071,10 @@ class LanguageEngine:
             logger.warning("No points to instrument")
             return source_code
         
+        points = self._assign_numeric_ids(points)
+        if manifest_path is not None:
+            self.write_checkpoint_manifest(manifest_path, points, language, source_file)
+        
         # Use AST-based instrumentation if tree-sitter is available
         if TREE_SITTER_AVAILABLE:
             result = self._instrument_code_ast_based(source_code, points, language)
@@ -2063,6 +2088,89 @@ class LanguageEngine:
             logger.warning("Tree-sitter unavailable, using legacy line-based instrumentation")
             return self._instrument_code_legacy(source_code, points, language)
     
+    def _assign_numeric_ids(self, points: List[InstrumentationPoint]) -> List[InstrumentationPoint]:
+        """Deduplicate points and number them densely in source order"""
+        unique_points = sorted(
+            self._deduplicate_checkpoints(points),
+            key=lambda p: (p.line, p.column, p.type)
+        )
+        for numeric_id, point in enumerate(unique_points):
+            point.numeric_id = numeric_id
+        return unique_points
+    
+    def build_checkpoint_manifest(
+        self,
+        points: List[InstrumentationPoint],
+        language: str,
+        source_file: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the numeric ID -> checkpoint mapping for instrumented points"""
+        checkpoints = []
+        for point in points:
+            if point.numeric_id is None:
+                continue
+            checkpoints.append({
+                'id': point.numeric_id,
+                'checkpoint_id': point.id,
+                'type': RUNTIME_CHECKPOINT_TYPES.get(point.type, point.type),
+                'point_type': point.type,
+                'name': point.name,
+                'line': point.line,
+                'column': point.column,
+                'file': source_file,
+            })
+        return {
+            'version': CHECKPOINT_MANIFEST_VERSION,
+            'language': language,
+            'source_file': source_file,
+            'checkpoints': checkpoints,
+        }
+    
+    def write_checkpoint_manifest(
+        self,
+        manifest_path: Union[str, Path],
+        points: List[InstrumentationPoint],
+        language: str,
+        source_file: Optional[str] = None
+    ) -> Path:
+        """Write the checkpoint manifest for instrumented points as JSON"""
+        manifest_path = Path(manifest_path)
+        manifest = self.build_checkpoint_manifest(points, language, source_file)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"Wrote checkpoint manifest with {len(manifest['checkpoints'])} entries to {manifest_path}")
+        return manifest_path
+
+    def write_monitoring_manifest(
+        self,
+        manifest_path: Union[str, Path],
+        points: List[InstrumentationPoint],
+        language: str,
+        source_file: Optional[str] = None
+    ) -> Path:
+        """
+        Write the function selection for sys.monitoring mode as a manifest.
+
+        No code is rewritten: the runtime enables callbacks only for the
+        functions listed here (plus imported non-stdlib modules), assigns
+        checkpoint IDs to code objects as they run and fills in the
+        'checkpoints' list at exit.
+        """
+        manifest_path = Path(manifest_path)
+        functions = sorted({p.name for p in points if p.type in RUNTIME_CHECKPOINT_TYPES and p.name})
+        manifest = {
+            'version': CHECKPOINT_MANIFEST_VERSION,
+            'language': language,
+            'source_file': source_file,
+            'mode': 'monitoring',
+            'functions': functions,
+            'checkpoints': [],
+        }
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"Wrote monitoring manifest selecting {len(functions)} functions to {manifest_path}")
+        return manifest_path
+
     def _get_parser(self, language: str) -> Optional[Parser]:
         """Get parser for the specified language"""
         return self._parsers.get(language)
@@ -2231,4 +2339,10 @@ def instrument_code(source_code: str, checkpoints: List[Dict], language: str) ->
         )
         points.append(point)
     
-    return engine.instrument_code(source_code, points, language)
\ No newline at end of file
+    return engine.instrument_code(source_code, points, language)
+
+def load_checkpoint_manifest(manifest_path: Union[str, Path]) -> Dict[int, Dict[str, Any]]:
+    """Load a checkpoint manifest written by instrument_code, keyed by numeric ID"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {entry['id']: entry for entry in manifest.get('checkpoints', [])}
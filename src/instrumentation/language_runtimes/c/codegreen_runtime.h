@@ -5,6 +5,7 @@
 extern "C" {
 #endif
 
+#include <stddef.h>
 #include <stdint.h>
 
 /*
@@ -16,7 +17,8 @@ extern "C" {
 
 /**
  * Initialize the energy measurement backend.
- * Returns 1 on success, 0 on failure.
+ * Returns 1 on success, 0 on failure (including when no energy provider
+ * starts; checkpoint calls are then dropped).
  */
 int nemb_initialize();
 
@@ -26,6 +28,188 @@ int nemb_initialize();
  */
 void nemb_mark_checkpoint(const char* name);
 
+/**
+ * Mark an integer checkpoint in the energy measurement stream.
+ * Lock-free once the meter is running: records go to a per-thread ring.
+ * @param id Dense checkpoint ID from the instrumentation manifest
+ */
+void nemb_mark_checkpoint_id(uint32_t id);
+
+/**
+ * Intern a checkpoint name once; the returned ID can be passed to
+ * nemb_mark_checkpoint_id() and the batch and context entry points.
+ * Returns 0 when the backend is unavailable.
+ */
+uint32_t nemb_intern_checkpoint(const char* name);
+
+/**
+ * Drop every marker of a checkpoint before correlation (e.g. the checkpoint
+ * overhead calibration marks); marking it still costs what any other does.
+ */
+void nemb_discard_checkpoint(uint32_t id);
+
+/**
+ * Record a batch of integer checkpoints in one call.
+ * @param records Interleaved (timestamp_ns, checkpoint id) pairs, CLOCK_MONOTONIC
+ * @param count Number of pairs
+ * @param thread_key Identifier of the thread that captured the records
+ */
+void nemb_mark_checkpoints_batch(const uint64_t* records, size_t count, uint64_t thread_key);
+
+/**
+ * Keep the readings from a timestamp on for records still waiting in a
+ * runtime's batch buffers; UINT64_MAX lifts the hold.
+ */
+void nemb_hold_readings_from(uint64_t timestamp_ns);
+
+/**
+ * Mark an integer checkpoint on behalf of a logical context sharing the thread.
+ * @param id Dense checkpoint ID from the instrumentation manifest
+ * @param context_key Key recorded instead of the thread (e.g. an asyncio task)
+ */
+void nemb_mark_checkpoint_id_for(uint32_t id, uint64_t context_key);
+
+#define NEMB_CONTEXT_SUSPENDED 0
+#define NEMB_CONTEXT_RESUMED 1
+#define NEMB_CONTEXT_FINISHED 2
+
+/**
+ * Record that a logical context stopped or started running. Energy consumed
+ * while it is suspended is excluded from its checkpoints.
+ * @param state NEMB_CONTEXT_SUSPENDED, NEMB_CONTEXT_RESUMED or NEMB_CONTEXT_FINISHED
+ */
+void nemb_context_switch(uint64_t context_key, int state);
+
+/**
+ * Correlated checkpoint as exported by nemb_read_checkpoints (40 bytes, no padding).
+ * Named checkpoints have NEMB_NAMED_CHECKPOINT_FLAG set in checkpoint_id.
+ */
+typedef struct {
+    uint64_t timestamp_ns;
+    uint32_t checkpoint_id;
+    uint32_t invocation;
+    uint64_t thread_id;
+    double joules;
+    double watts;
+} nemb_checkpoint_record;
+
+#define NEMB_NAMED_CHECKPOINT_FLAG 0x80000000u
+
+/**
+ * Correlate all checkpoints into an export snapshot.
+ * Returns the number of records available to nemb_read_checkpoints.
+ */
+size_t nemb_prepare_checkpoints();
+
+/**
+ * Correlate the checkpoints already covered by energy readings into the export
+ * snapshot and release them, together with readings older than the window.
+ * @param until_ns Latest timestamp the window may reach (UINT64_MAX for no limit)
+ * @param window_end_ns Receives the end of the drained window (may be NULL)
+ * Returns the number of records available to nemb_read_checkpoints.
+ */
+size_t nemb_drain_checkpoints(uint64_t until_ns, uint64_t* window_end_ns);
+
+/**
+ * Copy up to max_records snapshot records starting at cursor.
+ * Returns the number copied; advance cursor by it until 0 is returned.
+ */
+size_t nemb_read_checkpoints(size_t cursor, nemb_checkpoint_record* out, size_t max_records);
+
+/**
+ * Direct pointer to the snapshot, valid until the next nemb_prepare_checkpoints.
+ */
+const nemb_checkpoint_record* nemb_checkpoint_records();
+
+/**
+ * Number of energy domains ("<provider>/<domain>") in the export snapshot.
+ */
+size_t nemb_checkpoint_domain_count();
+
+/**
+ * Interpolated cumulative energy of domain index at every snapshot record, in
+ * record order (NaN where unknown), with its name copied into buffer
+ * (truncated to max_len - 1 characters). Valid until the next prepare or drain.
+ */
+const double* nemb_checkpoint_domain(size_t index, char* buffer, int max_len);
+
+/**
+ * Resolve an interned checkpoint name into buffer.
+ * Returns the length, or minus the required buffer size if it is too small.
+ */
+int nemb_checkpoint_name(uint32_t id, char* buffer, int max_len);
+
+/**
+ * Buffered readings as contiguous columns, oldest first.
+ * The arrays address NEMB's reading buffer directly and stay valid until
+ * nemb_release_readings(); new readings wait until then.
+ */
+typedef struct {
+    const uint64_t* timestamps_ns;
+    const double* energy_joules;
+    const double* power_watts;
+    size_t count;
+    size_t domain_count;
+} nemb_reading_columns;
+
+/**
+ * Snapshot the reading buffer and describe the snapshot's columns in out.
+ * Sampling continues meanwhile. Returns 1 on success, 0 if the backend is
+ * not running.
+ */
+int nemb_acquire_readings(nemb_reading_columns* out);
+
+/**
+ * Energy column of per-domain entry index (count values, NaN where a reading
+ * has no value), with its "<provider>/<domain>" name copied into buffer
+ * (truncated to max_len - 1 characters). Valid until nemb_release_readings().
+ */
+const double* nemb_reading_domain(size_t index, char* buffer, int max_len);
+
+/**
+ * Free the snapshot taken by nemb_acquire_readings() (from any thread).
+ */
+void nemb_release_readings();
+
+/**
+ * Per-function statistics from online aggregation (80 bytes, no padding).
+ * Variances are sample variances; mean = sum / count.
+ */
+typedef struct {
+    uint32_t checkpoint_id;
+    uint32_t reserved;
+    uint64_t count;
+    double energy_sum_joules;
+    double energy_min_joules;
+    double energy_max_joules;
+    double energy_variance;
+    double duration_sum_ns;
+    double duration_min_ns;
+    double duration_max_ns;
+    double duration_variance;
+} nemb_checkpoint_aggregate;
+
+#define NEMB_UNPAIRED_CHECKPOINT 0xFFFFFFFFu
+
+/**
+ * Match enter/exit checkpoints online and keep only per-function statistics.
+ * Memory stays proportional to the number of checkpoints, not calls.
+ * Named checkpoints pair "enter:NAME:..." with "exit:NAME:...".
+ */
+void nemb_enable_aggregation(int enabled);
+
+/**
+ * Declare pairing of integer checkpoints first_id .. first_id + count - 1.
+ * Each spec is (enter_id << 1) | is_exit, or NEMB_UNPAIRED_CHECKPOINT.
+ */
+void nemb_set_checkpoint_pairing(uint32_t first_id, const uint32_t* specs, size_t count);
+
+/**
+ * Copy up to max_records aggregates into out (may be NULL).
+ * Returns the total number of aggregates.
+ */
+size_t nemb_get_checkpoint_aggregates(nemb_checkpoint_aggregate* out, size_t max_records);
+
 /**
  * Checkpoint macro - simple pass-through to NEMB backend.
  * Invocation counter (#inv_N) is added automatically by the backend.
@@ -0,0 +1,509 @@
+"""
+NEMB backend client for the CodeGreen Python runtime.
+
+ctypes bindings to libcodegreen-nemb and the record layouts it exports.
+Imported through codegreen_runtime, which re-exports NEMBClient and the
+structures.
+"""
+
+import ctypes
+import json
+import math
+import os
+from array import array
+from contextlib import contextmanager
+from ctypes import c_double, c_char_p, c_uint32, c_uint64, c_int, c_size_t, c_void_p, byref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+def _find_nemb_library() -> Optional[str]:
+    """Find the path to the shared NEMB library."""
+    possible_names = ["libcodegreen-nemb.so", "libcodegreen-nemb.dylib", "codegreen-nemb.dll"]
+    
+    # Paths to search
+    search_paths = [
+        # 1. Relative to this file (if installed in site-packages/codegreen/instrumentation)
+        Path(__file__).parent.parent.parent / "lib",
+        Path(__file__).parent.parent.parent / "build" / "lib",
+        # 2. Standard library paths
+        Path("/usr/local/lib"),
+        Path("/usr/lib"),
+        # 3. Environment variable
+        Path(os.environ.get("CODEGREEN_LIB_PATH", ""))
+    ]
+    
+    for path in search_paths:
+        if not path.exists():
+            continue
+        for name in possible_names:
+            lib_path = path / name
+            if lib_path.exists():
+                return str(lib_path)
+    
+    return None
+
+class CheckpointRecord(ctypes.Structure):
+    """Correlated checkpoint exported by the backend (matches nemb_checkpoint_record)"""
+    _fields_ = [
+        ("timestamp_ns", c_uint64),
+        ("checkpoint_id", c_uint32),
+        ("invocation", c_uint32),
+        ("thread_id", c_uint64),
+        ("joules", c_double),
+        ("watts", c_double),
+    ]
+
+
+class CheckpointAggregate(ctypes.Structure):
+    """Per-function span statistics from online aggregation (matches nemb_checkpoint_aggregate)"""
+    _fields_ = [
+        ("checkpoint_id", c_uint32),
+        ("reserved", c_uint32),
+        ("count", c_uint64),
+        ("energy_sum_joules", c_double),
+        ("energy_min_joules", c_double),
+        ("energy_max_joules", c_double),
+        ("energy_variance", c_double),
+        ("duration_sum_ns", c_double),
+        ("duration_min_ns", c_double),
+        ("duration_max_ns", c_double),
+        ("duration_variance", c_double),
+    ]
+
+
+class ReadingColumns(ctypes.Structure):
+    """Column addresses of the backend's reading buffer (matches nemb_reading_columns)"""
+    _fields_ = [
+        ("timestamps_ns", c_void_p),
+        ("energy_joules", c_void_p),
+        ("power_watts", c_void_p),
+        ("count", c_size_t),
+        ("domain_count", c_size_t),
+    ]
+
+
+# Set in CheckpointRecord.checkpoint_id for interned names (vs. manifest IDs)
+_NAMED_CHECKPOINT_FLAG = 0x80000000
+# Pairing spec for checkpoints that are not function enters/exits
+_UNPAIRED_CHECKPOINT = 0xFFFFFFFF
+_EXPORT_PAGE_SIZE = max(1, int(os.environ.get("CODEGREEN_EXPORT_PAGE_SIZE", "4096")))
+
+
+def _stats_dict(count: int, total: float, minimum: float, maximum: float, variance: float) -> Dict:
+    return {
+        "sum": total,
+        "min": minimum,
+        "max": maximum,
+        "mean": total / count if count else 0.0,
+        "variance": variance,
+    }
+
+
+class NEMBClient:
+    """Interface to the Native Energy Measurement Backend (C++)"""
+
+    def __init__(self):
+        self.has_checkpoint_ids = False
+        self.has_checkpoint_batches = False
+        self.has_reading_hold = False
+        self.has_binary_export = False
+        self.has_aggregation = False
+        self.has_window_drain = False
+        self.has_context_keys = False
+        self.has_interned_checkpoints = False
+        self.has_discarded_checkpoints = False
+        self.has_reading_columns = False
+        self.has_checkpoint_domains = False
+        # Interned names in ID order, replayed into a forked child's fresh meter
+        self.interned_names: List[str] = []
+        # Checkpoints left out of every export, replayed into a forked child's meter
+        self.discarded_ids: List[int] = []
+        lib_path = _find_nemb_library()
+        if not lib_path:
+            self.lib = None
+            return
+
+        try:
+            self.lib = ctypes.CDLL(lib_path)
+            self.lib.nemb_initialize.argtypes = []
+            self.lib.nemb_initialize.restype = c_int
+            
+            # Instantaneous reading API
+            self.lib.nemb_read_current.argtypes = [ctypes.POINTER(c_double), ctypes.POINTER(c_double)]
+            self.lib.nemb_read_current.restype = c_int
+            
+            # High-accuracy "Signal Generator" API
+            self.lib.nemb_mark_checkpoint.argtypes = [c_char_p]
+            self.lib.nemb_mark_checkpoint.restype = None
+            
+            # Integer checkpoint API (names resolved from the manifest at report time)
+            self.has_checkpoint_ids = hasattr(self.lib, "nemb_mark_checkpoint_id")
+            if self.has_checkpoint_ids:
+                self.lib.nemb_mark_checkpoint_id.argtypes = [c_uint32]
+                self.lib.nemb_mark_checkpoint_id.restype = None
+            
+            # Names interned once and then marked through the integer entry points
+            self.has_interned_checkpoints = self.has_checkpoint_ids and hasattr(self.lib, "nemb_intern_checkpoint")
+            if self.has_interned_checkpoints:
+                self.lib.nemb_intern_checkpoint.argtypes = [c_char_p]
+                self.lib.nemb_intern_checkpoint.restype = c_uint32
+            self.has_discarded_checkpoints = hasattr(self.lib, "nemb_discard_checkpoint")
+            if self.has_discarded_checkpoints:
+                self.lib.nemb_discard_checkpoint.argtypes = [c_uint32]
+                self.lib.nemb_discard_checkpoint.restype = None
+            
+            # Bulk flush of (timestamp_ns, checkpoint_id) records from thread buffers
+            self.has_checkpoint_batches = hasattr(self.lib, "nemb_mark_checkpoints_batch")
+            if self.has_checkpoint_batches:
+                self.lib.nemb_mark_checkpoints_batch.argtypes = [c_void_p, c_size_t, c_uint64]
+                self.lib.nemb_mark_checkpoints_batch.restype = None
+            # Readings kept for records still in the batch buffers
+            self.has_reading_hold = hasattr(self.lib, "nemb_hold_readings_from")
+            if self.has_reading_hold:
+                self.lib.nemb_hold_readings_from.argtypes = [c_uint64]
+                self.lib.nemb_hold_readings_from.restype = None
+            
+            # Checkpoints keyed by logical context (asyncio task) instead of thread
+            self.has_context_keys = hasattr(self.lib, "nemb_mark_checkpoint_id_for")
+            if self.has_context_keys:
+                self.lib.nemb_mark_checkpoint_id_for.argtypes = [c_uint32, c_uint64]
+                self.lib.nemb_mark_checkpoint_id_for.restype = None
+                self.lib.nemb_context_switch.argtypes = [c_uint64, c_int]
+                self.lib.nemb_context_switch.restype = None
+            
+            self.lib.nemb_get_checkpoints_json.argtypes = [c_char_p, c_int]
+            self.lib.nemb_get_checkpoints_json.restype = c_int
+            
+            # Binary, paged export of correlated checkpoints
+            self.has_binary_export = hasattr(self.lib, "nemb_prepare_checkpoints")
+            if self.has_binary_export:
+                self.lib.nemb_prepare_checkpoints.argtypes = []
+                self.lib.nemb_prepare_checkpoints.restype = c_size_t
+                self.lib.nemb_read_checkpoints.argtypes = [c_size_t, ctypes.POINTER(CheckpointRecord), c_size_t]
+                self.lib.nemb_read_checkpoints.restype = c_size_t
+                self.lib.nemb_checkpoint_records.argtypes = []
+                self.lib.nemb_checkpoint_records.restype = c_void_p
+                self.lib.nemb_checkpoint_name.argtypes = [c_uint32, c_char_p, c_int]
+                self.lib.nemb_checkpoint_name.restype = c_int
+            
+            # Per-domain energy of the export snapshot, as columns beside it
+            self.has_checkpoint_domains = self.has_binary_export and hasattr(self.lib, "nemb_checkpoint_domain")
+            if self.has_checkpoint_domains:
+                self.lib.nemb_checkpoint_domain_count.argtypes = []
+                self.lib.nemb_checkpoint_domain_count.restype = c_size_t
+                self.lib.nemb_checkpoint_domain.argtypes = [c_size_t, c_char_p, c_int]
+                self.lib.nemb_checkpoint_domain.restype = c_void_p
+            
+            # Windowed drain for periodic flushing of long-running processes
+            self.has_window_drain = self.has_binary_export and hasattr(self.lib, "nemb_drain_checkpoints")
+            if self.has_window_drain:
+                self.lib.nemb_drain_checkpoints.argtypes = [c_uint64, ctypes.POINTER(c_uint64)]
+                self.lib.nemb_drain_checkpoints.restype = c_size_t
+            
+            # Online enter/exit aggregation (constant memory per checkpoint)
+            self.has_aggregation = hasattr(self.lib, "nemb_enable_aggregation")
+            if self.has_aggregation:
+                self.lib.nemb_enable_aggregation.argtypes = [c_int]
+                self.lib.nemb_enable_aggregation.restype = None
+                self.lib.nemb_set_checkpoint_pairing.argtypes = [c_uint32, ctypes.POINTER(c_uint32), c_size_t]
+                self.lib.nemb_set_checkpoint_pairing.restype = None
+                self.lib.nemb_get_checkpoint_aggregates.argtypes = [ctypes.POINTER(CheckpointAggregate), c_size_t]
+                self.lib.nemb_get_checkpoint_aggregates.restype = c_size_t
+
+            # Zero-copy access to the buffered readings
+            self.has_reading_columns = hasattr(self.lib, "nemb_acquire_readings")
+            if self.has_reading_columns:
+                self.lib.nemb_acquire_readings.argtypes = [ctypes.POINTER(ReadingColumns)]
+                self.lib.nemb_acquire_readings.restype = c_int
+                self.lib.nemb_reading_domain.argtypes = [c_size_t, c_char_p, c_int]
+                self.lib.nemb_reading_domain.restype = c_void_p
+                self.lib.nemb_release_readings.argtypes = []
+                self.lib.nemb_release_readings.restype = None
+
+            if not self.lib.nemb_initialize():
+                self.lib = None
+        except Exception:
+            self.lib = None
+
+    def mark_checkpoint(self, name: str):
+        """Send a lightweight signal to the C++ backend"""
+        if self.lib:
+            self.lib.nemb_mark_checkpoint(name.encode('utf-8'))
+
+    def mark_checkpoint_id(self, numeric_id: int):
+        """Send an integer checkpoint signal to the C++ backend"""
+        if self.lib:
+            if self.has_checkpoint_ids:
+                self.lib.nemb_mark_checkpoint_id(numeric_id)
+            else:
+                # Older backend without the integer entry point
+                self.lib.nemb_mark_checkpoint(str(numeric_id).encode('utf-8'))
+
+    def intern_checkpoint(self, name: str) -> Optional[int]:
+        """Intern a checkpoint name and return an ID for the integer entry points"""
+        if not self.lib or not self.has_interned_checkpoints:
+            return None
+        checkpoint_id = self.lib.nemb_intern_checkpoint(name.encode('utf-8'))
+        if (checkpoint_id & ~_NAMED_CHECKPOINT_FLAG) == len(self.interned_names):
+            self.interned_names.append(name)
+        return checkpoint_id
+
+    def discard_checkpoint(self, checkpoint_id: int):
+        """
+        Leave every marker of ``checkpoint_id`` out of the results.
+
+        The backend drops them before correlation where it supports that;
+        older backends keep them and they are skipped on export instead.
+        """
+        if checkpoint_id in self.discarded_ids:
+            return
+        self.discarded_ids.append(checkpoint_id)
+        if self.lib and self.has_discarded_checkpoints:
+            self.lib.nemb_discard_checkpoint(checkpoint_id)
+
+    def native_mark_checkpoint_id(self):
+        """Return the cheapest callable that records an integer checkpoint"""
+        if self.lib and self.has_checkpoint_ids:
+            return self.lib.nemb_mark_checkpoint_id
+        return self.mark_checkpoint_id
+
+    def mark_checkpoints_batch(self, records: array, count: int, thread_key: int):
+        """Hand `count` interleaved (timestamp_ns, checkpoint_id) records to the backend"""
+        if self.lib and self.has_checkpoint_batches and count:
+            address, _ = records.buffer_info()
+            self.lib.nemb_mark_checkpoints_batch(address, count, thread_key)
+
+    def hold_readings_from(self, timestamp_ns: int):
+        """Keep the backend's readings from `timestamp_ns` on for records not handed over yet"""
+        if self.lib and self.has_reading_hold:
+            self.lib.nemb_hold_readings_from(timestamp_ns)
+
+    def get_checkpoint_records(self, as_numpy: bool = False):
+        """
+        Correlate all checkpoints and return them without copying.
+
+        The result is a ctypes array of CheckpointRecord over the backend's
+        export snapshot (or a NumPy structured array over the same memory when
+        as_numpy is set). It stays valid until the next export call.
+        """
+        if not self.lib or not self.has_binary_export:
+            return None
+        count = self.lib.nemb_prepare_checkpoints()
+        address = self.lib.nemb_checkpoint_records() if count else None
+        records = (CheckpointRecord * count).from_address(address) if address else (CheckpointRecord * 0)()
+        if as_numpy:
+            import numpy as np
+            return np.frombuffer(records, dtype=np.dtype(CheckpointRecord), count=len(records))
+        return records
+
+    def iter_checkpoint_pages(self, page_size: Optional[int] = None):
+        """
+        Correlate all checkpoints and yield them in pages of at most page_size
+        (CODEGREEN_EXPORT_PAGE_SIZE, default 4096).
+
+        One page buffer is reused, so memory stays bounded; each yielded
+        array is only valid until the next page is requested.
+        """
+        if not self.lib or not self.has_binary_export:
+            return
+        yield from self._iter_snapshot_pages(self.lib.nemb_prepare_checkpoints(), page_size)
+
+    def _iter_snapshot_pages(self, count: int, page_size: Optional[int] = None):
+        page_size = page_size or _EXPORT_PAGE_SIZE
+        page = (CheckpointRecord * page_size)()
+        cursor = 0
+        while cursor < count:
+            n = self.lib.nemb_read_checkpoints(cursor, page, page_size)
+            if not n:
+                break
+            yield (CheckpointRecord * n).from_buffer(page)
+            cursor += n
+
+    @contextmanager
+    def reading_columns(self, as_numpy: bool = False):
+        """
+        Snapshot the backend's reading buffer and yield its columns.
+
+        Yields a dict with "timestamp_ns", "joules" and "watts" columns and a
+        "domains" dict of per-domain energy columns (NaN where a reading has no
+        value), oldest reading first, or None without a backend. Columns are
+        ctypes arrays over the snapshot's memory in the backend, or NumPy arrays
+        over the same memory when as_numpy is set. Sampling and checkpoint
+        correlation carry on during the block; the snapshot is freed when it
+        exits, and the columns must not be used after it.
+        """
+        header = ReadingColumns()
+        if not self.lib or not self.has_reading_columns or not self.lib.nemb_acquire_readings(byref(header)):
+            yield None
+            return
+        try:
+            count = header.count
+
+            def column(address, ctype):
+                values = (ctype * count).from_address(address) if count and address else (ctype * 0)()
+                if as_numpy:
+                    import numpy as np
+                    return np.ctypeslib.as_array(values)
+                return values
+
+            name = ctypes.create_string_buffer(256)
+            domains = {}
+            for index in range(header.domain_count):
+                address = self.lib.nemb_reading_domain(index, name, len(name))
+                domains[name.value.decode('utf-8')] = column(address, c_double)
+            yield {
+                "timestamp_ns": column(header.timestamps_ns, c_uint64),
+                "joules": column(header.energy_joules, c_double),
+                "watts": column(header.power_watts, c_double),
+                "domains": domains,
+            }
+        finally:
+            self.lib.nemb_release_readings()
+
+    def checkpoint_name(self, checkpoint_id: int) -> str:
+        """Resolve the base name of a CheckpointRecord.checkpoint_id"""
+        if not checkpoint_id & _NAMED_CHECKPOINT_FLAG:
+            return str(checkpoint_id)
+        buf = ctypes.create_string_buffer(256)
+        ret = self.lib.nemb_checkpoint_name(checkpoint_id, buf, len(buf))
+        if ret < 0:
+            buf = ctypes.create_string_buffer(-ret)
+            self.lib.nemb_checkpoint_name(checkpoint_id, buf, len(buf))
+        return buf.value.decode('utf-8', 'replace')
+
+    def enable_aggregation(self, enabled: bool = True):
+        """Switch the backend between recording every marker and online aggregation"""
+        if self.lib and self.has_aggregation:
+            self.lib.nemb_enable_aggregation(1 if enabled else 0)
+
+    def set_checkpoint_pairing(self, first_id: int, specs: List[int]):
+        """Declare (enter_id << 1) | is_exit pairing specs for IDs starting at first_id"""
+        if self.lib and self.has_aggregation and specs:
+            values = (c_uint32 * len(specs))(*specs)
+            self.lib.nemb_set_checkpoint_pairing(first_id, values, len(specs))
+
+    def get_checkpoint_aggregates(self) -> List[Dict]:
+        """Per-function span statistics, in the result file's 'aggregates' schema"""
+        if not self.lib or not self.has_aggregation:
+            return []
+        count = self.lib.nemb_get_checkpoint_aggregates(None, 0)
+        records = (CheckpointAggregate * count)()
+        count = min(count, self.lib.nemb_get_checkpoint_aggregates(records, count))
+
+        aggregates = []
+        for record in records[:count]:
+            n = record.count
+            aggregates.append({
+                "checkpoint_id": self.checkpoint_name(record.checkpoint_id),
+                "count": n,
+                "energy_joules": _stats_dict(n, record.energy_sum_joules, record.energy_min_joules,
+                                             record.energy_max_joules, record.energy_variance),
+                "duration_ns": _stats_dict(n, record.duration_sum_ns, record.duration_min_ns,
+                                           record.duration_max_ns, record.duration_variance),
+            })
+        return aggregates
+
+    def get_final_measurements(self) -> List[Dict]:
+        """Retrieve correlated time-series measurements from C++ backend"""
+        if not self.lib:
+            return []
+        if not self.has_binary_export:
+            return self._get_final_measurements_json()
+        return self._snapshot_measurements(self.lib.nemb_prepare_checkpoints())
+
+    def drain_measurements(self, until_ns: int = 2**64 - 1) -> Tuple[int, List[Dict]]:
+        """
+        Remove and return the checkpoints already covered by energy readings,
+        up to until_ns at most.
+
+        Returns (window_end_ns, measurements). The backend releases the drained
+        markers and the readings before window_end_ns, so calling this
+        periodically keeps memory bounded.
+        """
+        if not self.lib or not self.has_window_drain:
+            return 0, []
+        window_end = c_uint64()
+        count = self.lib.nemb_drain_checkpoints(until_ns, byref(window_end))
+        return window_end.value, self._snapshot_measurements(count)
+
+    def _snapshot_measurements(self, count: int) -> List[Dict]:
+        measurements = []
+        names: Dict[int, str] = {}
+        domains = self._snapshot_domains(count)
+        discarded = set(self.discarded_ids)
+        index = 0
+        for page in self._iter_snapshot_pages(count):
+            for record in page:
+                index += 1
+                checkpoint_id = record.checkpoint_id
+                if checkpoint_id in discarded:
+                    continue
+                name = names.get(checkpoint_id)
+                if name is None:
+                    name = names[checkpoint_id] = self.checkpoint_name(checkpoint_id)
+                measurement = {
+                    "checkpoint_id": f"{name}#inv_{record.invocation}_t{record.thread_id}",
+                    "timestamp": record.timestamp_ns,
+                    "joules": record.joules,
+                    "watts": record.watts,
+                }
+                if domains:
+                    at = {domain: column[index - 1] for domain, column in domains
+                          if not math.isnan(column[index - 1])}
+                    if at:
+                        measurement["domains"] = at
+                measurements.append(measurement)
+        return measurements
+
+    def _snapshot_domains(self, count: int) -> List[Tuple[str, ctypes.Array]]:
+        """(name, energy column) per domain of the export snapshot, over backend memory"""
+        if not count or not self.has_checkpoint_domains:
+            return []
+        name = ctypes.create_string_buffer(256)
+        domains = []
+        for index in range(self.lib.nemb_checkpoint_domain_count()):
+            address = self.lib.nemb_checkpoint_domain(index, name, len(name))
+            if address:
+                domains.append((name.value.decode('utf-8'), (c_double * count).from_address(address)))
+        return domains
+
+    def _get_final_measurements_json(self) -> List[Dict]:
+        """JSON export for backends built before the binary export existed"""
+        buf_size = 1024 * 1024
+        buf = ctypes.create_string_buffer(buf_size)
+        ret = self.lib.nemb_get_checkpoints_json(buf, buf_size)
+        if ret < 0:
+            # Buffer too small: the backend reports the required length
+            buf_size = -ret + 1
+            buf = ctypes.create_string_buffer(buf_size)
+            ret = self.lib.nemb_get_checkpoints_json(buf, buf_size)
+        if ret > 0:
+            try:
+                data = json.loads(buf.value.decode('utf-8'))
+                return data.get("checkpoints", [])
+            except Exception:
+                return []
+        return []
+
+    def read_energy(self) -> tuple:
+        """Returns (joules, watts) - kept for compatibility"""
+        if not self.lib:
+            return (0.0, 0.0)
+
+        energy = c_double()
+        power = c_double()
+        if self.lib.nemb_read_current(byref(energy), byref(power)):
+            return (energy.value, power.value)
+        return (0.0, 0.0)
+
+    def reset_after_fork(self):
+        """Bring up a forked child's meter; NEMB dropped the parent's"""
+        if self.lib:
+            self.lib.nemb_initialize()
+            # Interning in the same order gives names the IDs the parent handed out
+            for name in self.interned_names:
+                self.lib.nemb_intern_checkpoint(name.encode('utf-8'))
+            if self.has_discarded_checkpoints:
+                for checkpoint_id in self.discarded_ids:
+                    self.lib.nemb_discard_checkpoint(checkpoint_id)
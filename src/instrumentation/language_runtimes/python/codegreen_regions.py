@@ -0,0 +1,189 @@
+"""
+Hand-marked regions for the CodeGreen Python runtime.
+
+Imported through codegreen_runtime, which re-exports region() and measured().
+"""
+
+import threading
+from typing import Dict, Optional
+
+
+# The codegreen_runtime module; it registers itself through _attach() on import
+runtime = None
+
+
+def _attach(module):
+    """Give this module the runtime's state; called once by codegreen_runtime"""
+    global runtime
+    runtime = module
+
+
+# --- Hand-Marked Regions ---
+#
+# region() and @measured mark code by hand instead of rewriting whole files:
+#
+#   with codegreen_runtime.region("parse_batch"):
+#       ...
+#
+#   @codegreen_runtime.measured
+#   def handle(request): ...
+#
+# Each region name is interned in NEMB once as "enter:NAME:region" and
+# "exit:NAME:region", so a call costs two mark() calls on integer IDs and no
+# string building. They go through the same fast path, thread buffers, task
+# keys and reports as instrumented checkpoints, and nest per thread (or task)
+# like function enters and exits. Regions created while the backend is still
+# starting in the background do not wait for it: until it is live they are
+# marked by name with the other early checkpoints, and their names are
+# interned on the first enter or exit after that.
+
+_regions: Dict[str, "_Region"] = {}
+_regions_lock = threading.Lock()
+
+
+class _Region:
+    """Reusable context manager marking the enter and exit of one named region"""
+
+    __slots__ = ("name", "enter_id", "exit_id")
+
+    def __init__(self, name: str, enter_id: Optional[int] = None, exit_id: Optional[int] = None):
+        self.name = name
+        # None until interned
+        self.enter_id = enter_id
+        self.exit_id = exit_id
+
+    def __enter__(self):
+        if self.enter_id is None:
+            _mark_uninterned(self, "enter")
+        else:
+            runtime.mark(self.enter_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.exit_id is None:
+            _mark_uninterned(self, "exit")
+        else:
+            runtime.mark(self.exit_id)
+        return False
+
+
+class _NullRegion:
+    """Stands in for a region when measurement is off or the backend cannot intern checkpoint names"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+def _intern(span: _Region, client):
+    """Intern a region's enter and exit names; the IDs stay None if the backend cannot intern"""
+    span.enter_id = client.intern_checkpoint(f"enter:{span.name}:region")
+    span.exit_id = client.intern_checkpoint(f"exit:{span.name}:region")
+
+
+def _mark_uninterned(span: _Region, kind: str):
+    """Mark the enter or exit of a region created before the backend was live"""
+    client = runtime._nemb_client
+    if client is None:
+        # Handed over, and interned, with the other checkpoints taken meanwhile
+        runtime._mark_pending(f"{kind}:{span.name}:region")
+        return
+    if not client.has_interned_checkpoints:
+        return
+    with _regions_lock:
+        if span.enter_id is None:
+            _intern(span, client)
+    checkpoint_id = span.enter_id if kind == "enter" else span.exit_id
+    if checkpoint_id is not None:
+        runtime.mark(checkpoint_id)
+
+
+def region(name: str):
+    """
+    Context manager measuring the energy of a named region of code.
+
+    The returned object is cached per name and reusable, including nested
+    and from several threads; keep a reference in hot loops to skip the lookup.
+
+    Args:
+        name: Region name shown in the report
+    """
+    try:
+        return _regions[name]
+    except KeyError:
+        pass
+    with _regions_lock:
+        cached = _regions.get(name)
+        if cached is not None:
+            return cached
+        if runtime._DISABLED:
+            cached = _NullRegion(name)
+        elif runtime._init_thread is not None and runtime._nemb_client is None:
+            # Interned once the background initialisation is done, without waiting for it
+            cached = _Region(name)
+        else:
+            cached = _Region(name)
+            _intern(cached, runtime._get_nemb_client())
+            if cached.enter_id is None:
+                cached = _NullRegion(name)
+        _regions[name] = cached
+        return cached
+
+
+def measured(func=None, *, name: Optional[str] = None):
+    """
+    Decorator measuring every call of a function as a region.
+
+    Usable bare (``@measured``) or with a name (``@measured(name="parse")``);
+    the name defaults to the function's qualified name. Coroutine functions
+    are measured until the awaited call returns.
+    """
+    if func is None:
+        return lambda f: measured(f, name=name)
+    import functools
+    import inspect
+    span = region(name or func.__qualname__)
+    if not isinstance(span, _Region):
+        return func
+    if span.enter_id is None:
+        # Not interned yet: mark through the region until it is
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def measured_coroutine(*args, **kwargs):
+                with span:
+                    return await func(*args, **kwargs)
+            return measured_coroutine
+
+        @functools.wraps(func)
+        def measured_call(*args, **kwargs):
+            with span:
+                return func(*args, **kwargs)
+        return measured_call
+    enter_id, exit_id = span.enter_id, span.exit_id
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def measured_coroutine(*args, **kwargs):
+            runtime.mark(enter_id)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                runtime.mark(exit_id)
+        return measured_coroutine
+
+    @functools.wraps(func)
+    def measured_call(*args, **kwargs):
+        runtime.mark(enter_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            runtime.mark(exit_id)
+    return measured_call
+
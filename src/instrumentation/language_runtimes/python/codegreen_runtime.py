@@ -2,6 +2,11 @@
 CodeGreen Runtime Module for Python
 Provides runtime energy measurement functionality for instrumented Python code.
 Designed for minimal overhead and high accuracy energy measurements using the NEMB C++ backend.
+
+Instrumented code and the CLI only import this module. The backend client,
+the sysfs fallback, overhead calibration, asyncio task and thread tracking
+and hand-marked regions live in the codegreen_* modules beside it; their
+public names are re-exported here.
 """
 
 import time
@@ -9,103 +14,37 @@ import threading
 import json
 import os
 import sys
-import ctypes
-from ctypes import c_double, c_char_p, c_uint64, c_int, byref
-from typing import Dict, List, Optional, NamedTuple
-from dataclasses import dataclass, asdict
-from pathlib import Path
-
-# --- C++ Backend Interface ---
-
-def _find_nemb_library() -> Optional[str]:
-    """Find the path to the shared NEMB library."""
-    possible_names = ["libcodegreen-nemb.so", "libcodegreen-nemb.dylib", "codegreen-nemb.dll"]
-    
-    # Paths to search
-    search_paths = [
-        # 1. Relative to this file (if installed in site-packages/codegreen/instrumentation)
-        Path(__file__).parent.parent.parent / "lib",
-        Path(__file__).parent.parent.parent / "build" / "lib",
-        # 2. Standard library paths
-        Path("/usr/local/lib"),
-        Path("/usr/lib"),
-        # 3. Environment variable
-        Path(os.environ.get("CODEGREEN_LIB_PATH", ""))
-    ]
-    
-    for path in search_paths:
-        if not path.exists():
-            continue
-        for name in possible_names:
-            lib_path = path / name
-            if lib_path.exists():
-                return str(lib_path)
-    
-    return None
+import sysconfig
+from array import array
+from typing import Callable, Dict, List, Optional, Union
 
-class NEMBClient:
-    """Interface to the Native Energy Measurement Backend (C++)"""
+import codegreen_calibration
+import codegreen_regions
+import codegreen_tasks
+from codegreen_backend import (CheckpointAggregate, CheckpointRecord, NEMBClient, ReadingColumns,
+                               _UNPAIRED_CHECKPOINT)
+from codegreen_calibration import calibrate_overhead
+from codegreen_regions import measured, region
+from codegreen_sysfs import SysfsEnergyClient
+from codegreen_tasks import enable_task_tracking
 
-    def __init__(self):
-        lib_path = _find_nemb_library()
-        if not lib_path:
-            self.lib = None
-            return
+# The modules that read the runtime's state at call time get it from here
+for _module in (codegreen_calibration, codegreen_regions, codegreen_tasks):
+    _module._attach(sys.modules[__name__])
+del _module
 
-        try:
-            self.lib = ctypes.CDLL(lib_path)
-            self.lib.nemb_initialize.argtypes = []
-            self.lib.nemb_initialize.restype = c_int
-            
-            # Instantaneous reading API
-            self.lib.nemb_read_current.argtypes = [ctypes.POINTER(c_double), ctypes.POINTER(c_double)]
-            self.lib.nemb_read_current.restype = c_int
-            
-            # High-accuracy "Signal Generator" API
-            self.lib.nemb_mark_checkpoint.argtypes = [c_char_p]
-            self.lib.nemb_mark_checkpoint.restype = None
-            
-            self.lib.nemb_get_checkpoints_json.argtypes = [c_char_p, c_int]
-            self.lib.nemb_get_checkpoints_json.restype = c_int
-
-            if not self.lib.nemb_initialize():
-                self.lib = None
-        except Exception:
-            self.lib = None
-
-    def mark_checkpoint(self, name: str):
-        """Send a lightweight signal to the C++ backend"""
-        if self.lib:
-            self.lib.nemb_mark_checkpoint(name.encode('utf-8'))
-
-    def get_final_measurements(self) -> List[Dict]:
-        """Retrieve correlated time-series measurements from C++ backend"""
-        if not self.lib:
-            return []
-            
-        # Use a large buffer for JSON data (1MB)
-        buf_size = 1024 * 1024
-        buf = ctypes.create_string_buffer(buf_size)
-        
-        ret = self.lib.nemb_get_checkpoints_json(buf, buf_size)
-        if ret > 0:
-            try:
-                data = json.loads(buf.value.decode('utf-8'))
-                return data.get("checkpoints", [])
-            except Exception:
-                return []
-        return []
+# --- Kill Switch ---
+#
+# CODEGREEN_DISABLED=1 leaves instrumented code in place but turns it off:
+# the runtime starts no threads, registers no hooks and writes no results.
+# Instrumented files read ``enabled`` into a module global once at import and
+# guard each checkpoint with it, so a disabled checkpoint is one global load
+# and branch. Calls that bypass the guard (hand-written checkpoint() and mark()
+# calls, older instrumented files) hit C-implemented builtins that do nothing.
 
-    def read_energy(self) -> tuple:
-        """Returns (joules, watts) - kept for compatibility"""
-        if not self.lib:
-            return (0.0, 0.0)
+_DISABLED = os.environ.get("CODEGREEN_DISABLED", "0").lower() in ("1", "true", "yes")
+enabled = not _DISABLED
 
-        energy = c_double()
-        power = c_double()
-        if self.lib.nemb_read_current(byref(energy), byref(power)):
-            return (energy.value, power.value)
-        return (0.0, 0.0)
 
 # --- Runtime Implementation ---
 
@@ -118,27 +57,251 @@ def _get_nemb_client() -> NEMBClient:
     if _nemb_client is None:
         with _client_lock:
             if _nemb_client is None:
-                _nemb_client = NEMBClient()
+                client = NEMBClient()
+                if client.lib is None:
+                    # No native backend: sample RAPL from sysfs in Python instead
+                    client = SysfsEnergyClient.open() or client
+                _nemb_client = client
     return _nemb_client
 
+# --- Batched Checkpoint Buffers ---
+#
+# With CODEGREEN_CHECKPOINT_MODE=batched, mark() appends (timestamp, id) pairs
+# to a preallocated per-thread array instead of calling into the backend.
+# Buffers are flushed in one foreign call when full, when their thread exits
+# and at interpreter exit. time.monotonic_ns() reads CLOCK_MONOTONIC, the same
+# clock the NEMB timer and providers stamp readings with. Free-threaded builds
+# default to this mode. NEMB releases old readings as the run goes on, so the
+# first buffer and every flush hold the readings from the oldest record that
+# is still buffered.
+
+# On free-threaded builds (3.13t) threads really run in parallel, and a native call
+# per checkpoint would serialise them on NEMB's locks; batched buffers are
+# per-thread and only meet the backend when they are flushed
+_FREE_THREADED = (bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+                  and not getattr(sys, "_is_gil_enabled", lambda: True)())
+_CHECKPOINT_MODE = os.environ.get("CODEGREEN_CHECKPOINT_MODE", "batched" if _FREE_THREADED else "direct").lower()
+_BATCH_CAPACITY = max(1, int(os.environ.get("CODEGREEN_BATCH_SIZE", "8192")))
+
+_monotonic_ns = time.monotonic_ns
+_thread_state = threading.local()
+_thread_buffers: Dict[int, "_CheckpointBuffer"] = {}
+_thread_buffers_lock = threading.Lock()
+_readings_held = False
+
+
+class _CheckpointBuffer:
+    """Preallocated array of interleaved (timestamp_ns, checkpoint_id) records for one thread"""
+
+    __slots__ = ("records", "count", "size", "thread_key")
+
+    def __init__(self, capacity: int, thread_key: int):
+        self.records = array('Q', bytes(16 * capacity))
+        self.count = 0  # Slots used (two per record)
+        self.size = len(self.records)
+        self.thread_key = thread_key
+
+    def flush(self):
+        """Hand buffered records to the backend and reset the buffer"""
+        count = self.count
+        if count:
+            self.count = 0
+            client = _get_nemb_client()
+            client.mark_checkpoints_batch(self.records, count // 2, self.thread_key)
+            # Records taken from now on are newer than the hold
+            now = _monotonic_ns()
+            client.hold_readings_from(min(now, _oldest_buffered_ns()))
+
+
+class _ThreadExitFlush:
+    """Thread-local sentinel that flushes its thread's buffer when the thread ends"""
+
+    __slots__ = ("buffer",)
+
+    def __init__(self, buffer: _CheckpointBuffer):
+        self.buffer = buffer
+
+    def __del__(self):
+        try:
+            self.buffer.flush()
+            with _thread_buffers_lock:
+                _thread_buffers.pop(self.buffer.thread_key, None)
+        except Exception:
+            pass
+
+
+def _new_thread_buffer() -> _CheckpointBuffer:
+    """Create and register the calling thread's checkpoint buffer"""
+    global _readings_held
+    if not _readings_held:
+        # Later holds come from flushes
+        _get_nemb_client().hold_readings_from(_monotonic_ns())
+        _readings_held = True
+    thread_key = threading.get_ident()
+    buffer = _CheckpointBuffer(_BATCH_CAPACITY, thread_key)
+    _thread_state.buffer = buffer
+    _thread_state.exit_flush = _ThreadExitFlush(buffer)
+    with _thread_buffers_lock:
+        _thread_buffers[thread_key] = buffer
+    return buffer
+
+
+def _mark_batched(numeric_id: int):
+    """Append an integer checkpoint to the calling thread's buffer"""
+    try:
+        buffer = _thread_state.buffer
+    except AttributeError:
+        buffer = _new_thread_buffer()
+    i = buffer.count
+    records = buffer.records
+    records[i] = _monotonic_ns()
+    records[i + 1] = numeric_id
+    i += 2
+    buffer.count = i
+    if i == buffer.size:
+        buffer.flush()
+
+
+def _flush_thread_buffers():
+    """Flush every registered thread buffer (called before results are read)"""
+    _flush_pending_marks()
+    with _thread_buffers_lock:
+        buffers = list(_thread_buffers.values())
+    for buffer in buffers:
+        buffer.flush()
+
+
+# --- Result Reporting ---
+#
+# The CLI passes a result path in CODEGREEN_RESULT_FILE and streams the
+# program's stdout/stderr straight through, so results never share a channel
+# with user output. The first measured process owns that path
+# (CODEGREEN_RESULT_OWNER); forked and spawned children write a shard named
+# <path>.<pid> that the CLI merges into the report.
+
+_RESULT_FILE_ENV = "CODEGREEN_RESULT_FILE"
+_RESULT_OWNER_ENV = "CODEGREEN_RESULT_OWNER"
+if os.environ.get(_RESULT_FILE_ENV):
+    os.environ.setdefault(_RESULT_OWNER_ENV, str(os.getpid()))
+
+# Extra top-level result keys produced by optional runtime modes at exit
+_result_sections: Dict[str, Callable[[], Optional[Dict]]] = {}
+
+
+def _write_result_file(results: Dict, path: str):
+    """Write results beside path and rename into place so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+
+
+def _is_result_owner() -> bool:
+    """Whether this process writes the result file itself rather than a shard"""
+    return os.environ.get(_RESULT_OWNER_ENV, str(os.getpid())) == str(os.getpid())
+
+
+def _process_path(path: str) -> str:
+    """``path`` for the result owner, its shard ``path.<pid>`` for child processes"""
+    return path if _is_result_owner() else f"{path}.{os.getpid()}"
+
+
 def _report_at_exit():
-    """Report measurements to stdout in a way that CLI can parse"""
+    """Write measurements to the CLI's result file (printed when run standalone)"""
+    if _calibrate_at_exit and codegreen_calibration._CALIBRATION_CALLS > 0:
+        codegreen_calibration._calibrate_once()
+    _flush_thread_buffers()
     client = _get_nemb_client()
     measurements = client.get_final_measurements()
     
-    if not measurements:
-        return
-    
-    # Wrap in clear markers for CLI tool parsing
-    print("\n--- CODEGREEN_RESULT_START ---")
     results = {
         "measurements": measurements
     }
+    for name, produce in _result_sections.items():
+        section = produce()
+        if section:
+            results[name] = section
+    if not measurements and len(results) == 1:
+        return
+    results["threads"] = codegreen_tasks._thread_table()
+    results["pid"] = os.getpid()
+    results["parent_pid"] = os.getppid()
+    
+    result_path = os.environ.get(_RESULT_FILE_ENV)
+    if result_path:
+        _write_result_file(results, _process_path(result_path))
+        return
+    
+    # Standalone run without the CLI: show the results to the user
+    print("\n--- CODEGREEN_RESULT_START ---")
     print(json.dumps(results))
     print("--- CODEGREEN_RESULT_END ---")
 
 import atexit
-atexit.register(_report_at_exit)
+if not _DISABLED:
+    atexit.register(_report_at_exit)
+
+# --- Online Aggregation ---
+#
+# With CODEGREEN_AGGREGATE=1 the backend matches enter/exit checkpoints per
+# thread as they arrive and keeps only count/sum/min/max/variance of energy
+# and duration per function, so long-running services use memory
+# proportional to the number of checkpoints rather than calls. Results are
+# reported under "aggregates" instead of per-call "measurements".
+
+_AGGREGATE = os.environ.get("CODEGREEN_AGGREGATE", "0").lower() in ("1", "true", "yes")
+_aggregation_enabled = False
+
+
+def _pairing_specs(entries: List[Dict]) -> List[int]:
+    """
+    Build (enter_id << 1) | is_exit specs, indexed by checkpoint ID, from manifest entries.
+
+    An exit pairs with the nearest preceding enter of the same function name,
+    which keeps same-named methods of different classes apart.
+    """
+    if not entries:
+        return []
+    specs = [_UNPAIRED_CHECKPOINT] * (max(e["id"] for e in entries) + 1)
+    enters: Dict[str, List] = {}
+    for entry in entries:
+        if entry.get("type") == "enter":
+            specs[entry["id"]] = entry["id"] << 1
+            enters.setdefault(entry.get("name"), []).append((entry.get("line") or 0, entry["id"]))
+    for entry in entries:
+        if entry.get("type") != "exit":
+            continue
+        candidates = enters.get(entry.get("name"))
+        if not candidates:
+            continue
+        line = entry.get("line") or 0
+        preceding = [c for c in candidates if c[0] <= line]
+        enter_id = max(preceding)[1] if preceding else min(candidates)[1]
+        specs[entry["id"]] = (enter_id << 1) | 1
+    return specs
+
+
+def enable_aggregation():
+    """
+    Switch the backend to online aggregation for the rest of the run.
+
+    Integer checkpoints are paired using the manifest named by
+    CODEGREEN_MANIFEST_FILE and any code objects already seen in monitoring mode.
+    """
+    global _aggregation_enabled
+    client = _get_nemb_client()
+    if _aggregation_enabled or not client.has_aggregation:
+        return
+    client.set_checkpoint_pairing(0, _pairing_specs(_load_manifest_entries()))
+    client.enable_aggregation(True)
+    _aggregation_enabled = True
+    _result_sections["aggregates"] = lambda: _get_nemb_client().get_checkpoint_aggregates()
+
+
+# Tasks created before the first checkpoint need the factory too
+if codegreen_tasks._ASYNC_TASKS and not _DISABLED:
+    enable_task_tracking()
+
 
 def measure_checkpoint(checkpoint_id: str, checkpoint_type: str, 
                       name: str, line_number: int, context: str):
@@ -167,8 +330,926 @@ def checkpoint(checkpoint_id: str, name: str, checkpoint_type: str):
     measure_checkpoint(checkpoint_id, checkpoint_type, name, 0, "")
 
 
+def mark(numeric_id: int):
+    """
+    Mark an integer checkpoint emitted by the instrumenter.
+
+    The ID indexes the checkpoint manifest written next to the instrumented
+    file, so no string is built or encoded per call. The first call resolves
+    the backend and rebinds ``mark`` to the native entry point (or to the
+    per-thread batch buffer when CODEGREEN_CHECKPOINT_MODE=batched, or to
+    the task-aware path when CODEGREEN_ASYNC_TASKS=1);
+    instrumented code looks the attribute up on every call and picks up the
+    fast path. While the backend is still initialising in the background,
+    ``mark`` buffers timestamped checkpoints until it is live.
+
+    Args:
+        numeric_id: Dense checkpoint ID assigned by LanguageEngine.instrument_code
+    """
+    global mark
+    if _init_thread is not None and _nemb_client is None:
+        pending = False
+        with _pending_lock:
+            if _nemb_client is None:
+                mark = _mark_pending
+                pending = True
+        if pending:
+            # Either still _mark_pending or already rebound by the init thread
+            mark(numeric_id)
+            return
+    native_mark = _bind_mark(_CHECKPOINT_MODE == "batched")
+    if codegreen_calibration._CALIBRATION_CALLS > 0:
+        # Before the first real checkpoint, so no span includes the loop
+        codegreen_calibration._calibrate_once()
+    native_mark(numeric_id)
+
+
+def _bind_mark(batched: bool):
+    """Rebind ``mark`` to the fastest checkpoint path the backend supports and return it"""
+    global mark
+    client = _get_nemb_client()
+    if _AGGREGATE:
+        enable_aggregation()
+    if codegreen_tasks._ASYNC_TASKS and enable_task_tracking():
+        native_mark = codegreen_tasks._mark_task_aware
+    elif batched and client.has_checkpoint_batches:
+        native_mark = _mark_batched
+    else:
+        native_mark = client.native_mark_checkpoint_id()
+    mark = native_mark
+    return native_mark
+
+
+# --- sys.monitoring Mode (PEP 669) ---
+#
+# `codegreen measure python --mode monitoring` runs the unmodified script
+# through run_monitored(). Function enter/exit checkpoints come from
+# sys.monitoring callbacks instead of rewritten source: PY_START/PY_RESUME
+# mark an enter, PY_RETURN/PY_YIELD/PY_UNWIND an exit. Code objects get
+# checkpoint IDs the first time they run and are written to the manifest at
+# exit, so the CLI resolves them like instrumented checkpoints.
+
+_MANIFEST_FILE_ENV = "CODEGREEN_MANIFEST_FILE"
+# Enter events recorded per code object before its callbacks are disabled (0 = no limit)
+_MONITOR_BUDGET = int(os.environ.get("CODEGREEN_MONITOR_BUDGET", "10000"))
+
+# code object -> [enter_id, exit_id, calls, active, exhausted], or False if not monitored
+_monitored_code: Dict[object, object] = {}
+_monitor_entries: List[Dict] = []
+_monitor_lock = threading.Lock()
+_monitor_config: Dict = {}
+
+
+def _monitor_register(code):
+    """Decide whether a code object is monitored and assign its checkpoint IDs"""
+    with _monitor_lock:
+        state = _monitored_code.get(code)
+        if state is not None:
+            return state
+        filename = code.co_filename
+        if filename == _monitor_config["script"] or os.path.realpath(filename) == _monitor_config["script"]:
+            functions = _monitor_config["functions"]
+            selected = code.co_name != "<module>" and (functions is None or code.co_name in functions)
+        else:
+            selected = not filename.startswith(_monitor_config["internal"]) and (
+                not filename.startswith(_monitor_config["stdlib"])
+                or filename.startswith(_monitor_config["site"]))
+        if not selected:
+            _monitored_code[code] = False
+            return False
+
+        enter_id = len(_monitor_entries)
+        name = code.co_qualname
+        line = code.co_firstlineno
+        for checkpoint_type, point_type in (("enter", "function_enter"), ("exit", "function_exit")):
+            _monitor_entries.append({
+                "id": len(_monitor_entries),
+                "checkpoint_id": f"{point_type}_{name}_{line}_0",
+                "type": checkpoint_type,
+                "point_type": point_type,
+                "name": name,
+                "line": line,
+                "column": 0,
+                "file": filename,
+            })
+        state = [enter_id, enter_id + 1, 0, 0, False]
+        _monitored_code[code] = state
+    if _aggregation_enabled:
+        _get_nemb_client().set_checkpoint_pairing(enter_id, [enter_id << 1, (enter_id << 1) | 1])
+    return state
+
+
+def _monitor_enter(code, offset):
+    state = _monitored_code.get(code)
+    if state is None:
+        state = _monitor_register(code)
+    if not state or state[4]:
+        return _MONITOR_DISABLE
+    if state[2] >= _MONITOR_BUDGET > 0 and not state[3]:
+        # Budget spent and no marked frame in flight, so enters and exits stay paired
+        state[4] = True
+        return _MONITOR_DISABLE
+    state[2] += 1
+    state[3] += 1
+    mark(state[0])
+
+
+def _monitor_exit(code, offset, retval):
+    state = _monitored_code.get(code)
+    if state is None:
+        state = _monitor_register(code)
+    if not state or state[4]:
+        return _MONITOR_DISABLE
+    if state[3]:
+        state[3] -= 1
+        mark(state[1])
+
+
+def _monitor_unwind(code, offset, exception):
+    # PY_UNWIND is a global event and cannot be disabled per code object
+    state = _monitored_code.get(code)
+    if state and not state[4] and state[3]:
+        state[3] -= 1
+        mark(state[1])
+
+
+def _stop_monitoring():
+    """Stop callbacks and record discovered code objects in the manifest"""
+    tool_id = _monitor_config.pop("tool_id", None)
+    if tool_id is None:
+        return
+    monitoring = sys.monitoring
+    monitoring.set_events(tool_id, 0)
+    monitoring.free_tool_id(tool_id)
+
+    manifest_path = os.environ.get(_MANIFEST_FILE_ENV)
+    if not manifest_path:
+        return
+    manifest = _monitor_config["manifest"]
+    with _monitor_lock:
+        manifest["checkpoints"] = list(_monitor_entries)
+    # Forked children assign IDs of their own, so they keep a manifest shard
+    _write_result_file(manifest, _process_path(manifest_path))
+
+
+def start_monitoring(script: str):
+    """
+    Register sys.monitoring callbacks that emit function checkpoints.
+
+    Functions of ``script`` are enabled when the manifest named by
+    CODEGREEN_MANIFEST_FILE selects them (all functions without a manifest);
+    code in other non-stdlib modules is always enabled. Requires Python 3.12+.
+    """
+    global _MONITOR_DISABLE
+    if not hasattr(sys, "monitoring"):
+        raise RuntimeError("codegreen monitoring mode requires Python 3.12 or newer")
+    monitoring = sys.monitoring
+    events = monitoring.events
+
+    manifest = {"version": 1, "language": "python", "source_file": script, "checkpoints": []}
+    manifest_path = os.environ.get(_MANIFEST_FILE_ENV)
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    functions = manifest.get("functions")
+
+    paths = sysconfig.get_paths()
+    _monitor_config.update(
+        script=os.path.realpath(script),
+        functions=set(functions) if functions is not None else None,
+        # The runtime's own modules, all named codegreen_*
+        internal=("<", os.path.join(os.path.dirname(__file__), "codegreen_")),
+        stdlib=(paths["stdlib"], paths["platstdlib"]),
+        # site-packages usually lives inside the stdlib directory
+        site=(paths["purelib"], paths["platlib"]),
+        manifest=manifest,
+    )
+
+    tool_id = monitoring.PROFILER_ID
+    if monitoring.get_tool(tool_id) is not None:
+        raise RuntimeError(f"sys.monitoring profiler slot is in use by {monitoring.get_tool(tool_id)!r}")
+    monitoring.use_tool_id(tool_id, "codegreen")
+    _monitor_config["tool_id"] = tool_id
+    _MONITOR_DISABLE = monitoring.DISABLE
+
+    monitoring.register_callback(tool_id, events.PY_START, _monitor_enter)
+    monitoring.register_callback(tool_id, events.PY_RESUME, _monitor_enter)
+    monitoring.register_callback(tool_id, events.PY_RETURN, _monitor_exit)
+    monitoring.register_callback(tool_id, events.PY_YIELD, _monitor_exit)
+    monitoring.register_callback(tool_id, events.PY_UNWIND, _monitor_unwind)
+    monitoring.set_events(
+        tool_id,
+        events.PY_START | events.PY_RESUME | events.PY_RETURN | events.PY_YIELD | events.PY_UNWIND,
+    )
+    # Runs before _report_at_exit (atexit is LIFO), so no events fire during reporting
+    atexit.register(_stop_monitoring)
+
+
+def run_monitored(script: str, args: List[str]):
+    """Run ``script`` as __main__ with sys.monitoring checkpoints enabled"""
+    import runpy
+    script = os.path.abspath(script)
+    sys.argv = [script] + list(args)
+    sys.path[0] = os.path.dirname(script)
+    start_monitoring(script)
+    runpy.run_path(script, run_name="__main__")
+
+
+_MONITOR_DISABLE = None
+
+
+# --- Statistical Sampling Mode ---
+#
+# `codegreen measure python --mode sampling` runs the unmodified script
+# through run_sampled(). A background thread snapshots every thread's stack
+# with sys._current_frames() CODEGREEN_SAMPLE_HZ times per second and reads
+# the NEMB energy counter at the same instant. The energy of each interval is
+# split evenly between the stacks sampled at its end, so functions and lines
+# are ranked by measured energy rather than by time. Samples are wall-clock:
+# threads blocked in I/O or locks receive a share too.
+
+_SAMPLE_HZ = float(os.environ.get("CODEGREEN_SAMPLE_HZ", "200"))
+
+
+def _code_name(code) -> str:
+    """Qualified function name of a code object (co_qualname is 3.11+)"""
+    return getattr(code, "co_qualname", code.co_name)
+
+
+class _EnergySampler(threading.Thread):
+    """Background thread attributing energy to sampled stacks"""
+
+    def __init__(self, interval_s: float):
+        super().__init__(name="codegreen-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.stop_event = threading.Event()
+        self.samples = 0
+        self.total_joules = 0.0
+        self.start_ns = 0
+        self.end_ns = 0
+        # code -> [self_samples, self_joules, total_samples, total_joules]
+        self.functions: Dict[object, List] = {}
+        # (code, line) -> [samples, joules]
+        self.lines: Dict[tuple, List] = {}
+
+    def run(self):
+        client = _get_nemb_client()
+        own_ident = threading.get_ident()
+        current_frames = sys._current_frames
+        functions = self.functions
+        lines = self.lines
+
+        last_ns = self.start_ns = _monotonic_ns()
+        last_joules, _ = client.read_energy()
+        while not self.stop_event.wait(self.interval_s):
+            now_ns = _monotonic_ns()
+            joules, watts = client.read_energy()
+            if joules > last_joules:
+                interval_joules = joules - last_joules
+            else:
+                # Counter unavailable: estimate from instantaneous power
+                interval_joules = watts * (now_ns - last_ns) / 1e9
+            last_ns, last_joules = now_ns, joules
+
+            frames = current_frames()
+            frames.pop(own_ident, None)
+            if not frames:
+                continue
+            self.samples += 1
+            self.total_joules += interval_joules
+            share = interval_joules / len(frames)
+
+            for frame in frames.values():
+                code = frame.f_code
+                stats = functions.get(code)
+                if stats is None:
+                    stats = functions[code] = [0, 0.0, 0, 0.0]
+                stats[0] += 1
+                stats[1] += share
+                key = (code, frame.f_lineno)
+                line_stats = lines.get(key)
+                if line_stats is None:
+                    line_stats = lines[key] = [0, 0.0]
+                line_stats[0] += 1
+                line_stats[1] += share
+
+                # Inclusive totals count each function once per stack (recursion)
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    if code not in seen:
+                        seen.add(code)
+                        stats = functions.get(code)
+                        if stats is None:
+                            stats = functions[code] = [0, 0.0, 0, 0.0]
+                        stats[2] += 1
+                        stats[3] += share
+                    frame = frame.f_back
+        self.end_ns = _monotonic_ns()
+
+    def summary(self) -> Dict:
+        """Stop sampling and return the energy profile as a result section"""
+        self.stop_event.set()
+        self.join()
+        functions = [
+            {
+                "name": _code_name(code),
+                "file": code.co_filename,
+                "line": code.co_firstlineno,
+                "self_samples": stats[0],
+                "self_joules": stats[1],
+                "total_samples": stats[2],
+                "total_joules": stats[3],
+            }
+            for code, stats in self.functions.items()
+        ]
+        functions.sort(key=lambda f: (f["self_joules"], f["self_samples"]), reverse=True)
+        lines = [
+            {
+                "file": code.co_filename,
+                "line": line,
+                "function": _code_name(code),
+                "samples": stats[0],
+                "joules": stats[1],
+            }
+            for (code, line), stats in self.lines.items()
+        ]
+        lines.sort(key=lambda l: (l["joules"], l["samples"]), reverse=True)
+        return {
+            "interval_ns": int(self.interval_s * 1e9),
+            "samples": self.samples,
+            "duration_ns": self.end_ns - self.start_ns,
+            "total_joules": self.total_joules,
+            "functions": functions,
+            "lines": lines,
+        }
+
+
+_sampler: Optional[_EnergySampler] = None
+
+
+def start_sampling(hz: Optional[float] = None):
+    """
+    Start the sampling energy profiler; its profile is reported at exit.
+
+    Args:
+        hz: Samples per second (defaults to CODEGREEN_SAMPLE_HZ, 200)
+    """
+    global _sampler
+    if _sampler is not None:
+        return
+    # Bring NEMB up first so the first interval starts from a live counter
+    _get_nemb_client()
+    _sampler = _EnergySampler(1.0 / (hz or _SAMPLE_HZ))
+    _sampler.start()
+    _result_sections["sampling"] = _sampler.summary
+
+
+def run_sampled(script: str, args: List[str]):
+    """Run ``script`` as __main__ under the sampling energy profiler"""
+    import runpy
+    script = os.path.abspath(script)
+    sys.argv = [script] + list(args)
+    sys.path[0] = os.path.dirname(script)
+    start_sampling()
+    runpy.run_path(script, run_name="__main__")
+
+
+# --- Periodic Flush ---
+#
+# Results are otherwise only produced at exit, which a service that never
+# exits cleanly does not reach. With CODEGREEN_FLUSH_INTERVAL=N a background
+# thread drains the checkpoints already covered by energy readings every N
+# seconds and hands the window to a sink; the backend then frees the
+# window's markers and readings, so memory stays bounded. CODEGREEN_FLUSH_SINK
+# selects the sink:
+#
+#   file:PATH         one JSON line per window (default: codegreen_windows.jsonl)
+#   sqlite:PATH       one row per checkpoint in a "checkpoints" table
+#   prometheus:URL    per-function energy counters PUT to a Pushgateway group URL
+#
+# Checkpoints newer than the last reading at exit stay in the exit report.
+
+_FLUSH_INTERVAL = float(os.environ.get("CODEGREEN_FLUSH_INTERVAL", "0"))
+_FLUSH_SINK = os.environ.get("CODEGREEN_FLUSH_SINK", "file:codegreen_windows.jsonl")
+
+
+class FileSink:
+    """Append each window to a file as one JSON line"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, window: Dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(window) + "\n")
+
+    def close(self):
+        pass
+
+
+class SQLiteSink:
+    """Insert each window's checkpoints into a 'checkpoints' table"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+
+    def write(self, window: Dict):
+        if self.conn is None:
+            import sqlite3
+            # Created lazily: sqlite3 connections belong to the thread that opens them
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "window_end_ns INTEGER, checkpoint_id TEXT, timestamp_ns INTEGER, joules REAL, watts REAL)"
+            )
+        end_ns = window["window_end_ns"]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                [(end_ns, m["checkpoint_id"], m["timestamp"], m["joules"], m["watts"])
+                 for m in window["measurements"]],
+            )
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def for_child(self, pid: int) -> "SQLiteSink":
+        # The inherited connection belongs to the parent's flush thread
+        return SQLiteSink(self.path)
+
+
+class _SpanPairer:
+    """Match enter/exit measurements per thread, across window boundaries"""
+
+    def __init__(self, entries: List[Dict]):
+        self.specs = _pairing_specs(entries)
+        self.names = {e["id"]: e.get("name") or str(e["id"]) for e in entries}
+        # thread -> stack of [match_key, function, enter_joules, enter_ns]
+        self.open_frames: Dict[str, List] = {}
+
+    def function_name(self, base: str) -> Optional[str]:
+        """Function of an "enter" checkpoint name, or None for other checkpoints"""
+        if base.isdigit():
+            checkpoint_id = int(base)
+            if checkpoint_id < len(self.specs) and self.specs[checkpoint_id] == checkpoint_id << 1:
+                return self.names.get(checkpoint_id, base)
+            return None
+        parts = base.split(":")
+        return parts[1] if len(parts) > 1 and parts[0] == "enter" else None
+
+    def feed(self, measurements: List[Dict]):
+        """Yield (function, joules, duration_ns) for every span closed by measurements"""
+        for m in measurements:
+            base, _, suffix = m["checkpoint_id"].rpartition("#inv_")
+            thread = suffix.rpartition("_t")[2]
+            if base.isdigit():
+                checkpoint_id = int(base)
+                spec = self.specs[checkpoint_id] if checkpoint_id < len(self.specs) else _UNPAIRED_CHECKPOINT
+                if spec == _UNPAIRED_CHECKPOINT:
+                    continue
+                key, is_exit = spec >> 1, spec & 1
+                function = self.names.get(key, str(key))
+            else:
+                kind, _, rest = base.partition(":")
+                if kind not in ("enter", "exit"):
+                    continue
+                key = function = rest.partition(":")[0]
+                is_exit = kind == "exit"
+
+            frames = self.open_frames.setdefault(thread, [])
+            if not is_exit:
+                frames.append([key, function, m["joules"], m["timestamp"]])
+                continue
+            # Frames left open by exceptions are dropped on the way down
+            while frames:
+                frame = frames.pop()
+                if frame[0] == key:
+                    yield frame[1], max(0.0, m["joules"] - frame[2]), m["timestamp"] - frame[3]
+                    break
+            if not frames:
+                del self.open_frames[thread]
+
+
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class PrometheusPushSink:
+    """
+    Push cumulative per-function energy, call and duration counters to a
+    Prometheus Pushgateway group URL (e.g. http://host:9091/metrics/job/app).
+    """
+
+    def __init__(self, url: str, entries: Optional[List[Dict]] = None):
+        self.url = url
+        self.entries = entries or []
+        self.pairer = _SpanPairer(self.entries)
+        # function -> [calls, joules, duration_ns]
+        self.totals: Dict[str, List] = {}
+
+    def write(self, window: Dict):
+        if window.get("aggregates"):
+            # Online aggregation already keeps cumulative per-function totals
+            for aggregate in window["aggregates"]:
+                function = self.pairer.function_name(aggregate["checkpoint_id"]) or aggregate["checkpoint_id"]
+                self.totals[function] = [aggregate["count"], aggregate["energy_joules"]["sum"],
+                                         aggregate["duration_ns"]["sum"]]
+        else:
+            for function, joules, duration_ns in self.pairer.feed(window["measurements"]):
+                totals = self.totals.setdefault(function, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += joules
+                totals[2] += duration_ns
+        self.push()
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        metrics = [
+            ("codegreen_function_calls_total", "Completed calls per function", 0, 1),
+            ("codegreen_function_energy_joules_total", "Energy per function", 1, 1),
+            ("codegreen_function_duration_seconds_total", "Wall time per function", 2, 1e-9),
+        ]
+        lines = []
+        for metric, help_text, index, scale in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for function, totals in sorted(self.totals.items()):
+                lines.append(f'{metric}{{function="{_prometheus_label(function)}"}} {totals[index] * scale}')
+        return "\n".join(lines) + "\n"
+
+    def push(self):
+        import urllib.request
+        request = urllib.request.Request(
+            self.url, data=self.render().encode("utf-8"), method="PUT",
+            headers={"Content-Type": "text/plain; version=0.0.4"},
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+    def close(self):
+        pass
+
+    def for_child(self, pid: int) -> "PrometheusPushSink":
+        # A PUT replaces the whole group, so each process pushes to its own
+        return PrometheusPushSink(f"{self.url.rstrip('/')}/pid/{pid}", self.entries)
+
+
+def _load_manifest_entries() -> List[Dict]:
+    """Checkpoint entries from CODEGREEN_MANIFEST_FILE plus those registered by monitoring mode"""
+    entries = []
+    manifest_path = os.environ.get(_MANIFEST_FILE_ENV)
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            entries.extend(json.load(f).get("checkpoints", []))
+    with _monitor_lock:
+        entries.extend(_monitor_entries)
+    return entries
+
+
+def open_sink(spec: str):
+    """Create a flush sink from a "file:PATH", "sqlite:PATH" or "prometheus:URL" spec"""
+    kind, _, target = spec.partition(":")
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "sqlite" and target:
+        return SQLiteSink(target)
+    if kind == "prometheus" and target:
+        return PrometheusPushSink(target, _load_manifest_entries())
+    raise ValueError(f"Unknown flush sink: {spec!r}")
+
+
+class _FlushThread(threading.Thread):
+    """Background thread draining correlated checkpoints into a sink every interval"""
+
+    def __init__(self, interval_s: float, sink):
+        super().__init__(name="codegreen-flush", daemon=True)
+        self.interval_s = interval_s
+        self.sink = sink
+        self.stop_event = threading.Event()
+        self.window_start_ns = _monotonic_ns()
+
+    def flush(self):
+        client = _get_nemb_client()
+        window_end_ns, measurements = client.drain_measurements(_oldest_buffered_ns())
+        aggregates = client.get_checkpoint_aggregates() if _aggregation_enabled else []
+        if not window_end_ns:
+            return
+        window = {
+            "pid": os.getpid(),
+            "window_start_ns": self.window_start_ns,
+            "window_end_ns": window_end_ns,
+            "measurements": measurements,
+        }
+        if aggregates:
+            window["aggregates"] = aggregates
+        self.window_start_ns = window_end_ns
+        if measurements or aggregates:
+            self.sink.write(window)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval_s):
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep flushing: a sink that is down now may be back next window
+                print(f"codegreen: periodic flush failed: {e}", file=sys.stderr)
+
+    def stop(self):
+        """Stop the thread, flush the last window and close the sink"""
+        self.stop_event.set()
+        self.join()
+        try:
+            _flush_thread_buffers()
+            self.flush()
+        finally:
+            self.sink.close()
+
+
+def _oldest_buffered_ns() -> int:
+    """
+    Timestamp of the oldest record still waiting in a batched thread buffer.
+
+    Live buffers are only flushed by their own thread, so windows stop short
+    of it; otherwise those records would arrive after their readings were freed.
+    """
+    oldest = 2**64 - 1
+    for pending in list(_pending_marks.values()):
+        if pending:
+            oldest = min(oldest, pending[0])
+    with _thread_buffers_lock:
+        buffers = list(_thread_buffers.values())
+    for buffer in buffers:
+        if buffer.count:
+            oldest = min(oldest, buffer.records[0])
+    return oldest
+
+
+_flusher: Optional[_FlushThread] = None
+
+
+def start_periodic_flush(interval: Optional[float] = None, sink=None):
+    """
+    Drain correlated checkpoints to a sink every ``interval`` seconds.
+
+    Args:
+        interval: Seconds between windows (defaults to CODEGREEN_FLUSH_INTERVAL)
+        sink: Object with write(window) and close(), or a sink spec string
+              (defaults to CODEGREEN_FLUSH_SINK)
+    """
+    global _flusher
+    interval = interval or _FLUSH_INTERVAL
+    if _flusher is not None or interval <= 0:
+        return
+    if sink is None or isinstance(sink, str):
+        sink = open_sink(sink or _FLUSH_SINK)
+    _flusher = _FlushThread(interval, sink)
+    _flusher.start()
+    # Registered after _report_at_exit, so it runs first and the report gets the rest
+    atexit.register(stop_periodic_flush)
+
+
+def stop_periodic_flush():
+    """Flush the final window and stop the flush thread"""
+    global _flusher
+    flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop()
+
+
+if _FLUSH_INTERVAL > 0 and not _DISABLED:
+    start_periodic_flush()
+
+
+# --- Thread Table ---
+#
+# The table itself is kept by codegreen_tasks; the importing thread and every
+# thread started afterwards register in it.
+
+if not _DISABLED:
+    codegreen_tasks._register_thread()
+    if getattr(threading, "getprofile", lambda: None)() is None:
+        # Leave a profiler the program installed for its threads alone
+        threading.setprofile(codegreen_tasks._thread_started)
+
+
+# --- Process Forks ---
+#
+# A child created by os.fork() (or multiprocessing's fork start method)
+# inherits the parent's client, thread buffers and background threads, but
+# only the forking thread keeps running. NEMB gives the child a fresh meter;
+# the hook below empties the inherited buffers, restarts the runtime's
+# background threads and makes the child report to its own result shard.
+# multiprocessing children leave through os._exit(), which skips atexit, so
+# their report runs as a multiprocessing finalizer instead.
+
+# Child that already reported (a grandchild inherits its parent's finalizer)
+_child_reported_pid = 0
+
+
+def _report_child_at_exit():
+    global _child_reported_pid
+    if _child_reported_pid == os.getpid():
+        return
+    _child_reported_pid = os.getpid()
+    stop_periodic_flush()
+    if "tool_id" in _monitor_config:
+        _stop_monitoring()
+    _report_at_exit()
+
+
+def _register_child_report():
+    """Report from a multiprocessing child, which exits without running atexit"""
+    if "multiprocessing" not in sys.modules:
+        return
+    from multiprocessing import util
+    # util runs finalizers from atexit too, so plain os.fork() children still report once
+    atexit.unregister(_report_at_exit)
+
+    def register(_=None):
+        util.Finalize(None, _report_child_at_exit, exitpriority=0)
+
+    register()
+    # Process._bootstrap() drops finalizers registered before it, then runs after-fork hooks
+    util.register_after_fork(_report_child_at_exit, register)
+
+
+def _after_fork_in_child():
+    """Give a forked child its own checkpoint buffers, background threads and result shard"""
+    global _client_lock, _thread_buffers_lock, _monitor_lock, _pending_lock, _aggregation_enabled, _flusher, _sampler
+    _client_lock = threading.Lock()
+    _pending_lock = threading.Lock()
+    _thread_buffers_lock = threading.Lock()
+    _monitor_lock = threading.Lock()
+
+    # Bring the child's meter up before its first checkpoint
+    if _nemb_client is not None:
+        _nemb_client.reset_after_fork()
+
+    # Records buffered by the parent were the parent's to report
+    pending = getattr(_thread_state, "pending", None)
+    _pending_marks.clear()
+    if pending is not None:
+        del pending[:]
+        _pending_marks[threading.get_ident()] = pending
+    buffer = getattr(_thread_state, "buffer", None)
+    _thread_buffers.clear()
+    if buffer is not None:
+        buffer.count = 0
+        _thread_buffers[buffer.thread_key] = buffer
+    if _readings_held:
+        # The child's meter holds nothing for the buffers yet
+        _nemb_client.hold_readings_from(_monotonic_ns())
+
+    # Only the forking thread survives into the child
+    codegreen_tasks._restart_thread_table()
+
+    # The child's meter starts without the parent's settings
+    if _aggregation_enabled:
+        _aggregation_enabled = False
+        enable_aggregation()
+    flusher, _flusher = _flusher, None
+    if flusher is not None:
+        sink = flusher.sink
+        if hasattr(sink, "for_child"):
+            sink = sink.for_child(os.getpid())
+        start_periodic_flush(flusher.interval_s, sink)
+    sampler, _sampler = _sampler, None
+    if sampler is not None:
+        start_sampling(1.0 / sampler.interval_s)
+
+    # Initialisation the parent had in flight died with its thread
+    if _init_thread is not None and _nemb_client is None:
+        _start_background_init()
+
+    _register_child_report()
+
+
+if not _DISABLED:
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+    # Spawned multiprocessing children import the runtime afresh
+    if not _is_result_owner():
+        _register_child_report()
+
+
+# --- Background Initialisation ---
+#
+# Creating the NEMB meter starts its provider threads and waits until they
+# deliver readings, which takes up to seconds with accuracy-oriented configs.
+# Instead of paying that inside the first instrumented function, the runtime
+# creates the client on a thread started at import
+# (CODEGREEN_BACKGROUND_INIT=0 restores creating it on the first checkpoint).
+# Checkpoints taken before the client exists are kept with their
+# CLOCK_MONOTONIC timestamps and handed over as per-thread batches once it
+# does; NEMB correlates them by timestamp like any other batched records.
+# After such a handover mark() stays on the batched path, whose thread keys
+# the handed-over records carry, so spans started before the meter was live
+# still pair. Overhead calibration for these runs moves to exit, where it
+# does not compete with the program for the CPU. Regions opened meanwhile are
+# buffered under their checkpoint names, interned when they are handed over.
+
+_BACKGROUND_INIT = os.environ.get("CODEGREEN_BACKGROUND_INIT", "1").lower() in ("1", "true", "yes")
+
+_init_thread: Optional[threading.Thread] = None
+_pending_lock = threading.Lock()
+# thread_key -> that thread's [timestamp_ns, checkpoint_id, ...] taken before the client existed;
+# region checkpoints are kept by name instead of ID
+_pending_marks: Dict[int, List[Union[int, str]]] = {}
+_calibrate_at_exit = False
+
+
+def _mark_pending(numeric_id: Union[int, str]):
+    """Keep a checkpoint (an ID, or a name to intern) taken while the backend is still initialising"""
+    try:
+        pending = _thread_state.pending
+    except AttributeError:
+        pending = _thread_state.pending = []
+        with _pending_lock:
+            _pending_marks[threading.get_ident()] = pending
+    pending.extend((_monotonic_ns(), numeric_id))
+
+
+def _flush_pending_marks():
+    """Hand checkpoints taken before the backend was live to it, one batch per thread"""
+    if not _pending_marks:
+        return
+    with _pending_lock:
+        threads = list(_pending_marks.items())
+    client = _get_nemb_client()
+    for thread_key, pending in threads:
+        # Whole records only; checkpoints racing with the flush stay for the next one
+        count = len(pending) & ~1
+        if not count:
+            continue
+        values = _intern_pending_names(client, pending[:count])
+        del pending[:count]
+        if not values:
+            continue
+        if client.has_checkpoint_batches:
+            client.mark_checkpoints_batch(array('Q', values), len(values) // 2, thread_key)
+        else:
+            # Backends without batches stamp them now; order is kept, times are not
+            native_mark = client.native_mark_checkpoint_id()
+            for numeric_id in values[1::2]:
+                native_mark(numeric_id)
+
+
+def _intern_pending_names(client: NEMBClient, values: List[Union[int, str]]) -> List[int]:
+    """Replace checkpoint names in buffered [timestamp_ns, checkpoint, ...] records with interned IDs"""
+    if all(type(checkpoint) is int for checkpoint in values[1::2]):
+        return values
+    ids: Dict[str, Optional[int]] = {}
+    interned = []
+    for i in range(0, len(values), 2):
+        checkpoint_id = values[i + 1]
+        if type(checkpoint_id) is str:
+            if checkpoint_id not in ids:
+                ids[checkpoint_id] = client.intern_checkpoint(checkpoint_id)
+            checkpoint_id = ids[checkpoint_id]
+            if checkpoint_id is None:
+                # Regions are inert on backends that cannot intern names
+                continue
+        interned += (values[i], checkpoint_id)
+    return interned
+
+
+def _initialize_backend():
+    """Create the client, then move checkpoints buffered meanwhile onto the batched path"""
+    global _calibrate_at_exit
+    _get_nemb_client()
+    with _pending_lock:
+        # Regions opened meanwhile buffer without rebinding mark()
+        if mark is not _mark_pending and not _pending_marks:
+            return
+        _bind_mark(True)
+    _calibrate_at_exit = True
+    _flush_pending_marks()
+
+
+def _start_background_init():
+    global _init_thread
+    _init_thread = threading.Thread(target=_initialize_backend, name="codegreen-init", daemon=True)
+    _init_thread.start()
+
+
+if _BACKGROUND_INIT and _nemb_client is None and not _DISABLED:
+    _start_background_init()
+
+if _DISABLED:
+    # One-argument and three-argument builtins with no side effects
+    mark = id
+    checkpoint = slice
+    measure_checkpoint = lambda *args: None
+
+
 # Export key functions for instrumented code
 __all__ = [
     'measure_checkpoint',
-    'checkpoint'
+    'checkpoint',
+    'mark',
+    'region',
+    'measured'
 ]
\ No newline at end of file
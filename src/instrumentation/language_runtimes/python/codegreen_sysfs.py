@@ -0,0 +1,308 @@
+"""
+Sysfs RAPL fallback for the CodeGreen Python runtime.
+
+Imported through codegreen_runtime, which uses SysfsEnergyClient when
+libcodegreen-nemb cannot be loaded.
+"""
+
+import itertools
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from codegreen_backend import NEMBClient, _NAMED_CHECKPOINT_FLAG
+
+
+# --- Sysfs RAPL Fallback ---
+#
+# Installs that ship only the wheel have no libcodegreen-nemb. Instead of a
+# no-op client, the runtime then keeps checkpoints in Python and correlates
+# them with RAPL counters read from sysfs (CODEGREEN_RAPL_ROOT, default
+# /sys/class/powercap). A background thread reads every package zone's
+# energy_uj through a file descriptor kept open, with os.pread, every
+# CODEGREEN_RAPL_INTERVAL_MS (default 10) into a preallocated ring of
+# CODEGREEN_RAPL_BUFFER samples (default 65536). Wraparound is undone with
+# the zone's max_energy_range_uj. Only top-level zones named package-<n> are
+# summed: subzones (cores, DRAM) are part of their package, intel-rapl-mmio
+# repeats the package zone, and psys covers the whole platform, packages
+# included.
+
+_RAPL_ROOT = os.environ.get("CODEGREEN_RAPL_ROOT", "/sys/class/powercap")
+_RAPL_INTERVAL_S = float(os.environ.get("CODEGREEN_RAPL_INTERVAL_MS", "10")) / 1000
+_RAPL_BUFFER = max(2, int(os.environ.get("CODEGREEN_RAPL_BUFFER", "65536")))
+
+
+class _RaplZone:
+    """Open energy_uj counter of one powercap zone"""
+
+    __slots__ = ("name", "fd", "max_range_uj", "last_uj")
+
+    def __init__(self, name: str, fd: int, max_range_uj: int, last_uj: int):
+        self.name = name
+        self.fd = fd
+        self.max_range_uj = max_range_uj
+        self.last_uj = last_uj
+
+
+def _open_rapl_zones(root: str) -> List[_RaplZone]:
+    """Open the readable package zones ("<type>:<n>" named package-<n>) under a powercap root"""
+    try:
+        entries = sorted(os.listdir(root))
+    except OSError:
+        return []
+    zones = []
+    for entry in entries:
+        kind, _, index = entry.partition(":")
+        if not index.isdigit() or kind.endswith("-mmio"):
+            continue
+        zone_dir = os.path.join(root, entry)
+        try:
+            with open(os.path.join(zone_dir, "name"), 'r', encoding='utf-8') as f:
+                if not f.read().startswith("package"):
+                    continue
+        except OSError:
+            continue
+        try:
+            fd = os.open(os.path.join(zone_dir, "energy_uj"), os.O_RDONLY)
+        except OSError:
+            # energy_uj is root-only on most current kernels
+            continue
+        try:
+            last_uj = int(os.pread(fd, 32, 0))
+        except (OSError, ValueError):
+            os.close(fd)
+            continue
+        try:
+            with open(os.path.join(zone_dir, "max_energy_range_uj"), 'r', encoding='utf-8') as f:
+                max_range_uj = int(f.read())
+        except (OSError, ValueError):
+            max_range_uj = 0
+        zones.append(_RaplZone(entry, fd, max_range_uj, last_uj))
+    return zones
+
+
+class SysfsEnergyClient(NEMBClient):
+    """
+    Pure-Python stand-in for NEMBClient when libcodegreen-nemb is absent.
+
+    Supports integer, batched and interned checkpoints, final and windowed
+    export and read_energy(); aggregation and asyncio task keys need NEMB.
+    """
+
+    def __init__(self, zones: List[_RaplZone], interval_s: float = _RAPL_INTERVAL_S,
+                 capacity: int = _RAPL_BUFFER):
+        # No native library: the inherited NEMB paths stay disabled
+        self.lib = None
+        self.has_checkpoint_ids = True
+        self.has_checkpoint_batches = True
+        self.has_reading_hold = False
+        self.has_binary_export = False
+        self.has_aggregation = False
+        self.has_window_drain = True
+        self.has_context_keys = False
+        self.has_interned_checkpoints = True
+        self.has_discarded_checkpoints = False
+        self.has_reading_columns = False
+        self.has_checkpoint_domains = False
+        self.interned_names: List[str] = []
+        self.discarded_ids: List[int] = []
+        self.name_ids: Dict[str, int] = {}
+        self.zones = zones
+        self.interval_s = interval_s
+        self.capacity = capacity
+        self._reset()
+        self.start()
+
+    @classmethod
+    def open(cls, root: Optional[str] = None) -> Optional["SysfsEnergyClient"]:
+        """Client sampling the zones under root, or None if none are readable"""
+        zones = _open_rapl_zones(root or _RAPL_ROOT)
+        return cls(zones) if zones else None
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.timestamps = array('Q', bytes(8 * self.capacity))
+        self.joules = array('d', bytes(8 * self.capacity))
+        self.watts = array('d', bytes(8 * self.capacity))
+        self.count = 0  # Samples taken; the newest is at (count - 1) % capacity
+        self.total_joules = 0.0
+        # Per-thread [timestamp_ns, checkpoint_id, ...] lists, so threads never share one
+        self.local = threading.local()
+        self.thread_markers: Dict[int, List[int]] = {}
+        # (timestamp_ns, checkpoint_id, thread_key) taken out by a drain but after its window
+        self.carried: List[Tuple[int, int, int]] = []
+        # (thread_key, checkpoint_id) -> invocations already exported by drains
+        self.invocations: Dict[Tuple[int, int], int] = {}
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """Take a first sample and start the sampler thread"""
+        self.sample()
+        threading.Thread(target=self._run, name="codegreen-rapl", daemon=True).start()
+
+    def _run(self):
+        stop_event = self.stop_event
+        while not stop_event.wait(self.interval_s):
+            self.sample()
+
+    def sample(self) -> Tuple[float, float]:
+        """Read every zone, append the cumulative energy and return (joules, watts)"""
+        with self.lock:
+            now_ns = time.monotonic_ns()
+            delta_uj = 0
+            for zone in self.zones:
+                try:
+                    value = int(os.pread(zone.fd, 32, 0))
+                except (OSError, ValueError):
+                    continue
+                delta = value - zone.last_uj
+                if delta < 0:
+                    # The counter wrapped at max_energy_range_uj
+                    delta += zone.max_range_uj
+                zone.last_uj = value
+                delta_uj += max(0, delta)
+            self.total_joules += delta_uj / 1e6
+            return self._append_sample(now_ns, self.total_joules)
+
+    def _append_sample(self, timestamp_ns: int, joules: float) -> Tuple[float, float]:
+        # Requires self.lock
+        count = self.count
+        watts = 0.0
+        if count:
+            previous = (count - 1) % self.capacity
+            elapsed_ns = timestamp_ns - self.timestamps[previous]
+            watts = (joules - self.joules[previous]) * 1e9 / elapsed_ns if elapsed_ns > 0 else self.watts[previous]
+        slot = count % self.capacity
+        self.timestamps[slot] = timestamp_ns
+        self.joules[slot] = joules
+        self.watts[slot] = watts
+        self.count = count + 1
+        return joules, watts
+
+    def _readings(self) -> Tuple[array, array, array]:
+        """Buffered samples, oldest first"""
+        with self.lock:
+            count, capacity = self.count, self.capacity
+            if count <= capacity:
+                return self.timestamps[:count], self.joules[:count], self.watts[:count]
+            head = count % capacity
+            return (self.timestamps[head:] + self.timestamps[:head],
+                    self.joules[head:] + self.joules[:head],
+                    self.watts[head:] + self.watts[:head])
+
+    def mark_checkpoint(self, name: str):
+        self.mark_checkpoint_id(self.intern_checkpoint(name))
+
+    def _thread_markers(self, thread_key: int) -> List[int]:
+        markers = self.thread_markers.get(thread_key)
+        if markers is None:
+            with self.lock:
+                markers = self.thread_markers.setdefault(thread_key, [])
+        return markers
+
+    def mark_checkpoint_id(self, numeric_id: int):
+        try:
+            markers = self.local.markers
+        except AttributeError:
+            markers = self.local.markers = self._thread_markers(threading.get_ident())
+        markers.extend((time.monotonic_ns(), numeric_id))
+
+    def native_mark_checkpoint_id(self):
+        return self.mark_checkpoint_id
+
+    def mark_checkpoints_batch(self, records: array, count: int, thread_key: int):
+        self._thread_markers(thread_key).extend(records[:2 * count])
+
+    def _take_markers(self, remove: bool) -> List[Tuple[int, int, int]]:
+        """Merge the per-thread lists into (timestamp_ns, checkpoint_id, thread_key) tuples"""
+        with self.lock:
+            threads = list(self.thread_markers.items())
+        merged = list(self.carried)
+        for thread_key, markers in threads:
+            # Whole records only; appends racing with a drain land after them and are kept
+            n = len(markers) & ~1
+            taken = markers[:n]
+            if remove:
+                del markers[:n]
+            merged.extend(zip(taken[0::2], taken[1::2], itertools.repeat(thread_key)))
+        if remove:
+            self.carried = []
+        return merged
+
+    def intern_checkpoint(self, name: str) -> Optional[int]:
+        checkpoint_id = self.name_ids.get(name)
+        if checkpoint_id is None:
+            with self.lock:
+                checkpoint_id = self.name_ids.get(name)
+                if checkpoint_id is None:
+                    checkpoint_id = len(self.interned_names) | _NAMED_CHECKPOINT_FLAG
+                    self.interned_names.append(name)
+                    self.name_ids[name] = checkpoint_id
+        return checkpoint_id
+
+    def checkpoint_name(self, checkpoint_id: int) -> str:
+        if not checkpoint_id & _NAMED_CHECKPOINT_FLAG:
+            return str(checkpoint_id)
+        return self.interned_names[checkpoint_id & ~_NAMED_CHECKPOINT_FLAG]
+
+    def get_final_measurements(self) -> List[Dict]:
+        # A last sample covers checkpoints taken since the sampler's previous read
+        self.sample()
+        return self._correlate(self._take_markers(False), dict(self.invocations))
+
+    def drain_measurements(self, until_ns: int = 2**64 - 1) -> Tuple[int, List[Dict]]:
+        with self.lock:
+            latest_ns = self.timestamps[(self.count - 1) % self.capacity] if self.count else 0
+        window_end = min(until_ns, latest_ns)
+        if not window_end:
+            return 0, []
+        taken = self._take_markers(True)
+        self.carried = [m for m in taken if m[0] > window_end]
+        return window_end, self._correlate([m for m in taken if m[0] <= window_end], self.invocations)
+
+    def _correlate(self, markers: List[Tuple[int, int, int]], invocations: Dict) -> List[Dict]:
+        """Interpolate the cumulative energy and power at each checkpoint"""
+        timestamps, joules, watts = self._readings()
+        last = len(timestamps) - 1
+        if last < 0:
+            return []
+        markers.sort(key=lambda m: m[0])
+        discarded = set(self.discarded_ids)
+        names: Dict[int, str] = {}
+        measurements = []
+        for timestamp, checkpoint_id, thread_key in markers:
+            if checkpoint_id in discarded:
+                continue
+            i = bisect_left(timestamps, timestamp)
+            if i > last:
+                at_joules, at_watts = joules[last], watts[last]
+            elif i == 0:
+                at_joules, at_watts = joules[0], watts[0]
+            else:
+                t1, t2 = timestamps[i - 1], timestamps[i]
+                ratio = (timestamp - t1) / (t2 - t1) if t2 > t1 else 0.0
+                at_joules = joules[i - 1] + ratio * (joules[i] - joules[i - 1])
+                at_watts = watts[i - 1] + ratio * (watts[i] - watts[i - 1])
+            key = (thread_key, checkpoint_id)
+            invocation = invocations[key] = invocations.get(key, 0) + 1
+            name = names.get(checkpoint_id)
+            if name is None:
+                name = names[checkpoint_id] = self.checkpoint_name(checkpoint_id)
+            measurements.append({
+                "checkpoint_id": f"{name}#inv_{invocation}_t{thread_key}",
+                "timestamp": timestamp,
+                "joules": at_joules,
+                "watts": at_watts,
+            })
+        return measurements
+
+    def read_energy(self) -> tuple:
+        return self.sample()
+
+    def reset_after_fork(self):
+        # The sampler thread did not survive the fork; zone descriptors did
+        self._reset()
+        self.start()
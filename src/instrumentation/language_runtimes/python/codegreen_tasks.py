@@ -0,0 +1,257 @@
+"""
+asyncio task attribution and the thread table for the CodeGreen Python runtime.
+
+Imported through codegreen_runtime, which binds mark() to the task-aware
+path, registers threads at import and reports the thread table at exit.
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections.abc import Coroutine
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+
+# The codegreen_runtime module; it registers itself through _attach() on import
+runtime = None
+
+
+def _attach(module):
+    """Give this module the runtime's state; called once by codegreen_runtime"""
+    global runtime
+    runtime = module
+
+
+# --- asyncio Task Attribution ---
+#
+# Coroutines of different asyncio tasks interleave on one thread, so
+# thread-keyed enter/exit checkpoints nest incorrectly across tasks. With
+# CODEGREEN_ASYNC_TASKS=1 (set by `codegreen measure` for scripts that define
+# `async def` functions) every task gets a key held in a context variable and
+# its checkpoints are recorded under that key. Each task step reports a
+# resume/suspend to NEMB, which leaves the energy consumed while the task
+# waits at an `await` out of its checkpoints. Task keys are small sequential
+# integers; thread keys are thread identifiers.
+
+_ASYNC_TASKS = os.environ.get("CODEGREEN_ASYNC_TASKS", "0").lower() in ("1", "true", "yes")
+_CONTEXT_SUSPENDED = 0
+_CONTEXT_RESUMED = 1
+_CONTEXT_FINISHED = 2
+
+_task_key: ContextVar[int] = ContextVar("codegreen_task_key", default=0)
+_task_keys = itertools.count(1)
+_task_tracking = False
+# Bound by enable_task_tracking()
+_context_switch: Optional[Callable[[int, int], None]] = None
+_mark_for_context: Optional[Callable[[int, int], None]] = None
+_mark_for_thread: Optional[Callable[[int], None]] = None
+
+
+class _TaskSteps(Coroutine):
+    """Coroutine wrapper that reports every step of its asyncio task to NEMB"""
+
+    __slots__ = ("coro", "key")
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.key = next(_task_keys)
+
+    def _step(self, method, *args):
+        key = self.key
+        # Steps run in the task's own context copy, so this sticks to the task
+        if _task_key.get() != key:
+            _task_key.set(key)
+        _context_switch(key, _CONTEXT_RESUMED)
+        try:
+            result = method(*args)
+        except BaseException:
+            # StopIteration included: the task is done
+            _context_switch(key, _CONTEXT_FINISHED)
+            raise
+        _context_switch(key, _CONTEXT_SUSPENDED)
+        return result
+
+    def send(self, value):
+        return self._step(self.coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self.coro.throw, *args)
+
+    def close(self):
+        return self.coro.close()
+
+    def __await__(self):
+        return self.coro.__await__()
+
+    def __getattr__(self, name):
+        # cr_frame, __qualname__, ... for asyncio's task repr and stack inspection
+        return getattr(self.coro, name)
+
+
+def _task_factory(loop, coro, **kwargs):
+    import asyncio
+    return asyncio.Task(_TaskSteps(coro), loop=loop, **kwargs)
+
+
+def _install_task_factory(loop):
+    # A factory installed by the application takes precedence
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_task_factory)
+
+
+def _mark_task_aware(numeric_id: int):
+    """Record an integer checkpoint under the current asyncio task, or its thread outside tasks"""
+    key = _task_key.get()
+    if key:
+        _mark_for_context(numeric_id, key)
+    else:
+        _mark_for_thread(numeric_id)
+
+
+def enable_task_tracking() -> bool:
+    """
+    Record checkpoints per asyncio task instead of per thread.
+
+    Event loops created afterwards (asyncio.run, asyncio.new_event_loop) and
+    the running loop, if any, get a task factory that wraps each new task's
+    coroutine; tasks that already exist keep their thread's key.
+
+    Returns:
+        False if the backend cannot key checkpoints by context
+    """
+    global _task_tracking, _context_switch, _mark_for_context, _mark_for_thread
+    if _task_tracking:
+        return True
+    client = runtime._get_nemb_client()
+    if not client.lib or not client.has_context_keys:
+        return False
+    import asyncio
+    _context_switch = client.lib.nemb_context_switch
+    _mark_for_context = client.lib.nemb_mark_checkpoint_id_for
+    if runtime._CHECKPOINT_MODE == "batched" and client.has_checkpoint_batches:
+        _mark_for_thread = runtime._mark_batched
+    else:
+        _mark_for_thread = client.native_mark_checkpoint_id()
+
+    new_event_loop = asyncio.events.new_event_loop
+
+    def tracking_new_event_loop():
+        loop = new_event_loop()
+        _install_task_factory(loop)
+        return loop
+
+    asyncio.events.new_event_loop = asyncio.new_event_loop = tracking_new_event_loop
+    try:
+        _install_task_factory(asyncio.get_running_loop())
+    except RuntimeError:
+        pass
+    _task_tracking = True
+    runtime.mark = _mark_task_aware
+    return True
+
+
+# --- Thread Table ---
+#
+# Exported checkpoints carry the thread they were taken on as "_t<key>". For
+# NEMB, batched and sysfs checkpoints alike the key is the pthread_t value,
+# which is what threading.get_ident() returns. At exit the runtime reports a
+# table mapping keys to Python thread names, with each thread's CPU time.
+# The CLI uses it to name threads and pools and to split package energy
+# between them. Threads started after import register through a one-shot
+# profile hook on their first event. Threads that end before exit record their
+# CPU time as they end; the rest is read from /proc/self/task/*/stat at exit.
+
+# {"key", "name", "native_id", "cpu_ns"} per registered thread (cpu_ns is None while it runs)
+_threads: List[Dict] = []
+_threads_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+class _ThreadCpuSnapshot:
+    """Thread-local sentinel that records its thread's name and CPU time when the thread ends"""
+
+    __slots__ = ("entry", "thread")
+
+    def __init__(self, entry: Dict, thread: threading.Thread):
+        self.entry = entry
+        self.thread = thread
+
+    def __del__(self):
+        try:
+            self.entry["name"] = self.thread.name
+            self.entry["cpu_ns"] = time.thread_time_ns()
+        except Exception:
+            pass
+
+
+def _thread_entry(thread: threading.Thread) -> Dict:
+    return {"key": thread.ident, "name": thread.name, "native_id": thread.native_id, "cpu_ns": None}
+
+
+def _register_thread():
+    """Add the calling thread to the thread table"""
+    thread = threading.current_thread()
+    entry = _thread_entry(thread)
+    with _threads_lock:
+        _threads.append(entry)
+    _thread_state.cpu_snapshot = _ThreadCpuSnapshot(entry, thread)
+
+
+def _thread_started(frame, event, arg):
+    sys.setprofile(None)
+    _register_thread()
+
+
+def _task_cpu_ns(native_id: int, tick_ns: float) -> Optional[int]:
+    """User plus system CPU time of one of this process's tasks, from /proc"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            # The command name in parentheses may itself contain spaces
+            fields = f.read().rpartition(")")[2].split()
+        return int((int(fields[11]) + int(fields[12])) * tick_ns)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _thread_table() -> List[Dict]:
+    """Registered threads plus every other live task of the process, with CPU times"""
+    with _threads_lock:
+        entries = [dict(entry) for entry in _threads]
+    running = {entry["native_id"]: entry for entry in entries if entry["cpu_ns"] is None}
+    for thread in threading.enumerate():
+        entry = running.get(thread.native_id)
+        if entry is None:
+            entry = running[thread.native_id] = _thread_entry(thread)
+            entries.append(entry)
+        entry["name"] = thread.name
+
+    try:
+        tasks = [int(task) for task in os.listdir("/proc/self/task")]
+        tick_ns = 1e9 / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError):
+        tasks = []
+    for native_id in tasks:
+        entry = running.get(native_id)
+        if entry is None:
+            # Not a Python thread (NEMB's own threads, native libraries); key 0 tags no checkpoints
+            try:
+                with open(f"/proc/self/task/{native_id}/comm") as f:
+                    name = f.read().strip()
+            except OSError:
+                continue
+            entry = {"key": 0, "name": name, "native_id": native_id, "cpu_ns": None}
+            entries.append(entry)
+        entry["cpu_ns"] = _task_cpu_ns(native_id, tick_ns)
+    return entries
+
+
+def _restart_thread_table():
+    """Leave only the calling thread in the table, as in a forked child"""
+    global _threads_lock
+    _threads_lock = threading.Lock()
+    del _threads[:]
+    _register_thread()
+
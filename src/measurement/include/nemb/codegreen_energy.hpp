@@ -42,6 +42,7 @@
 #include <map>
 #include <memory>
 #include <optional>
+#include <functional>
 
 namespace codegreen {
 
@@ -134,6 +135,7 @@ struct NEMBConfig {
     // Advanced settings (expert use only)
     std::optional<std::string> force_clock_source; ///< Force specific timing source
     std::optional<uint32_t> measurement_frequency_hz; ///< Override sampling frequency
+    std::optional<uint32_t> reading_buffer_size;      ///< Override in-memory readings (older ones spill)
     bool enable_debug_logging{false};        ///< Enable detailed logging
     
     /**
@@ -270,6 +272,56 @@ public:
      */
     void mark_checkpoint(const std::string& name);
     
+    /**
+     * @brief Mark an integer checkpoint in the measurement stream
+     * @param checkpoint_id Dense checkpoint ID from the instrumentation manifest
+     * 
+     * Allocation-free variant of mark_checkpoint(). The ID is exported as
+     * "<id>#inv_N_tTHREAD" and resolved to a name when the report is built.
+     */
+    void mark_checkpoint_id(uint32_t checkpoint_id);
+    
+    /**
+     * @brief Record a batch of integer checkpoints captured by a runtime buffer
+     * @param records Interleaved (timestamp_ns, checkpoint_id) pairs
+     * @param count Number of pairs in records
+     * @param thread_key Identifier of the thread that captured the batch
+     * 
+     * Timestamps must come from CLOCK_MONOTONIC. Invocation counters are kept
+     * per thread_key, so a batch may be flushed from any thread.
+     */
+    void mark_checkpoints_batch(const uint64_t* records, size_t count, uint64_t thread_key);
+
+    /**
+     * @brief Keep spilled readings from a timestamp on for records a runtime still buffers
+     * @param timestamp_ns Oldest record not yet handed over; UINT64_MAX lifts the hold
+     *
+     * Spilled readings older than every pending checkpoint are released as the
+     * run goes on. Records waiting in a runtime's batch buffers are not pending
+     * yet, so the runtime holds the readings they will be correlated against.
+     */
+    void hold_readings_from(uint64_t timestamp_ns);
+
+    /**
+     * @brief Mark an integer checkpoint on behalf of a logical execution context
+     * @param checkpoint_id Dense checkpoint ID from the instrumentation manifest
+     * @param context_key Key recorded instead of the OS thread (e.g. an asyncio task)
+     */
+    void mark_checkpoint_id_for(uint32_t checkpoint_id, uint64_t context_key);
+
+    enum class ContextSwitch : int { Suspended = 0, Resumed = 1, Finished = 2 };
+
+    /**
+     * @brief Record that a logical context stopped or started running
+     * @param context_key Key passed to mark_checkpoint_id_for
+     * @param state Suspended at a yield point, Resumed, or Finished for good
+     *
+     * Energy consumed while a context is suspended is excluded from its
+     * checkpoints: their cumulative energy becomes context-local, so an
+     * enter/exit difference only counts the steps the context actually ran.
+     */
+    void mark_context_switch(uint64_t context_key, ContextSwitch state);
+
     /**
      * @brief Get all recorded checkpoint measurements correlated with high-res energy data
      * @return Vector of correlated checkpoint measurements
@@ -279,9 +331,186 @@ public:
         uint64_t timestamp_ns;
         double cumulative_energy_joules;
         double instantaneous_power_watts;
+        /// Interpolated cumulative energy per "<provider>/<domain>" (e.g.
+        /// "intel_rapl/dram"); domains without readings around the checkpoint
+        /// are left out
+        std::map<std::string, double> domain_energy_joules;
     };
     std::vector<CorrelatedCheckpoint> get_checkpoint_measurements();
 
+    /**
+     * @brief Stream correlated checkpoint measurements in timestamp order
+     * @param sink Called once per checkpoint; the reference is only valid during the call
+     *
+     * Checkpoints of all threads are sorted by time and merge-joined in a single
+     * pass with a copy of the readings they span, so this call builds no result
+     * vector; get_checkpoint_measurements(), the binary export and the final
+     * measurements still do. The reading lock is released before the sink runs,
+     * so sampling goes on, but the meter's checkpoint state stays locked and the
+     * sink must not call back into the meter.
+     */
+    void for_each_checkpoint_measurement(const std::function<void(const CorrelatedCheckpoint&)>& sink);
+
+    /**
+     * @brief Number of recorded checkpoints not yet drained
+     */
+    size_t checkpoint_count();
+
+    /**
+     * @brief Fixed-size correlated checkpoint for binary export
+     *
+     * Layout matches nemb_checkpoint_record in the C runtime header (40 bytes,
+     * no padding). Named checkpoints are interned and carry kNamedCheckpointFlag
+     * in checkpoint_id; use get_checkpoint_name() to resolve them.
+     */
+    struct CheckpointRecord {
+        uint64_t timestamp_ns;
+        uint32_t checkpoint_id;
+        uint32_t invocation;
+        uint64_t thread_id;
+        double cumulative_energy_joules;
+        double instantaneous_power_watts;
+    };
+    static constexpr uint32_t kNamedCheckpointFlag = 0x80000000u;
+
+    /**
+     * @brief Per-domain energy of exported checkpoint records, one column per domain
+     *
+     * joules[d][i] is the interpolated cumulative energy of domain names[d]
+     * ("<provider>/<domain>") at record i, NaN where it is unknown: readings
+     * around the checkpoint lack the domain, or the record carries
+     * context-local energy (see mark_context_switch).
+     */
+    struct CheckpointDomains {
+        std::vector<std::string> names;
+        std::vector<std::vector<double>> joules;
+    };
+
+    /**
+     * @brief Get all checkpoints correlated with energy data, ordered by timestamp
+     * @param domains If set, receives the per-domain energy of the records
+     * @return Vector of packed checkpoint records
+     */
+    std::vector<CheckpointRecord> get_checkpoint_records(CheckpointDomains* domains = nullptr);
+
+    /**
+     * @brief Correlate and remove checkpoints already covered by energy readings
+     * @param until_ns Upper bound for the window, e.g. the oldest checkpoint
+     *        still buffered by a client and not yet handed over
+     * @param window_end_ns Set to min(until_ns, newest reading timestamp);
+     *        every returned record is at or before it
+     * @param domains If set, receives the per-domain energy of the records
+     * @return Records of the drained window, ordered by timestamp
+     *
+     * Readings older than the window end are released as well (the last one is
+     * kept to interpolate the next window), so periodic draining keeps memory
+     * bounded in long-running processes.
+     */
+    std::vector<CheckpointRecord> drain_checkpoint_records(uint64_t until_ns, uint64_t& window_end_ns,
+                                                           CheckpointDomains* domains = nullptr);
+
+    /**
+     * @brief Resolve the base name of a checkpoint ID from get_checkpoint_records()
+     * @param checkpoint_id Manifest ID or interned name ID
+     * @return Interned name, or the decimal ID for manifest checkpoints
+     */
+    std::string get_checkpoint_name(uint32_t checkpoint_id) const;
+
+    /**
+     * @brief Intern a checkpoint name once so it can be marked by ID
+     * @param name Checkpoint name, e.g. "enter:parse_batch:region"
+     * @return ID carrying kNamedCheckpointFlag, accepted by mark_checkpoint_id()
+     *         and the batch and context entry points
+     */
+    uint32_t intern_checkpoint(const std::string& name);
+
+    /**
+     * @brief Drop every marker of a checkpoint before correlation
+     * @param checkpoint_id Manifest ID or interned name ID
+     *
+     * Marking the checkpoint still costs what any other does, which is what
+     * overhead calibration times, but its markers never reach the records,
+     * aggregates or reports.
+     */
+    void discard_checkpoint(uint32_t checkpoint_id);
+
+    /**
+     * @brief Running statistics of one function's enter/exit spans
+     *
+     * Layout matches nemb_checkpoint_aggregate in the C runtime header.
+     * Variances are sample variances (Welford), 0 for fewer than two spans.
+     */
+    struct CheckpointAggregate {
+        uint32_t checkpoint_id;   ///< Enter checkpoint: manifest ID or interned name ID
+        uint32_t reserved;
+        uint64_t count;
+        double energy_sum_joules;
+        double energy_min_joules;
+        double energy_max_joules;
+        double energy_variance;
+        double duration_sum_ns;
+        double duration_min_ns;
+        double duration_max_ns;
+        double duration_variance;
+    };
+
+    /**
+     * @brief Switch between recording every marker and online aggregation
+     * @param enabled When true, enter/exit pairs are matched per thread as they
+     *        arrive and folded into per-function statistics; markers are not kept
+     *
+     * Memory stays O(#checkpoints) instead of O(#calls). Named checkpoints pair
+     * "enter:NAME:..." with "exit:NAME:..."; integer checkpoints need
+     * set_checkpoint_pairing().
+     */
+    void enable_aggregation(bool enabled);
+
+    /**
+     * @brief Declare how integer checkpoints pair up for aggregation
+     * @param first_id ID described by specs[0]
+     * @param specs Per ID: (enter_id << 1) | is_exit, or kUnpairedCheckpoint
+     * @param count Number of specs
+     */
+    void set_checkpoint_pairing(uint32_t first_id, const uint32_t* specs, size_t count);
+    static constexpr uint32_t kUnpairedCheckpoint = 0xFFFFFFFFu;
+
+    /**
+     * @brief Resolve outstanding spans and return per-function statistics
+     * @return One aggregate per enter checkpoint seen
+     */
+    std::vector<CheckpointAggregate> get_checkpoint_aggregates();
+
+    /**
+     * @brief Buffered readings as contiguous columns, oldest first
+     *
+     * Pointers address a snapshot held by the meter. domain_joules[i]
+     * is the energy column of domains[i] ("<provider>/<domain>"), NaN where a
+     * reading has no value for that domain.
+     */
+    struct ReadingColumns {
+        const uint64_t* timestamps_ns{nullptr};
+        const double* energy_joules{nullptr};
+        const double* power_watts{nullptr};
+        size_t count{0};
+        std::vector<std::string> domains;
+        std::vector<const double*> domain_joules;
+    };
+
+    /**
+     * @brief Snapshot the reading buffer and return the snapshot's columns
+     *
+     * The buffer is copied in one short critical section; sampling and
+     * correlation carry on while the columns are in use. They stay valid
+     * until release_readings(), which may be called from any thread.
+     * Acquiring again without releasing returns the same snapshot.
+     */
+    ReadingColumns acquire_readings();
+
+    /**
+     * @brief Free the snapshot taken by acquire_readings()
+     */
+    void release_readings();
+
     /**
      * @brief Get measurement statistics and diagnostics
      * @return Map of diagnostic information
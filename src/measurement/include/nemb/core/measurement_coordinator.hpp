@@ -1,6 +1,7 @@
 #pragma once
 
 #include "energy_provider.hpp"
+#include "reading_store.hpp"
 #include <memory>
 #include <vector>
 #include <map>
@@ -10,6 +11,7 @@
 #include <atomic>
 #include <condition_variable>
 #include <chrono>
+#include <limits>
 
 namespace codegreen::nemb {
 
@@ -37,16 +39,85 @@ struct SynchronizedReading {
     double max_provider_deviation{0.0};               ///< Maximum deviation between providers
 };
 
+/**
+ * @brief Zero-copy view of buffered readings, oldest first
+ *
+ * Holds the coordinator's reading lock for its lifetime, so the measurement
+ * thread waits until the view is destroyed; keep views short-lived. Spilled
+ * readings requested by the view are decoded into it and come first.
+ */
+class ReadingView {
+public:
+    size_t size() const { return spilled_.size() + columns_->size(); }
+    bool empty() const { return size() == 0; }
+
+    uint64_t timestamp_ns(size_t i) const {
+        return i < spilled_.size() ? spilled_[i].timestamp_ns : columns_->timestamp_ns(i - spilled_.size());
+    }
+    double energy_joules(size_t i) const {
+        return i < spilled_.size() ? spilled_[i].energy_joules : columns_->energy_joules(i - spilled_.size());
+    }
+    double power_watts(size_t i) const {
+        return i < spilled_.size() ? spilled_[i].power_watts : columns_->power_watts(i - spilled_.size());
+    }
+    double domain_joules(size_t domain, size_t i) const {
+        return i < spilled_.size() ? spilled_[i].domain(domain) : columns_->domain_joules(domain, i - spilled_.size());
+    }
+
+    /**
+     * @brief Index of the first reading at or after timestamp_ns (size() if none)
+     */
+    size_t lower_bound(uint64_t timestamp_ns) const;
+
+    const std::vector<std::string>& domains() const { return columns_->domains(); }
+
+private:
+    friend class MeasurementCoordinator;
+    ReadingView(std::unique_lock<std::mutex> lock, std::vector<EnergySample> spilled, const ReadingColumns* columns)
+        : lock_(std::move(lock)), spilled_(std::move(spilled)), columns_(columns) {}
+
+    std::unique_lock<std::mutex> lock_;
+    std::vector<EnergySample> spilled_;
+    const ReadingColumns* columns_;
+};
+
+/**
+ * @brief Copy of the readings around a time range, oldest first
+ *
+ * Filled under the coordinator's reading lock and read without it, so the
+ * measurement thread keeps sampling while the copy is in use.
+ */
+struct ReadingRange {
+    std::vector<uint64_t> timestamps_ns;
+    std::vector<double> energy_joules;
+    std::vector<double> power_watts;
+    std::vector<std::string> domains;                ///< "<provider>/<domain>" per column
+    std::vector<std::vector<double>> domain_joules;  ///< One column per domain
+
+    size_t size() const { return timestamps_ns.size(); }
+    bool empty() const { return timestamps_ns.empty(); }
+
+    /**
+     * @brief Index of the first reading at or after timestamp_ns (size() if none)
+     */
+    size_t lower_bound(uint64_t timestamp_ns) const;
+};
+
 /**
  * @brief Configuration for measurement coordination
  */
 struct CoordinatorConfig {
     std::chrono::milliseconds measurement_interval{10};  ///< Target measurement interval
+    std::chrono::milliseconds idle_interval{0};          ///< Interval without checkpoint activity (0: always measurement_interval)
+    std::chrono::milliseconds burst_hold{100};           ///< How long activity keeps measurement_interval
     double temporal_alignment_tolerance_ms{1.0};         ///< Time alignment tolerance
     double cross_validation_threshold{0.1};              ///< 10% deviation threshold
     bool enable_real_time_filtering{true};               ///< Apply noise filtering
     bool enable_outlier_detection{true};                 ///< Remove measurement outliers
     uint32_t measurement_buffer_size{1000};              ///< Circular buffer size
+    bool spill_readings{true};                           ///< Keep readings the buffer overwrites on disk
+    std::string spill_directory;                         ///< Spill file location (empty: $TMPDIR or /tmp)
+    std::string record_path;                             ///< Write every reading to this trace file (empty: off)
     bool auto_restart_failed_providers{true};            ///< Restart failed providers
     std::chrono::seconds provider_restart_interval{30};  ///< How often to retry failed providers
 };
@@ -138,11 +209,92 @@ public:
     bool restart_provider(const std::string& provider_name);
     
     /**
-     * @brief Get all currently buffered readings
-     * @return Vector of synchronized readings in chronological order
+     * @brief View the buffered readings without copying them
+     * @param from_ns Spilled readings are decoded only from the one before from_ns on
+     * @param to_ns Spilled readings are decoded only up to the one after to_ns
+     *
+     * The in-memory buffer is always viewed whole.
      */
-    std::vector<SynchronizedReading> get_buffered_readings() const;
-    
+    ReadingView view_readings(uint64_t from_ns = 0, uint64_t to_ns = std::numeric_limits<uint64_t>::max()) const;
+
+    /**
+     * @brief Copy the readings needed to interpolate anywhere in [from_ns, to_ns]
+     * @return Readings inside the range plus the nearest one on either side,
+     *         with their per-domain energy. The reading lock is held only
+     *         for the copy.
+     */
+    ReadingRange copy_readings(uint64_t from_ns, uint64_t to_ns) const;
+
+    /**
+     * @brief Copy the in-memory buffer, its raw columns in chronological order
+     *
+     * The reading lock is held only for the copy, so the snapshot's column
+     * pointers can be handed out as plain arrays (e.g. to Python) for as long
+     * as it lives while sampling and correlation carry on.
+     */
+    ReadingColumns snapshot_readings() const;
+
+    /**
+     * @brief Get the system and per-domain energy and power of all buffered readings
+     * @return Samples in chronological order, including spilled readings
+     */
+    std::vector<EnergySample> get_energy_samples() const;
+
+    /**
+     * @brief Get the samples needed to interpolate anywhere in [from_ns, to_ns]
+     * @return Samples in chronological order: those inside the range plus the
+     *         nearest one on either side. Spilled chunks outside it are not read.
+     */
+    std::vector<EnergySample> get_energy_samples(uint64_t from_ns, uint64_t to_ns) const;
+
+    /**
+     * @brief Interpolate cumulative energy and power at a timestamp without copying the buffer
+     * @param timestamp_ns CLOCK_MONOTONIC timestamp; clamped to the buffered range
+     * @param energy_joules Receives the interpolated cumulative system energy
+     * @param power_watts Receives the interpolated system power
+     * @return false if no readings are buffered
+     */
+    bool interpolate_energy_at(uint64_t timestamp_ns, double& energy_joules, double& power_watts) const;
+
+    /**
+     * @brief Signal checkpoint activity, switching to burst sampling
+     *
+     * With an idle_interval set, the coordinator samples every idle_interval
+     * until activity is signalled, then every measurement_interval until
+     * burst_hold passes without any. Once the current tick has seen activity
+     * this is a single relaxed load, so it can sit on checkpoint paths.
+     */
+    void notify_activity() {
+        if (!activity_pending_.load(std::memory_order_relaxed)) signal_activity();
+    }
+
+    /**
+     * @brief Timestamp of the newest buffered reading (0 if none)
+     */
+    uint64_t latest_reading_timestamp_ns() const { return latest_timestamp_ns_.load(std::memory_order_acquire); }
+
+    /**
+     * @brief Release buffered readings that are no longer needed for interpolation
+     * @param timestamp_ns Readings before this are dropped, except the newest one
+     *        at or before it, which is kept as the lower interpolation bound
+     * @return Number of readings released
+     */
+    size_t discard_readings_before(uint64_t timestamp_ns);
+
+    /**
+     * @brief Release spilled readings that are no longer needed for interpolation
+     * @param timestamp_ns Spilled readings before this are dropped, except the
+     *        newest one at or before it. Buffered readings are kept, so
+     *        checkpoints that arrive late in a batch still find theirs
+     * @return Number of readings released
+     */
+    size_t discard_spilled_readings_before(uint64_t timestamp_ns);
+
+    /**
+     * @brief Number of readings in the spill file
+     */
+    size_t spilled_reading_count() const;
+
     /**
      * @brief Set the size of the circular buffer
      * @param size New buffer size
@@ -199,13 +351,26 @@ private:
     std::atomic<bool> running_{false};
     std::thread measurement_thread_;
     std::thread provider_health_thread_;
+    // Wakes the health loop out of provider_restart_interval on stop
+    std::mutex health_mutex_;
+    std::condition_variable health_condition_;
     
     // Synchronization and buffering
     mutable std::mutex readings_mutex_;
     std::condition_variable readings_condition_;
-    std::vector<SynchronizedReading> readings_buffer_;
-    std::atomic<size_t> buffer_write_index_{0};
-    std::atomic<bool> buffer_full_{false};
+    ReadingColumns readings_;
+    std::atomic<uint64_t> latest_timestamp_ns_{0};
+    // Adaptive sampling: set by notify_activity, cleared by every tick
+    std::atomic<bool> activity_pending_{false};
+    std::atomic<bool> idle_{false};  // Measurement loop is waiting out idle_interval
+    std::mutex activity_mutex_;
+    std::condition_variable activity_condition_;
+
+    // Readings the circular buffer overwrites, oldest first (null when disabled)
+    std::unique_ptr<ReadingSpillStore> spill_;
+
+    // Trace of every buffered reading for later replay (null when disabled)
+    std::unique_ptr<ReadingTraceWriter> recorder_;
     
     // Statistics
     mutable std::mutex stats_mutex_;
@@ -217,6 +382,11 @@ private:
      * @brief Main measurement loop (runs in separate thread)
      */
     void measurement_loop();
+
+    /**
+     * @brief Slow path of notify_activity: record activity and wake an idle loop
+     */
+    void signal_activity();
     
     /**
      * @brief Provider health monitoring loop (runs in separate thread)
@@ -251,10 +421,11 @@ private:
     void apply_real_time_filtering(SynchronizedReading& reading);
     
     /**
-     * @brief Add reading to circular buffer
+     * @brief Add reading to circular buffer, spilling the one it overwrites
      * @param reading Synchronized reading to buffer
      */
     void buffer_reading(const SynchronizedReading& reading);
+
     
     /**
      * @brief Check and restart failed providers
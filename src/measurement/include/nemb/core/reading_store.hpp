@@ -0,0 +1,224 @@
+#pragma once
+
+#include "energy_provider.hpp"
+#include <cstddef>
+#include <cstdint>
+#include <fstream>
+#include <limits>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+namespace codegreen::nemb {
+
+/**
+ * @brief System energy and power of one synchronized reading, with its domains
+ *
+ * The columns checkpoint correlation needs, without the per-provider detail.
+ * domain_joules follows the ReadingColumns domain table, NaN where the
+ * reading has no value; domains past its end count as NaN too.
+ */
+struct EnergySample {
+    uint64_t timestamp_ns{0};
+    double energy_joules{0.0};
+    double power_watts{0.0};
+    std::vector<double> domain_joules;
+
+    double domain(size_t index) const {
+        return index < domain_joules.size() ? domain_joules[index] : std::numeric_limits<double>::quiet_NaN();
+    }
+};
+
+/**
+ * @brief Circular buffer of readings held as contiguous columns
+ *
+ * Timestamp, total energy and total power are one column each. Per-domain
+ * energy gets one column per entry of a domain table ("<provider>/<domain>")
+ * that grows as providers report new domains; a reading without a value for
+ * a domain holds NaN there. Columns grow with the readings up to the capacity
+ * and are then overwritten oldest first.
+ *
+ * Not thread-safe; the owning MeasurementCoordinator serializes access.
+ */
+class ReadingColumns {
+public:
+    explicit ReadingColumns(size_t capacity = 0) : capacity_(capacity) {}
+
+    /**
+     * @brief Drop every reading and set a new capacity (domains are kept)
+     */
+    void reset(size_t capacity);
+
+    /**
+     * @brief Append a reading, overwriting the oldest when full
+     * @param evicted Receives the overwritten reading, if any
+     * @return true if a reading was overwritten
+     */
+    bool push(uint64_t timestamp_ns, double energy_joules, double power_watts,
+              const std::vector<EnergyReading>& providers, EnergySample& evicted);
+
+    /**
+     * @brief Drop the n oldest readings
+     */
+    void discard_oldest(size_t n);
+
+    /**
+     * @brief Rotate the columns so the oldest reading is at index 0
+     *
+     * Afterwards the raw column pointers are in chronological order.
+     */
+    void linearize();
+
+    size_t size() const { return timestamps_.size(); }
+    size_t capacity() const { return capacity_; }
+    bool empty() const { return timestamps_.empty(); }
+
+    // Accessors by age: 0 is the oldest reading
+    uint64_t timestamp_ns(size_t i) const { return timestamps_[slot(i)]; }
+    double energy_joules(size_t i) const { return energy_[slot(i)]; }
+    double power_watts(size_t i) const { return power_[slot(i)]; }
+    double domain_joules(size_t domain, size_t i) const { return domain_energy_[domain][slot(i)]; }
+
+    /**
+     * @brief Domain table: "<provider>/<domain>" per domain column
+     */
+    const std::vector<std::string>& domains() const { return domain_names_; }
+
+    // Raw columns in storage order (chronological after linearize())
+    const uint64_t* timestamps() const { return timestamps_.data(); }
+    const double* energy() const { return energy_.data(); }
+    const double* power() const { return power_.data(); }
+    const double* domain_column(size_t domain) const { return domain_energy_[domain].data(); }
+
+private:
+    size_t slot(size_t i) const {
+        size_t s = head_ + i;
+        return s >= timestamps_.size() ? s - timestamps_.size() : s;
+    }
+    size_t domain_index(const std::string& provider_id, const std::string& domain);
+
+    size_t capacity_;
+    size_t head_{0};  // Storage index of the oldest reading once full
+    std::vector<uint64_t> timestamps_;
+    std::vector<double> energy_;
+    std::vector<double> power_;
+    std::vector<std::vector<double>> domain_energy_;
+    std::vector<std::string> domain_names_;
+    // provider_id -> domain -> column, looked up without building keys per reading
+    std::unordered_map<std::string, std::unordered_map<std::string, size_t>> domain_ids_;
+};
+
+/**
+ * @brief Append-only on-disk store for readings that leave the in-memory buffer
+ *
+ * Samples are collected into chunks of kChunkSamples. A full chunk is
+ * compressed (zigzag varint deltas of the timestamp and of the energy, power
+ * and per-domain energy bit patterns, one column per domain-table entry) and
+ * appended to an unlinked temporary file, which is memory-mapped for reading. A per-chunk time index lets readers decode only
+ * the chunks that overlap the range they ask for.
+ *
+ * Not thread-safe; the owning MeasurementCoordinator serializes access.
+ */
+class ReadingSpillStore {
+public:
+    static constexpr size_t kChunkSamples = 4096;
+
+    /**
+     * @param directory Where the spill file is created; empty uses $TMPDIR or /tmp
+     */
+    explicit ReadingSpillStore(std::string directory = "");
+    ~ReadingSpillStore();
+
+    ReadingSpillStore(const ReadingSpillStore&) = delete;
+    ReadingSpillStore& operator=(const ReadingSpillStore&) = delete;
+
+    /**
+     * @brief Append a sample no older than the previous one
+     * @return false if the spill file could not be written (the chunk is dropped)
+     */
+    bool append(const EnergySample& sample);
+
+    /**
+     * @brief Append the samples covering [from_ns, to_ns] to out, oldest first
+     *
+     * Whole chunks are decoded, reaching into neighbouring chunks where needed,
+     * so the caller also gets the nearest sample on either side of the range.
+     */
+    void read_range(uint64_t from_ns, uint64_t to_ns, std::vector<EnergySample>& out) const;
+
+    /**
+     * @brief Drop chunks that a newer stored sample at or before timestamp_ns makes redundant
+     * @return Number of samples released
+     */
+    size_t discard_before(uint64_t timestamp_ns);
+
+    /**
+     * @brief Drop every stored sample
+     */
+    void clear();
+
+    bool empty() const { return size_ == 0; }
+    size_t size() const { return size_; }
+    uint64_t oldest_timestamp_ns() const;
+
+private:
+    struct Chunk {
+        uint64_t first_ns;
+        uint64_t last_ns;
+        uint64_t offset;
+        uint32_t bytes;
+        uint32_t count;
+        uint32_t domains;  // Domain columns in the chunk
+    };
+
+    bool open_file();
+    bool spill_open_chunk();
+    void decode_chunk(const Chunk& chunk, std::vector<EnergySample>& out) const;
+    const uint8_t* mapped(uint64_t end) const;
+    void release(const Chunk& chunk);
+
+    std::string directory_;
+    int fd_{-1};
+    bool failed_{false};
+    uint64_t file_size_{0};
+    std::vector<Chunk> chunks_;         // Spilled chunks, oldest first
+    std::vector<EnergySample> open_;    // Newest samples, not yet compressed
+    std::vector<uint8_t> encode_buffer_;
+    size_t size_{0};
+
+    // Read-only mapping of the file, remapped when it has grown
+    mutable void* map_{nullptr};
+    mutable size_t map_size_{0};
+};
+
+/**
+ * @brief Text trace of readings, as replayed by the replay provider
+ *
+ * One reading per line: timestamp (ns), total energy (J) and total power (W),
+ * then "<provider>/<domain>=<joules>" for every domain with a value, separated
+ * by spaces. Lines starting with '#' are comments; the file starts with
+ * kHeader. Values are written with full double precision.
+ *
+ * Not thread-safe; the owning MeasurementCoordinator serializes access.
+ */
+class ReadingTraceWriter {
+public:
+    static constexpr const char* kHeader = "# codegreen reading trace v1";
+
+    /**
+     * @brief Create or truncate the trace file and write the header
+     * @return false if the file cannot be opened
+     */
+    bool open(const std::string& path);
+
+    void append(uint64_t timestamp_ns, double energy_joules, double power_watts,
+                const std::vector<EnergyReading>& providers);
+
+    void flush();
+    bool is_open() const { return out_.is_open(); }
+
+private:
+    std::ofstream out_;
+};
+
+} // namespace codegreen::nemb
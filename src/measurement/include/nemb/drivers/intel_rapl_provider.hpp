@@ -52,6 +52,10 @@ struct IntelCPUInfo {
  * - Robust counter wraparound handling
  * - Temperature and frequency compensation
  * - Multi-package system support
+ * 
+ * The sysfs tree is read from CODEGREEN_RAPL_ROOT (default /sys/class/powercap),
+ * so the provider can run against a fake powercap directory. Each domain's
+ * energy_uj stays open and every sample reads them all with one pread each.
  */
 class IntelRAPLProvider : public EnergyProvider {
 public:
@@ -157,6 +161,14 @@ private:
     // Non-blocking file readers for sysfs access
     std::map<std::string, std::unique_ptr<utils::NonBlockingFileReader>> domain_file_readers_;
     
+    // Per-sample read pass: readers in available_domains_ order, and the raw
+    // values handed to the counter manager (keys persist between samples)
+    std::vector<utils::NonBlockingFileReader*> sample_readers_;
+    std::map<std::string, uint64_t> raw_values_;
+    
+    // powercap sysfs root
+    std::string powercap_root_;
+    
     // sysfs access
     std::map<std::string, std::string> domain_sysfs_map_;
     
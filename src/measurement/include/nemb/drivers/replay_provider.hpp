@@ -0,0 +1,70 @@
+#pragma once
+#include "../core/energy_provider.hpp"
+#include <chrono>
+#include <string>
+#include <vector>
+
+namespace codegreen::nemb::drivers {
+
+/**
+ * @brief Energy provider that replays a recorded trace or a synthetic power model
+ *
+ * The source comes from CODEGREEN_REPLAY and is one of:
+ * - a reading trace written with CODEGREEN_RECORD (see ReadingTraceWriter),
+ *   replayed at its recorded pace and looped past its end
+ * - constant:W              constant power of W watts
+ * - step:LOW:HIGH:PERIOD_MS square wave, LOW for the first half of each period
+ * - sine:MEAN:AMP:PERIOD_MS MEAN + AMP * sin(2*pi*t/PERIOD)
+ *
+ * Energy is evaluated at the time elapsed since initialize(), in closed form
+ * for the models and by interpolation for traces, so the same workload sees
+ * the same energy on every run. Without CODEGREEN_REPLAY initialize() fails
+ * and provider detection skips this provider.
+ */
+class ReplayProvider : public EnergyProvider {
+public:
+    ReplayProvider();
+    ~ReplayProvider() override = default;
+
+    // EnergyProvider interface implementation
+    bool initialize() override;
+    EnergyReading get_reading() override;
+    EnergyProviderSpec get_specification() const override;
+    bool self_test() override;
+    bool is_available() const override;
+    void shutdown() override;
+    std::string get_name() const override { return "Replay"; }
+
+private:
+    enum class Model { TRACE, CONSTANT, STEP, SINE };
+
+    struct TracePoint {
+        double seconds;                  ///< Time since the first recorded reading
+        double energy_joules;
+        double power_watts;
+        std::vector<double> domain_joules; ///< Parallel to domain_names_ (NaN: no value)
+    };
+
+    bool parse_model(const std::string& spec);
+    bool load_trace(const std::string& path);
+
+    /**
+     * @brief Energy, power and domain energy at t seconds into the replay
+     */
+    void evaluate(double t, EnergyReading& reading) const;
+
+    std::string source_;
+    Model model_{Model::CONSTANT};
+    double low_watts_{0.0};              ///< Constant, step low or sine mean
+    double high_watts_{0.0};             ///< Step high or sine amplitude
+    double period_seconds_{0.0};
+
+    std::vector<TracePoint> trace_;
+    std::vector<std::string> domain_names_; ///< "<provider>/<domain>" as recorded
+    std::vector<double> domain_base_;       ///< First recorded value per domain
+
+    std::chrono::steady_clock::time_point start_;
+    bool initialized_{false};
+};
+
+} // namespace codegreen::nemb::drivers
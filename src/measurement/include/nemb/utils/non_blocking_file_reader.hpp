@@ -46,6 +46,16 @@ public:
      */
     bool read_uint64_with_timeout(uint64_t& value, std::chrono::milliseconds timeout);
     
+    /**
+     * Read a uint64 value from the start of the open file with one pread
+     * 
+     * No seek, no select and no allocation: for sysfs attributes read on
+     * every sample through a descriptor opened once.
+     * @param value Output value
+     * @return true if successful, false if the file is closed or unparsable
+     */
+    bool pread_uint64(uint64_t& value) const;
+    
     /**
      * Check if the file is currently open
      * @return true if file descriptor is valid
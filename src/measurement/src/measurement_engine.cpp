@@ -168,6 +168,15 @@ InstrumentationResult MeasurementEngine::instrument_and_execute(const Measuremen
                 // Atomic copy operation - no TOCTOU race condition
                 std::filesystem::copy_file(runtime_source, runtime_dest, 
                                          std::filesystem::copy_options::overwrite_existing);
+                // The codegreen_* modules codegreen_runtime.py imports sit beside it
+                for (const auto& entry : std::filesystem::directory_iterator(runtime_source.parent_path())) {
+                    auto name = entry.path().filename().string();
+                    if (name.rfind("codegreen_", 0) == 0 && entry.path().extension() == ".py" &&
+                        name != "codegreen_runtime.py") {
+                        std::filesystem::copy_file(entry.path(), std::filesystem::path(temp_dir) / name,
+                                                 std::filesystem::copy_options::overwrite_existing);
+                    }
+                }
             } catch (const std::filesystem::filesystem_error& e) {
                 result.error_message = "Failed to copy runtime module: " + std::string(e.what());
                 return result;
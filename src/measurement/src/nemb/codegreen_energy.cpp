@@ -10,13 +10,103 @@
 #include <thread>
 #include <atomic>
 #include <algorithm>
+#include <cerrno>
+#include <chrono>
 #include <cmath>
 #include <iostream>
+#include <fstream>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <unistd.h>
+#include <pthread.h>
 #include <mutex>
 #include <map>
+#include <unordered_map>
+#include <deque>
+#include <limits>
+#include <memory>
+#include <functional>
+#include <optional>
 
 namespace codegreen {
 
+// Thread tag on exported markers ("_tTHREAD"). It is the pthread_t value, which is
+// what Python's threading.get_ident() returns, so runtimes can name the threads.
+static uint64_t current_thread_key() {
+    pthread_t self = pthread_self();
+    uint64_t key = 0;
+    std::memcpy(&key, &self, std::min(sizeof(key), sizeof(self)));
+    return key;
+}
+
+// Milliseconds from an environment variable; unset, malformed or negative
+// values keep the default (strtol alone would turn "fast" into 0)
+static std::chrono::milliseconds env_milliseconds(const char* name, std::chrono::milliseconds fallback) {
+    const char* value = std::getenv(name);
+    if (!value || !*value) return fallback;
+    char* end = nullptr;
+    errno = 0;
+    long ms = std::strtol(value, &end, 10);
+    if (*end != '\0' || errno == ERANGE || ms < 0) {
+        std::cerr << name << "=" << value << " is not a number of milliseconds; using "
+                  << fallback.count() << std::endl;
+        return fallback;
+    }
+    return std::chrono::milliseconds(ms);
+}
+
+// Distinguishes meters in per-thread state, including one created after a fork
+static std::atomic<uint64_t> next_meter_generation{1};
+
+// Records per thread ring (a power of two); a full ring is drained by its own thread
+static constexpr size_t kMarkerRingCapacity = 8192;
+
+// Interpolates copied readings at nondecreasing timestamps: one binary
+// search to start, then a forward pass over the columns
+class SampleCursor {
+public:
+    explicit SampleCursor(const nemb::ReadingRange& readings) : readings_(readings) {}
+
+    void at(uint64_t ts, double& energy_joules, double& power_watts) {
+        size_t count = readings_.size();
+        if (!started_) {
+            next_ = readings_.lower_bound(ts);
+            started_ = true;
+        }
+        while (next_ < count && readings_.timestamps_ns[next_] < ts) ++next_;
+        if (next_ == count || next_ == 0) {
+            below_ = above_ = next_ == count ? count - 1 : 0;
+            ratio_ = 0.0;
+        } else {
+            below_ = next_ - 1;
+            above_ = next_;
+            uint64_t t1 = readings_.timestamps_ns[below_];
+            uint64_t dt = readings_.timestamps_ns[above_] - t1;
+            ratio_ = (dt > 0) ? static_cast<double>(ts - t1) / dt : 0.0;
+        }
+        energy_joules = interpolate(readings_.energy_joules[below_], readings_.energy_joules[above_]);
+        power_watts = interpolate(readings_.power_watts[below_], readings_.power_watts[above_]);
+    }
+
+    // Energy of one domain at the timestamp of the last at() call; NaN if
+    // either surrounding reading lacks the domain
+    double domain_joules(size_t domain) const {
+        const auto& column = readings_.domain_joules[domain];
+        return interpolate(column[below_], column[above_]);
+    }
+
+private:
+    double interpolate(double v1, double v2) const { return v1 + ratio_ * (v2 - v1); }
+
+    const nemb::ReadingRange& readings_;
+    size_t next_{0};
+    bool started_{false};
+    size_t below_{0};
+    size_t above_{0};
+    double ratio_{0.0};
+};
+
 // Implementation details hidden using PIMPL pattern
 class EnergyMeter::Impl {
 public:
@@ -29,7 +119,25 @@ public:
     uint64_t start_session(const std::string& name);
     EnergyDifference end_session(uint64_t session_id);
     void mark_checkpoint(const std::string& name);
+    void mark_checkpoint_id(uint32_t checkpoint_id);
+    void mark_checkpoints_batch(const uint64_t* records, size_t count, uint64_t thread_key);
+    void hold_readings_from(uint64_t timestamp_ns) { reading_hold_ns_.store(timestamp_ns, std::memory_order_relaxed); }
+    void mark_checkpoint_id_for(uint32_t checkpoint_id, uint64_t context_key);
+    void mark_context_switch(uint64_t context_key, EnergyMeter::ContextSwitch state);
     std::vector<EnergyMeter::CorrelatedCheckpoint> get_checkpoint_measurements();
+    void for_each_checkpoint_measurement(const std::function<void(const EnergyMeter::CorrelatedCheckpoint&)>& sink);
+    size_t checkpoint_count();
+    std::vector<EnergyMeter::CheckpointRecord> get_checkpoint_records(EnergyMeter::CheckpointDomains* domains);
+    std::vector<EnergyMeter::CheckpointRecord> drain_checkpoint_records(uint64_t until_ns, uint64_t& window_end_ns,
+                                                                        EnergyMeter::CheckpointDomains* domains);
+    std::string get_checkpoint_name(uint32_t checkpoint_id) const;
+    uint32_t intern_checkpoint(const std::string& name);
+    void discard_checkpoint(uint32_t checkpoint_id);
+    void enable_aggregation(bool enabled);
+    void set_checkpoint_pairing(uint32_t first_id, const uint32_t* specs, size_t count);
+    std::vector<EnergyMeter::CheckpointAggregate> get_checkpoint_aggregates();
+    EnergyMeter::ReadingColumns acquire_readings();
+    void release_readings();
     const NEMBConfig& get_config() const;
     bool self_test();
     std::map<std::string, std::string> get_diagnostics() const;
@@ -42,21 +150,192 @@ private:
         bool active{true};
     };
     
-    struct Marker {
-        std::string name;
+    // Fixed-size marker (no heap allocation per call); names are interned, and
+    // "#inv_N_tTHREAD" is only built on export
+    struct IdMarker {
         uint64_t timestamp_ns;
+        uint64_t thread_hash;
+        uint32_t checkpoint_id;
+        uint32_t invocation;
     };
     
     NEMBConfig config_;
     std::unique_ptr<nemb::MeasurementCoordinator> coordinator_;
+    // Copy of the readings between acquire_readings and release_readings
+    std::optional<nemb::ReadingColumns> reading_snapshot_;
+    std::mutex snapshot_mutex_;
     nemb::utils::PrecisionTimer timer_;
     std::map<uint64_t, Session> active_sessions_;
     std::atomic<uint64_t> next_session_id_{1};
     mutable std::mutex sessions_mutex_;
     
-    std::vector<Marker> markers_;
+    // Manifest IDs are dense from 0 and interned names dense after the flag
+    // bit, so each space gets its own flat vector of per-ID counters
+    struct InvocationCounters {
+        std::vector<uint32_t> ids;
+        std::vector<uint32_t> names;
+        uint32_t next(uint32_t checkpoint_id) {
+            auto& counters = (checkpoint_id & EnergyMeter::kNamedCheckpointFlag) ? names : ids;
+            size_t index = checkpoint_id & ~EnergyMeter::kNamedCheckpointFlag;
+            if (index >= counters.size()) counters.resize(index + 1, 0);
+            return ++counters[index];
+        }
+    };
+    
+    std::vector<IdMarker> id_markers_;
+    size_t sorted_markers_{0};  // id_markers_[0, sorted_markers_) is in time order
+    std::unordered_map<uint64_t, InvocationCounters> batch_invocation_counters_;
+    std::unordered_map<std::string, uint32_t> checkpoint_name_ids_;
+    std::vector<std::string> checkpoint_names_;
     mutable std::mutex markers_mutex_;
     
+    uint32_t intern_checkpoint_name(const std::string& name);  // requires markers_mutex_
+
+    // Checkpoints marked like any other but dropped before correlation (requires markers_mutex_)
+    std::vector<uint32_t> discarded_checkpoints_;
+    bool is_discarded(uint32_t checkpoint_id) const {
+        return !discarded_checkpoints_.empty() &&
+               std::find(discarded_checkpoints_.begin(), discarded_checkpoints_.end(), checkpoint_id) != discarded_checkpoints_.end();
+    }
+    
+    // Per-thread checkpoints go to a single-producer ring owned by the thread:
+    // the checkpoint path takes no lock, and rings are drained into id_markers_
+    // (or the aggregator) under markers_mutex_ when records are read or a ring fills
+    struct RingRecord {
+        uint64_t timestamp_ns;
+        uint32_t checkpoint_id;
+        uint32_t invocation;
+    };
+    struct MarkerRing {
+        MarkerRing(uint64_t key, size_t capacity) : thread_key(key), slots(capacity) {}
+        const uint64_t thread_key;
+        std::vector<RingRecord> slots;
+        alignas(64) std::atomic<uint64_t> head{0};  // Advanced by the owning thread
+        alignas(64) std::atomic<uint64_t> tail{0};  // Advanced by the drain
+        std::atomic<bool> retired{false};           // Owning thread has exited
+        // Owning thread only
+        InvocationCounters invocations;
+        std::unordered_map<std::string, uint32_t> name_ids;
+    };
+    const uint64_t generation_ = next_meter_generation.fetch_add(1);
+    std::vector<std::shared_ptr<MarkerRing>> rings_;
+    std::mutex rings_mutex_;  // Registration only; taken after markers_mutex_
+    
+    MarkerRing& thread_ring();
+    void push_marker(MarkerRing& ring, uint32_t checkpoint_id, uint64_t ts);
+    void drain_ring(MarkerRing& ring);  // requires markers_mutex_
+    void drain_rings();                 // requires markers_mutex_
+
+    // Readings spilled before every checkpoint still waiting to be correlated
+    // or aggregated are never read again. Without this only drained exports
+    // would release them, and the spill file would grow for the whole run.
+    // Checkpoint paths release them once per second of readings
+    uint64_t oldest_pending_checkpoint_ns();  // requires markers_mutex_
+    void release_spilled_readings();          // requires markers_mutex_; drains the rings
+    bool release_due() const {
+        return coordinator_->latest_reading_timestamp_ns() >= next_release_reading_ns_.load(std::memory_order_relaxed);
+    }
+    std::atomic<uint64_t> next_release_reading_ns_{0};
+    std::atomic<uint64_t> reading_hold_ns_{std::numeric_limits<uint64_t>::max()};  // Set by hold_readings_from
+    
+    // Logical contexts (asyncio tasks) sharing a thread: energy between a
+    // Suspended and the next Resumed is taken out of their checkpoints
+    struct ContextEvent {
+        uint64_t timestamp_ns;
+        uint64_t context_key;
+        EnergyMeter::ContextSwitch state;
+    };
+    struct ContextClock {
+        double active_joules{0.0};  // Energy of completed steps
+        double resume_joules{0.0};  // System energy when the current step began
+        bool running{false};
+    };
+    std::vector<ContextEvent> context_events_;
+    std::unordered_map<uint64_t, ContextClock> context_clocks_;  // Carried across drained windows
+    
+    // Merge-joins markers up to until_ns with a copy of the readings they span and
+    // hands each record to sink in time order, under markers_mutex_ but not the
+    // coordinator's reading lock; consume removes them afterwards. Markers of all
+    // threads share one time order only so a single forward pass brackets them
+    // with readings and replays context switches; enter/exit pairing per thread
+    // is left to the sink's consumer.
+    // With domain_names set, it receives the reading domain table and the sink
+    // gets one interpolated value per domain (NaN where unknown); otherwise the
+    // domain values are empty
+    using RecordSink = std::function<void(const EnergyMeter::CheckpointRecord&, const std::vector<double>& domains)>;
+    void stream_checkpoint_records(uint64_t until_ns, bool consume, std::vector<std::string>* domain_names,
+                                   const RecordSink& sink);
+    // Sink appending records, and their domain values as columns when domains is set
+    static RecordSink collect_records(std::vector<EnergyMeter::CheckpointRecord>& records,
+                                      EnergyMeter::CheckpointDomains* domains);
+    void sort_markers();  // requires markers_mutex_
+    
+    // Online aggregation: spans are matched per thread and folded into Welford
+    // statistics as readings cover them, so nothing grows with the call count
+    struct RunningStats {
+        uint64_t count{0};
+        double sum{0.0}, mean{0.0}, m2{0.0}, min{0.0}, max{0.0};
+        void add(double x) {
+            ++count;
+            sum += x;
+            if (count == 1) { min = max = x; } else { min = std::min(min, x); max = std::max(max, x); }
+            double delta = x - mean;
+            mean += delta / count;
+            m2 += delta * (x - mean);
+        }
+        double variance() const { return count > 1 ? m2 / (count - 1) : 0.0; }
+    };
+    struct SpanStats {
+        RunningStats energy_joules;
+        RunningStats duration_ns;
+    };
+    struct OpenFrame {
+        uint32_t match_key;     // Enter ID, or interned function name for named markers
+        uint32_t report_id;     // Checkpoint the statistics are reported under
+        uint64_t enter_ts;
+        double enter_joules;
+        bool enter_resolved;
+    };
+    struct Suspension {
+        uint64_t suspend_ts;
+        uint64_t resume_ts;     // 0 while still suspended
+        double joules;
+        bool resolved;
+    };
+    struct PendingSpan {
+        uint32_t report_id;
+        uint64_t enter_ts;
+        uint64_t exit_ts;
+        double enter_joules;
+        bool enter_resolved;
+        std::vector<Suspension> suspensions;
+    };
+    
+    std::atomic<bool> aggregation_enabled_{false};
+    std::vector<uint32_t> pairing_specs_;
+    std::unordered_map<std::string, uint32_t> function_name_keys_;
+    // Pairing of interned "enter:NAME:..." / "exit:NAME:..." IDs, by name index
+    struct NamedPairing {
+        uint32_t match_key{0};
+        bool resolved{false};
+        bool paired{false};
+        bool is_exit{false};
+    };
+    std::vector<NamedPairing> named_pairings_;
+    std::unordered_map<uint64_t, std::vector<OpenFrame>> open_frames_;
+    std::deque<PendingSpan> pending_spans_;
+    std::unordered_map<uint32_t, SpanStats> span_stats_;
+    std::unordered_map<uint64_t, std::vector<Suspension>> suspensions_;  // Contexts with open frames
+    size_t unresolved_enters_{0};
+    uint64_t last_drain_reading_ns_{0};
+    
+    // All require markers_mutex_
+    void aggregate_enter(uint64_t thread_key, uint32_t match_key, uint32_t report_id, uint64_t ts);
+    void aggregate_exit(uint64_t thread_key, uint32_t match_key, uint64_t ts);
+    void aggregate_id(uint64_t thread_key, uint32_t checkpoint_id, uint64_t ts);
+    const NamedPairing& named_pairing(uint32_t checkpoint_id);
+    void drain_spans(bool final);
+    
     // Accuracy optimization features
     void apply_noise_minimization();
     void prefault_memory();
@@ -102,16 +381,49 @@ EnergyMeter::Impl::Impl(const NEMBConfig& config)
         coordinator_config.measurement_interval = std::chrono::milliseconds(1);
         coordinator_config.measurement_buffer_size = 100000; 
     }
+    if (config.reading_buffer_size.has_value()) {
+        coordinator_config.measurement_buffer_size = *config.reading_buffer_size;
+    }
     
+    // Readings the buffer overwrites go to a temporary file, so long runs keep
+    // their early readings; CODEGREEN_SPILL_READINGS=0 drops them instead
+    const char* spill_env = std::getenv("CODEGREEN_SPILL_READINGS");
+    coordinator_config.spill_readings = !(spill_env && std::strcmp(spill_env, "0") == 0);
+
+    // With CODEGREEN_IDLE_INTERVAL_MS set (default 0: off), the coordinator
+    // samples that often between bursts of checkpoints instead of every
+    // measurement_interval, and stays at the fast rate for
+    // CODEGREEN_BURST_HOLD_MS after the last one. It is opt-in because
+    // sampling mode and reading_columns() consumers want dense readings
+    // whether or not checkpoints arrive.
+    coordinator_config.idle_interval = env_milliseconds("CODEGREEN_IDLE_INTERVAL_MS", coordinator_config.idle_interval);
+    coordinator_config.burst_hold = env_milliseconds("CODEGREEN_BURST_HOLD_MS", coordinator_config.burst_hold);
+
+    // CODEGREEN_RECORD names a trace of every reading for CODEGREEN_REPLAY; the
+    // first process that measures owns the path, later ones write <path>.<pid>
+    const char* record_env = std::getenv("CODEGREEN_RECORD");
+    if (record_env && *record_env) {
+        static const pid_t record_owner = getpid();
+        coordinator_config.record_path = record_env;
+        if (getpid() != record_owner) coordinator_config.record_path += "." + std::to_string(getpid());
+    }
+
     coordinator_config.auto_restart_failed_providers = nemb_config.coordinator.auto_restart_failed_providers;
     coordinator_config.provider_restart_interval = nemb_config.coordinator.provider_restart_interval;
     
     coordinator_ = std::make_unique<nemb::MeasurementCoordinator>(coordinator_config);
 
     // Pre-allocate marker storage to reduce reallocation overhead (typical workload ~10K checkpoints)
-    markers_.reserve(10000);
+    id_markers_.reserve(10000);
 
-    auto providers = nemb::detect_available_providers();
+    // A replayed source stands in for the hardware so runs are reproducible
+    std::vector<std::unique_ptr<nemb::EnergyProvider>> providers;
+    if (std::getenv("CODEGREEN_REPLAY")) {
+        auto replay = nemb::EnergyProvider::create("replay");
+        if (replay && replay->initialize()) providers.push_back(std::move(replay));
+    } else {
+        providers = nemb::detect_available_providers();
+    }
     for (auto& provider : providers) {
         coordinator_->add_provider(std::move(provider));
     }
@@ -132,73 +444,627 @@ EnergyMeter::Impl::~Impl() {
     active_sessions_.clear();
 }
 
+EnergyMeter::Impl::MarkerRing& EnergyMeter::Impl::thread_ring() {
+    // Rings outlive the meter while their thread holds them; exited threads retire theirs
+    struct ThreadRing {
+        uint64_t generation{0};
+        std::shared_ptr<MarkerRing> ring;
+        ~ThreadRing() {
+            if (ring) ring->retired.store(true, std::memory_order_release);
+        }
+    };
+    thread_local ThreadRing local;
+    if (local.generation != generation_) {
+        // First checkpoint of this thread on this meter
+        auto ring = std::make_shared<MarkerRing>(current_thread_key(), kMarkerRingCapacity);
+        {
+            std::lock_guard<std::mutex> lock(rings_mutex_);
+            rings_.push_back(ring);
+        }
+        if (local.ring) local.ring->retired.store(true, std::memory_order_release);
+        local.ring = std::move(ring);
+        local.generation = generation_;
+    }
+    return *local.ring;
+}
+
+void EnergyMeter::Impl::push_marker(MarkerRing& ring, uint32_t checkpoint_id, uint64_t ts) {
+    uint64_t head = ring.head.load(std::memory_order_relaxed);
+    if (head - ring.tail.load(std::memory_order_acquire) == ring.slots.size()) {
+        // Full: the one lock per ring's worth of checkpoints
+        std::lock_guard<std::mutex> lock(markers_mutex_);
+        drain_ring(ring);
+    }
+    ring.slots[head & (ring.slots.size() - 1)] = {ts, checkpoint_id, ring.invocations.next(checkpoint_id)};
+    ring.head.store(head + 1, std::memory_order_release);
+    coordinator_->notify_activity();
+    if (release_due()) {
+        // Whichever thread gets the lock first; the others go on marking
+        std::unique_lock<std::mutex> lock(markers_mutex_, std::try_to_lock);
+        if (lock.owns_lock()) release_spilled_readings();
+    }
+}
+
+void EnergyMeter::Impl::drain_ring(MarkerRing& ring) {
+    uint64_t tail = ring.tail.load(std::memory_order_relaxed);
+    uint64_t head = ring.head.load(std::memory_order_acquire);
+    if (tail == head) return;
+    size_t mask = ring.slots.size() - 1;
+    if (aggregation_enabled_.load(std::memory_order_relaxed)) {
+        for (; tail != head; ++tail) {
+            const RingRecord& record = ring.slots[tail & mask];
+            if (is_discarded(record.checkpoint_id)) continue;
+            aggregate_id(ring.thread_key, record.checkpoint_id, record.timestamp_ns);
+        }
+    } else {
+        id_markers_.reserve(id_markers_.size() + (head - tail));
+        for (; tail != head; ++tail) {
+            const RingRecord& record = ring.slots[tail & mask];
+            if (is_discarded(record.checkpoint_id)) continue;
+            id_markers_.push_back({record.timestamp_ns, ring.thread_key, record.checkpoint_id, record.invocation});
+        }
+    }
+    ring.tail.store(tail, std::memory_order_release);
+}
+
+void EnergyMeter::Impl::drain_rings() {
+    std::vector<std::shared_ptr<MarkerRing>> rings;
+    {
+        std::lock_guard<std::mutex> lock(rings_mutex_);
+        rings = rings_;
+    }
+    for (auto& ring : rings) drain_ring(*ring);
+
+    // An exited thread's ring is dropped once it has been drained
+    std::lock_guard<std::mutex> lock(rings_mutex_);
+    rings_.erase(std::remove_if(rings_.begin(), rings_.end(), [](const std::shared_ptr<MarkerRing>& ring) {
+        return ring->retired.load(std::memory_order_acquire) &&
+               ring->head.load(std::memory_order_acquire) == ring->tail.load(std::memory_order_relaxed);
+    }), rings_.end());
+}
+
+uint64_t EnergyMeter::Impl::oldest_pending_checkpoint_ns() {
+    // Ring records are left out: the rings were just drained, and records
+    // added since are newer than the buffered readings, which are kept
+    uint64_t oldest = std::min(coordinator_->latest_reading_timestamp_ns(), reading_hold_ns_.load(std::memory_order_relaxed));
+    if (!id_markers_.empty()) {
+        // The sorted prefix starts with its oldest marker; the tail is unsorted
+        oldest = std::min(oldest, id_markers_.front().timestamp_ns);
+        for (size_t i = sorted_markers_; i < id_markers_.size(); ++i) oldest = std::min(oldest, id_markers_[i].timestamp_ns);
+    }
+    for (const auto& event : context_events_) oldest = std::min(oldest, event.timestamp_ns);
+
+    // Aggregation: enters not pinned yet, spans not folded yet and suspensions not resolved yet
+    auto suspension_start = [&oldest](const std::vector<Suspension>& suspensions) {
+        for (const auto& suspension : suspensions) {
+            if (!suspension.resolved) oldest = std::min(oldest, suspension.suspend_ts);
+        }
+    };
+    if (unresolved_enters_ > 0) {
+        for (const auto& [thread_key, frames] : open_frames_) {
+            for (const auto& frame : frames) {
+                if (!frame.enter_resolved) oldest = std::min(oldest, frame.enter_ts);
+            }
+        }
+    }
+    for (const auto& span : pending_spans_) {
+        oldest = std::min(oldest, span.enter_resolved ? span.exit_ts : span.enter_ts);
+        suspension_start(span.suspensions);
+    }
+    for (const auto& [context_key, suspensions] : suspensions_) suspension_start(suspensions);
+    return oldest;
+}
+
+void EnergyMeter::Impl::release_spilled_readings() {
+    // At most once per second of readings; spilled chunks hold about four
+    if (!release_due()) return;
+    next_release_reading_ns_.store(coordinator_->latest_reading_timestamp_ns() + 1000000000ULL, std::memory_order_relaxed);
+    drain_rings();
+    if (aggregation_enabled_.load(std::memory_order_relaxed)) {
+        // Pin the enters and fold the spans the drain queued, though no reading is new
+        last_drain_reading_ns_ = 0;
+        drain_spans(false);
+    }
+    coordinator_->discard_spilled_readings_before(oldest_pending_checkpoint_ns());
+}
+
 void EnergyMeter::Impl::mark_checkpoint(const std::string& name) {
-    // Invocation tracking - thread_local for zero-lock performance
-    thread_local std::unordered_map<std::string, uint32_t> invocation_counters;
+    uint64_t ts = timer_.get_timestamp_ns();
+    MarkerRing& ring = thread_ring();
+
+    // Each thread interns a name under the lock once, then marks its ID
+    auto it = ring.name_ids.find(name);
+    if (it == ring.name_ids.end()) {
+        it = ring.name_ids.emplace(name, intern_checkpoint(name)).first;
+    }
+    push_marker(ring, it->second, ts);
+}
+
+void EnergyMeter::Impl::mark_checkpoint_id(uint32_t checkpoint_id) {
+    push_marker(thread_ring(), checkpoint_id, timer_.get_timestamp_ns());
+}
+
+void EnergyMeter::Impl::mark_checkpoints_batch(const uint64_t* records, size_t count, uint64_t thread_key) {
+    if (!records || count == 0) return;
+    coordinator_->notify_activity();
+
+    // One lock per batch instead of one per checkpoint
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    release_spilled_readings();
+    if (aggregation_enabled_.load(std::memory_order_relaxed)) {
+        for (size_t i = 0; i < count; ++i) {
+            uint32_t checkpoint_id = static_cast<uint32_t>(records[2 * i + 1]);
+            if (is_discarded(checkpoint_id)) continue;
+            aggregate_id(thread_key, checkpoint_id, records[2 * i]);
+        }
+        return;
+    }
+    auto& invocation_counters = batch_invocation_counters_[thread_key];
+    id_markers_.reserve(id_markers_.size() + count);
 
-    // Get thread ID for multi-thread uniqueness (computed once per thread)
-    thread_local std::hash<std::thread::id> hasher;
-    thread_local size_t thread_hash = hasher(std::this_thread::get_id());
+    for (size_t i = 0; i < count; ++i) {
+        uint64_t ts = records[2 * i];
+        uint32_t checkpoint_id = static_cast<uint32_t>(records[2 * i + 1]);
+        if (is_discarded(checkpoint_id)) continue;
+        id_markers_.push_back({ts, thread_key, checkpoint_id, invocation_counters.next(checkpoint_id)});
+    }
+}
+
+void EnergyMeter::Impl::mark_checkpoint_id_for(uint32_t checkpoint_id, uint64_t context_key) {
+    uint64_t ts = timer_.get_timestamp_ns();
+    coordinator_->notify_activity();
 
-    // Get and increment invocation counter
-    uint32_t invocation = ++invocation_counters[name];
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    release_spilled_readings();
+    if (is_discarded(checkpoint_id)) return;
+    if (aggregation_enabled_.load(std::memory_order_relaxed)) {
+        aggregate_id(context_key, checkpoint_id, ts);
+        return;
+    }
+    auto& invocation_counters = batch_invocation_counters_[context_key];
+    id_markers_.push_back({ts, context_key, checkpoint_id, invocation_counters.next(checkpoint_id)});
+}
 
-    // Get timestamp BEFORE lock to minimize critical section
+void EnergyMeter::Impl::mark_context_switch(uint64_t context_key, EnergyMeter::ContextSwitch state) {
     uint64_t ts = timer_.get_timestamp_ns();
+    coordinator_->notify_activity();
+
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    if (state == EnergyMeter::ContextSwitch::Finished) {
+        batch_invocation_counters_.erase(context_key);
+    }
+    if (!aggregation_enabled_.load(std::memory_order_relaxed)) {
+        context_events_.push_back({ts, context_key, state});
+        return;
+    }
+
+    auto frames = open_frames_.find(context_key);
+    if (frames == open_frames_.end()) return;
+    if (state == EnergyMeter::ContextSwitch::Finished) {
+        // Frames still open when the context ends never get their exit
+        for (const auto& frame : frames->second) {
+            if (!frame.enter_resolved) --unresolved_enters_;
+        }
+        open_frames_.erase(frames);
+        suspensions_.erase(context_key);
+        return;
+    }
+    auto& suspensions = suspensions_[context_key];
+    bool suspended = !suspensions.empty() && suspensions.back().resume_ts == 0;
+    if (state == EnergyMeter::ContextSwitch::Resumed) {
+        if (suspended) suspensions.back().resume_ts = ts;
+    } else if (!suspended) {
+        suspensions.push_back({ts, 0, 0.0, false});
+    }
+}
 
-    // Pre-allocate buffer to avoid heap allocations (stack-based)
-    // Format: "original_name#inv_N_tTHREADID"
-    thread_local char enhanced_buffer[512];
-    int len = snprintf(enhanced_buffer, sizeof(enhanced_buffer),
-                       "%s#inv_%u_t%zu", name.c_str(), invocation, thread_hash);
+void EnergyMeter::Impl::enable_aggregation(bool enabled) {
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    // Ring records taken before the switch keep the mode they were taken in
+    drain_rings();
+    aggregation_enabled_.store(enabled, std::memory_order_relaxed);
+}
 
-    if (len < 0 || len >= static_cast<int>(sizeof(enhanced_buffer))) {
-        // Fallback for very long names (rare)
-        std::lock_guard<std::mutex> lock(markers_mutex_);
-        markers_.push_back({name + "#inv_" + std::to_string(invocation) + "_t" + std::to_string(thread_hash), ts});
+void EnergyMeter::Impl::set_checkpoint_pairing(uint32_t first_id, const uint32_t* specs, size_t count) {
+    if (!specs || count == 0) return;
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    size_t end = static_cast<size_t>(first_id) + count;
+    if (pairing_specs_.size() < end) {
+        pairing_specs_.resize(end, EnergyMeter::kUnpairedCheckpoint);
+    }
+    std::copy(specs, specs + count, pairing_specs_.begin() + first_id);
+}
+
+const EnergyMeter::Impl::NamedPairing& EnergyMeter::Impl::named_pairing(uint32_t checkpoint_id) {
+    size_t index = checkpoint_id & ~EnergyMeter::kNamedCheckpointFlag;
+    if (index >= named_pairings_.size()) named_pairings_.resize(index + 1);
+    NamedPairing& pairing = named_pairings_[index];
+    if (pairing.resolved || index >= checkpoint_names_.size()) return pairing;
+    pairing.resolved = true;
+
+    // "enter:NAME:..." and "exit:NAME:..." pair on NAME; other names are not aggregated
+    const std::string& name = checkpoint_names_[index];
+    bool is_enter = name.compare(0, 6, "enter:") == 0;
+    bool is_exit = !is_enter && name.compare(0, 5, "exit:") == 0;
+    if (!is_enter && !is_exit) return pairing;
+    size_t start = is_enter ? 6 : 5;
+    size_t end = name.find(':', start);
+    std::string function = name.substr(start, end == std::string::npos ? std::string::npos : end - start);
+    auto it = function_name_keys_.find(function);
+    if (it == function_name_keys_.end()) {
+        uint32_t key = static_cast<uint32_t>(function_name_keys_.size()) | EnergyMeter::kNamedCheckpointFlag;
+        it = function_name_keys_.emplace(function, key).first;
+    }
+    pairing.match_key = it->second;
+    pairing.paired = true;
+    pairing.is_exit = is_exit;
+    return pairing;
+}
+
+void EnergyMeter::Impl::aggregate_id(uint64_t thread_key, uint32_t checkpoint_id, uint64_t ts) {
+    if (checkpoint_id & EnergyMeter::kNamedCheckpointFlag) {
+        const NamedPairing& pairing = named_pairing(checkpoint_id);
+        if (!pairing.paired) return;
+        if (pairing.is_exit) {
+            aggregate_exit(thread_key, pairing.match_key, ts);
+        } else {
+            aggregate_enter(thread_key, pairing.match_key, checkpoint_id, ts);
+        }
+        return;
+    }
+    uint32_t spec = checkpoint_id < pairing_specs_.size() ? pairing_specs_[checkpoint_id] : EnergyMeter::kUnpairedCheckpoint;
+    if (spec == EnergyMeter::kUnpairedCheckpoint) return;
+    uint32_t enter_id = spec >> 1;
+    if (spec & 1u) {
+        aggregate_exit(thread_key, enter_id, ts);
     } else {
+        aggregate_enter(thread_key, enter_id, enter_id, ts);
+    }
+}
+
+void EnergyMeter::Impl::aggregate_enter(uint64_t thread_key, uint32_t match_key, uint32_t report_id, uint64_t ts) {
+    open_frames_[thread_key].push_back({match_key, report_id, ts, 0.0, false});
+    ++unresolved_enters_;
+    drain_spans(false);
+}
+
+void EnergyMeter::Impl::aggregate_exit(uint64_t thread_key, uint32_t match_key, uint64_t ts) {
+    auto it = open_frames_.find(thread_key);
+    if (it == open_frames_.end()) return;
+    auto& frames = it->second;
+
+    // Frames left open by exceptions (no exit marker) are dropped on the way down
+    while (!frames.empty()) {
+        OpenFrame frame = frames.back();
+        frames.pop_back();
+        if (!frame.enter_resolved) --unresolved_enters_;
+        if (frame.match_key == match_key) {
+            PendingSpan span{frame.report_id, frame.enter_ts, ts, frame.enter_joules, frame.enter_resolved, {}};
+            auto suspended = suspensions_.find(thread_key);
+            if (suspended != suspensions_.end()) {
+                for (const auto& suspension : suspended->second) {
+                    if (suspension.suspend_ts >= frame.enter_ts) span.suspensions.push_back(suspension);
+                }
+            }
+            pending_spans_.push_back(std::move(span));
+            break;
+        }
+    }
+    if (frames.empty()) {
+        open_frames_.erase(it);
+        suspensions_.erase(thread_key);
+    }
+    drain_spans(false);
+}
+
+void EnergyMeter::Impl::drain_spans(bool final) {
+    uint64_t latest = coordinator_->latest_reading_timestamp_ns();
+    if (!final && latest == last_drain_reading_ns_) return;
+    last_drain_reading_ns_ = latest;
+
+    double joules = 0.0, watts = 0.0;
+    auto energy_at = [&](uint64_t ts) {
+        return coordinator_->interpolate_energy_at(ts, joules, watts) ? joules : 0.0;
+    };
+
+    // Pin enter energy of long-running frames before their readings leave the ring buffer
+    if (unresolved_enters_ > 0) {
+        for (auto& [thread_key, frames] : open_frames_) {
+            for (auto& frame : frames) {
+                if (!frame.enter_resolved && (final || frame.enter_ts <= latest)) {
+                    frame.enter_joules = energy_at(frame.enter_ts);
+                    frame.enter_resolved = true;
+                    --unresolved_enters_;
+                }
+            }
+        }
+    }
+    for (auto& span : pending_spans_) {
+        if (!span.enter_resolved && span.enter_ts <= latest) {
+            span.enter_joules = energy_at(span.enter_ts);
+            span.enter_resolved = true;
+        }
+    }
+    auto resolve = [&](Suspension& suspension) {
+        if (!suspension.resolved && suspension.resume_ts != 0 && (final || suspension.resume_ts <= latest)) {
+            suspension.joules = std::max(0.0, energy_at(suspension.resume_ts) - energy_at(suspension.suspend_ts));
+            suspension.resolved = true;
+        }
+    };
+    for (auto& [context_key, suspensions] : suspensions_) {
+        for (auto& suspension : suspensions) resolve(suspension);
+    }
+
+    while (!pending_spans_.empty() && (final || pending_spans_.front().exit_ts <= latest)) {
+        PendingSpan& span = pending_spans_.front();
+        double enter_joules = span.enter_resolved ? span.enter_joules : energy_at(span.enter_ts);
+        double exit_joules = energy_at(span.exit_ts);
+        double suspended_joules = 0.0;
+        for (auto& suspension : span.suspensions) {
+            resolve(suspension);
+            suspended_joules += suspension.joules;
+        }
+        auto& stats = span_stats_[span.report_id];
+        stats.energy_joules.add(std::max(0.0, exit_joules - enter_joules - suspended_joules));
+        stats.duration_ns.add(static_cast<double>(span.exit_ts - span.enter_ts));
+        pending_spans_.pop_front();
+    }
+}
+
+std::vector<EnergyMeter::CheckpointAggregate> EnergyMeter::Impl::get_checkpoint_aggregates() {
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    drain_rings();
+    drain_spans(true);
+
+    std::vector<EnergyMeter::CheckpointAggregate> result;
+    result.reserve(span_stats_.size());
+    for (const auto& [report_id, stats] : span_stats_) {
+        EnergyMeter::CheckpointAggregate agg{};
+        agg.checkpoint_id = report_id;
+        agg.count = stats.energy_joules.count;
+        agg.energy_sum_joules = stats.energy_joules.sum;
+        agg.energy_min_joules = stats.energy_joules.min;
+        agg.energy_max_joules = stats.energy_joules.max;
+        agg.energy_variance = stats.energy_joules.variance();
+        agg.duration_sum_ns = stats.duration_ns.sum;
+        agg.duration_min_ns = stats.duration_ns.min;
+        agg.duration_max_ns = stats.duration_ns.max;
+        agg.duration_variance = stats.duration_ns.variance();
+        result.push_back(agg);
+    }
+    std::sort(result.begin(), result.end(),
+        [](const EnergyMeter::CheckpointAggregate& a, const EnergyMeter::CheckpointAggregate& b) {
+            return a.checkpoint_id < b.checkpoint_id;
+        });
+    return result;
+}
+
+uint32_t EnergyMeter::Impl::intern_checkpoint_name(const std::string& name) {
+    auto it = checkpoint_name_ids_.find(name);
+    if (it != checkpoint_name_ids_.end()) return it->second;
+    uint32_t id = static_cast<uint32_t>(checkpoint_names_.size()) | EnergyMeter::kNamedCheckpointFlag;
+    checkpoint_names_.push_back(name);
+    checkpoint_name_ids_.emplace(name, id);
+    return id;
+}
+
+uint32_t EnergyMeter::Impl::intern_checkpoint(const std::string& name) {
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    return intern_checkpoint_name(name);
+}
+
+void EnergyMeter::Impl::discard_checkpoint(uint32_t checkpoint_id) {
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    if (!is_discarded(checkpoint_id)) discarded_checkpoints_.push_back(checkpoint_id);
+}
+
+std::string EnergyMeter::Impl::get_checkpoint_name(uint32_t checkpoint_id) const {
+    if (!(checkpoint_id & EnergyMeter::kNamedCheckpointFlag)) {
+        return std::to_string(checkpoint_id);
+    }
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    size_t index = checkpoint_id & ~EnergyMeter::kNamedCheckpointFlag;
+    return index < checkpoint_names_.size() ? checkpoint_names_[index] : std::string();
+}
+
+EnergyMeter::Impl::RecordSink EnergyMeter::Impl::collect_records(std::vector<EnergyMeter::CheckpointRecord>& records,
+                                                                  EnergyMeter::CheckpointDomains* domains) {
+    return [&records, domains](const EnergyMeter::CheckpointRecord& rec, const std::vector<double>& values) {
+        records.push_back(rec);
+        if (!domains) return;
+        domains->joules.resize(values.size());
+        for (size_t d = 0; d < values.size(); ++d) domains->joules[d].push_back(values[d]);
+    };
+}
+
+std::vector<EnergyMeter::CheckpointRecord> EnergyMeter::Impl::get_checkpoint_records(EnergyMeter::CheckpointDomains* domains) {
+    std::vector<EnergyMeter::CheckpointRecord> result;
+    if (domains) *domains = {};
+    stream_checkpoint_records(std::numeric_limits<uint64_t>::max(), false,
+                              domains ? &domains->names : nullptr, collect_records(result, domains));
+    if (domains) domains->joules.resize(domains->names.size());
+    return result;
+}
+
+std::vector<EnergyMeter::CheckpointRecord> EnergyMeter::Impl::drain_checkpoint_records(uint64_t until_ns, uint64_t& window_end_ns,
+                                                                                     EnergyMeter::CheckpointDomains* domains) {
+    if (domains) *domains = {};
+    window_end_ns = std::min(until_ns, coordinator_->latest_reading_timestamp_ns());
+    if (window_end_ns == 0) return {};
+
+    std::vector<EnergyMeter::CheckpointRecord> result;
+    stream_checkpoint_records(window_end_ns, true,
+                              domains ? &domains->names : nullptr, collect_records(result, domains));
+    if (domains) domains->joules.resize(domains->names.size());
+    {
+        // Open aggregation spans pin their enter energy before the readings go
         std::lock_guard<std::mutex> lock(markers_mutex_);
-        markers_.push_back({std::string(enhanced_buffer, len), ts});
+        if (aggregation_enabled_.load(std::memory_order_relaxed)) drain_spans(false);
     }
+    coordinator_->discard_readings_before(window_end_ns);
+    return result;
 }
 
-std::vector<EnergyMeter::CorrelatedCheckpoint> EnergyMeter::Impl::get_checkpoint_measurements() {
-    std::vector<EnergyMeter::CorrelatedCheckpoint> result;
-    auto readings = coordinator_->get_buffered_readings();
-    if (readings.empty()) return result;
+size_t EnergyMeter::Impl::checkpoint_count() {
+    std::lock_guard<std::mutex> lock(markers_mutex_);
+    drain_rings();
+    return id_markers_.size();
+}
+
+void EnergyMeter::Impl::sort_markers() {
+    // Drained rings and batches append runs already in time order, and the
+    // prefix stays sorted between exports, so only the new tail is sorted
+    auto by_time = [](const IdMarker& a, const IdMarker& b) { return a.timestamp_ns < b.timestamp_ns; };
+    auto tail = id_markers_.begin() + sorted_markers_;
+    if (!std::is_sorted(tail, id_markers_.end(), by_time)) std::stable_sort(tail, id_markers_.end(), by_time);
+    std::inplace_merge(id_markers_.begin(), tail, id_markers_.end(), by_time);
+    sorted_markers_ = id_markers_.size();
+}
 
+void EnergyMeter::Impl::stream_checkpoint_records(uint64_t until_ns, bool consume, std::vector<std::string>* domain_names,
+                                                  const RecordSink& sink) {
     std::lock_guard<std::mutex> lock(markers_mutex_);
-    result.reserve(markers_.size());
-    
-    for (const auto& marker : markers_) {
-        auto it = std::lower_bound(readings.begin(), readings.end(), marker.timestamp_ns,
-            [](const nemb::SynchronizedReading& r, uint64_t ts) {
-                return r.common_timestamp_ns < ts;
-            });
-            
-        EnergyMeter::CorrelatedCheckpoint cc;
-        cc.name = marker.name;
-        cc.timestamp_ns = marker.timestamp_ns;
-        
-        if (it == readings.end()) {
-            cc.cumulative_energy_joules = readings.back().total_system_energy_joules;
-            cc.instantaneous_power_watts = readings.back().total_system_power_watts;
-        } else if (it == readings.begin()) {
-            cc.cumulative_energy_joules = it->total_system_energy_joules;
-            cc.instantaneous_power_watts = it->total_system_power_watts;
-        } else {
-            const auto& r2 = *it;
-            const auto& r1 = *std::prev(it);
-            uint64_t dt = r2.common_timestamp_ns - r1.common_timestamp_ns;
-            double ratio = (dt > 0) ? static_cast<double>(marker.timestamp_ns - r1.common_timestamp_ns) / dt : 0.0;
-            cc.cumulative_energy_joules = r1.total_system_energy_joules + ratio * (r2.total_system_energy_joules - r1.total_system_energy_joules);
-            cc.instantaneous_power_watts = r1.total_system_power_watts + ratio * (r2.total_system_power_watts - r1.total_system_power_watts);
+    drain_rings();
+    sort_markers();
+    size_t end = std::upper_bound(id_markers_.begin(), id_markers_.end(), until_ns,
+        [](uint64_t ts, const IdMarker& m) { return ts < m.timestamp_ns; }) - id_markers_.begin();
+
+    // Only the readings around the markers are copied, and spilled chunks from
+    // before them are not decoded. The reading lock is released before the
+    // merge, so the measurement thread keeps sampling while the sink runs
+    uint64_t from_ns = end > 0 ? id_markers_.front().timestamp_ns : until_ns;
+    for (const auto& event : context_events_) from_ns = std::min(from_ns, event.timestamp_ns);
+    uint64_t to_ns = end > 0 ? id_markers_[end - 1].timestamp_ns : from_ns;
+    for (const auto& event : context_events_) {
+        if (event.timestamp_ns <= until_ns) to_ns = std::max(to_ns, event.timestamp_ns);
+    }
+    const auto readings = coordinator_->copy_readings(from_ns, to_ns);
+    if (readings.empty()) return;
+    if (domain_names) *domain_names = readings.domains;
+    std::vector<double> domain_values;
+
+    // Checkpoints of logical contexts get context-local energy: resume/suspend
+    // events are replayed in time order and suspended intervals left out
+    bool contexts = !context_events_.empty() || !context_clocks_.empty();
+    std::vector<ContextEvent> events;
+    for (const auto& event : context_events_) {
+        if (event.timestamp_ns <= until_ns) events.push_back(event);
+    }
+    std::stable_sort(events.begin(), events.end(),
+        [](const ContextEvent& a, const ContextEvent& b) { return a.timestamp_ns < b.timestamp_ns; });
+
+    // Non-consuming exports must not advance the clocks
+    auto clocks = context_clocks_;
+    SampleCursor event_cursor(readings);
+    auto replay = [&](const ContextEvent& event) {
+        double joules = 0.0, watts = 0.0;
+        event_cursor.at(event.timestamp_ns, joules, watts);
+        auto& clock = clocks[event.context_key];
+        if (event.state == EnergyMeter::ContextSwitch::Resumed) {
+            if (!clock.running) {
+                clock.resume_joules = joules;
+                clock.running = true;
+            }
+            return;
         }
-        result.push_back(cc);
+        if (clock.running) {
+            clock.active_joules += joules - clock.resume_joules;
+            clock.running = false;
+        }
+        if (event.state == EnergyMeter::ContextSwitch::Finished) clocks.erase(event.context_key);
+    };
+
+    // One pass: markers and events advance their cursors through the samples together
+    SampleCursor cursor(readings);
+    size_t next = 0;
+    for (size_t i = 0; i < end; ++i) {
+        const IdMarker& marker = id_markers_[i];
+        EnergyMeter::CheckpointRecord rec{};
+        rec.timestamp_ns = marker.timestamp_ns;
+        rec.checkpoint_id = marker.checkpoint_id;
+        rec.invocation = marker.invocation;
+        rec.thread_id = marker.thread_hash;
+        cursor.at(rec.timestamp_ns, rec.cumulative_energy_joules, rec.instantaneous_power_watts);
+        bool context_local = false;
+        if (contexts) {
+            while (next < events.size() && events[next].timestamp_ns < rec.timestamp_ns) replay(events[next++]);
+            auto clock = clocks.find(rec.thread_id);
+            if (clock != clocks.end()) {
+                double step_joules = clock->second.running ? rec.cumulative_energy_joules - clock->second.resume_joules : 0.0;
+                rec.cumulative_energy_joules = clock->second.active_joules + step_joules;
+                context_local = true;
+            }
+        }
+        if (domain_names) {
+            // Domains are not tracked per context, so context-local records get none
+            domain_values.resize(domain_names->size());
+            for (size_t d = 0; d < domain_values.size(); ++d) {
+                domain_values[d] = context_local ? std::numeric_limits<double>::quiet_NaN() : cursor.domain_joules(d);
+            }
+        }
+        sink(rec, domain_values);
+    }
+    while (next < events.size()) replay(events[next++]);
+
+    if (consume) {
+        id_markers_.erase(id_markers_.begin(), id_markers_.begin() + end);
+        sorted_markers_ -= end;
+        context_clocks_ = std::move(clocks);
+        context_events_.erase(std::remove_if(context_events_.begin(), context_events_.end(),
+            [until_ns](const ContextEvent& e) { return e.timestamp_ns <= until_ns; }), context_events_.end());
     }
+}
+
+std::vector<EnergyMeter::CorrelatedCheckpoint> EnergyMeter::Impl::get_checkpoint_measurements() {
+    std::vector<EnergyMeter::CorrelatedCheckpoint> result;
+    for_each_checkpoint_measurement(
+        [&result](const EnergyMeter::CorrelatedCheckpoint& cc) { result.push_back(cc); });
+    return result;
+}
+
+void EnergyMeter::Impl::for_each_checkpoint_measurement(const std::function<void(const EnergyMeter::CorrelatedCheckpoint&)>& sink) {
+    // Exported names are "<name or id>#inv_N_tTHREAD"; the manifest resolves integer IDs.
+    // The sink runs under markers_mutex_, so names are read directly
+    EnergyMeter::CorrelatedCheckpoint cc;
+    std::vector<std::string> domain_names;
+    stream_checkpoint_records(std::numeric_limits<uint64_t>::max(), false, &domain_names,
+        [&](const EnergyMeter::CheckpointRecord& rec, const std::vector<double>& domains) {
+            if (rec.checkpoint_id & EnergyMeter::kNamedCheckpointFlag) {
+                cc.name = checkpoint_names_[rec.checkpoint_id & ~EnergyMeter::kNamedCheckpointFlag];
+            } else {
+                cc.name = std::to_string(rec.checkpoint_id);
+            }
+            cc.name += "#inv_" + std::to_string(rec.invocation) + "_t" + std::to_string(rec.thread_id);
+            cc.timestamp_ns = rec.timestamp_ns;
+            cc.cumulative_energy_joules = rec.cumulative_energy_joules;
+            cc.instantaneous_power_watts = rec.instantaneous_power_watts;
+            for (size_t d = 0; d < domains.size(); ++d) {
+                if (std::isnan(domains[d])) cc.domain_energy_joules.erase(domain_names[d]);
+                else cc.domain_energy_joules[domain_names[d]] = domains[d];
+            }
+            sink(cc);
+        });
+}
+
+EnergyMeter::ReadingColumns EnergyMeter::Impl::acquire_readings() {
+    std::lock_guard<std::mutex> lock(snapshot_mutex_);
+    if (!reading_snapshot_) reading_snapshot_.emplace(coordinator_->snapshot_readings());
+    const nemb::ReadingColumns& columns = *reading_snapshot_;
+    EnergyMeter::ReadingColumns result;
+    result.timestamps_ns = columns.timestamps();
+    result.energy_joules = columns.energy();
+    result.power_watts = columns.power();
+    result.count = columns.size();
+    result.domains = columns.domains();
+    for (size_t i = 0; i < result.domains.size(); ++i) result.domain_joules.push_back(columns.domain_column(i));
     return result;
 }
 
+void EnergyMeter::Impl::release_readings() {
+    std::lock_guard<std::mutex> lock(snapshot_mutex_);
+    reading_snapshot_.reset();
+}
+
 EnergyResult EnergyMeter::Impl::read() {
     if (!coordinator_ || coordinator_->get_active_providers().empty()) {
         EnergyResult res; res.is_valid = false; res.error_message = "Unavailable"; return res;
@@ -238,7 +1104,9 @@ bool EnergyMeter::Impl::is_available() const { return coordinator_ && !coordinat
 std::vector<std::string> EnergyMeter::Impl::get_provider_info() const { return coordinator_ ? coordinator_->get_active_providers() : std::vector<std::string>{}; }
 bool EnergyMeter::Impl::self_test() { return is_available() && read().is_valid; }
 std::map<std::string, std::string> EnergyMeter::Impl::get_diagnostics() const {
-    std::map<std::string, std::string> d; d["available"] = is_available()?"true":"false"; return d;
+    std::map<std::string, std::string> d; d["available"] = is_available()?"true":"false";
+    if (coordinator_) d["spilled_readings"] = std::to_string(coordinator_->spilled_reading_count());
+    return d;
 }
 void EnergyMeter::Impl::apply_noise_minimization() {}
 void EnergyMeter::Impl::prefault_memory() {}
@@ -255,7 +1123,24 @@ EnergyMeter::~EnergyMeter() = default;
 EnergyMeter::EnergyMeter(EnergyMeter&&) noexcept = default;
 EnergyMeter& EnergyMeter::operator=(EnergyMeter&&) noexcept = default;
 void EnergyMeter::mark_checkpoint(const std::string& n) { impl_->mark_checkpoint(n); }
+void EnergyMeter::mark_checkpoint_id(uint32_t id) { impl_->mark_checkpoint_id(id); }
+void EnergyMeter::mark_checkpoints_batch(const uint64_t* r, size_t n, uint64_t t) { impl_->mark_checkpoints_batch(r, n, t); }
+void EnergyMeter::hold_readings_from(uint64_t timestamp_ns) { impl_->hold_readings_from(timestamp_ns); }
+void EnergyMeter::mark_checkpoint_id_for(uint32_t id, uint64_t key) { impl_->mark_checkpoint_id_for(id, key); }
+void EnergyMeter::mark_context_switch(uint64_t key, ContextSwitch state) { impl_->mark_context_switch(key, state); }
 std::vector<EnergyMeter::CorrelatedCheckpoint> EnergyMeter::get_checkpoint_measurements() { return impl_->get_checkpoint_measurements(); }
+void EnergyMeter::for_each_checkpoint_measurement(const std::function<void(const CorrelatedCheckpoint&)>& sink) { impl_->for_each_checkpoint_measurement(sink); }
+size_t EnergyMeter::checkpoint_count() { return impl_->checkpoint_count(); }
+std::vector<EnergyMeter::CheckpointRecord> EnergyMeter::get_checkpoint_records(CheckpointDomains* domains) { return impl_->get_checkpoint_records(domains); }
+std::vector<EnergyMeter::CheckpointRecord> EnergyMeter::drain_checkpoint_records(uint64_t until, uint64_t& end_ns, CheckpointDomains* domains) { return impl_->drain_checkpoint_records(until, end_ns, domains); }
+std::string EnergyMeter::get_checkpoint_name(uint32_t id) const { return impl_->get_checkpoint_name(id); }
+uint32_t EnergyMeter::intern_checkpoint(const std::string& name) { return impl_->intern_checkpoint(name); }
+void EnergyMeter::discard_checkpoint(uint32_t id) { impl_->discard_checkpoint(id); }
+void EnergyMeter::enable_aggregation(bool enabled) { impl_->enable_aggregation(enabled); }
+EnergyMeter::ReadingColumns EnergyMeter::acquire_readings() { return impl_->acquire_readings(); }
+void EnergyMeter::release_readings() { impl_->release_readings(); }
+void EnergyMeter::set_checkpoint_pairing(uint32_t first, const uint32_t* specs, size_t n) { impl_->set_checkpoint_pairing(first, specs, n); }
+std::vector<EnergyMeter::CheckpointAggregate> EnergyMeter::get_checkpoint_aggregates() { return impl_->get_checkpoint_aggregates(); }
 bool EnergyMeter::is_available() const { return impl_->is_available(); }
 std::vector<std::string> EnergyMeter::get_provider_info() const { return impl_->get_provider_info(); }
 EnergyResult EnergyMeter::read() { return impl_->read(); }
@@ -302,13 +1187,150 @@ double validate_measurement_accuracy(double d) { return 0.99; }
 }
 } // namespace codegreen
 
+namespace {
+// Checkpoints are written as they are correlated; the full list is never held
+void write_checkpoints_array(std::ostream& out, codegreen::EnergyMeter& meter) {
+    out << "[";
+    bool first = true;
+    meter.for_each_checkpoint_measurement([&](const codegreen::EnergyMeter::CorrelatedCheckpoint& cp) {
+        if(!first) out << ", ";
+        first = false;
+        out << "{\"checkpoint_id\": \"" << cp.name << "\", \"timestamp\": " << cp.timestamp_ns
+            << ", \"joules\": " << cp.cumulative_energy_joules << ", \"watts\": " << cp.instantaneous_power_watts;
+        if (!cp.domain_energy_joules.empty()) {
+            out << ", \"domains\": {";
+            const char* separator = "";
+            for (const auto& [domain, joules] : cp.domain_energy_joules) {
+                out << separator << "\"" << domain << "\": " << joules;
+                separator = ", ";
+            }
+            out << "}";
+        }
+        out << "}";
+    });
+    out << "]";
+}
+
+void write_checkpoints_json(std::ostream& out, const char* key, codegreen::EnergyMeter& meter) {
+    out << "{\"" << key << "\": ";
+    write_checkpoints_array(out, meter);
+    out << "}";
+}
+
+void write_stats_json(std::ostream& out, uint64_t count, double sum, double min, double max, double variance) {
+    out << "{\"sum\": " << sum << ", \"min\": " << min << ", \"max\": " << max
+        << ", \"mean\": " << (count ? sum / count : 0.0) << ", \"variance\": " << variance << "}";
+}
+
+void write_aggregates_array(std::ostream& out, const codegreen::EnergyMeter& meter,
+                            const std::vector<codegreen::EnergyMeter::CheckpointAggregate>& aggs) {
+    out << "[";
+    for(size_t i=0; i<aggs.size(); ++i) {
+        const auto& a = aggs[i];
+        out << "{\"checkpoint_id\": \"" << meter.get_checkpoint_name(a.checkpoint_id) << "\", \"count\": " << a.count
+            << ", \"energy_joules\": ";
+        write_stats_json(out, a.count, a.energy_sum_joules, a.energy_min_joules, a.energy_max_joules, a.energy_variance);
+        out << ", \"duration_ns\": ";
+        write_stats_json(out, a.count, a.duration_sum_ns, a.duration_min_ns, a.duration_max_ns, a.duration_variance);
+        out << "}";
+        if(i < aggs.size()-1) out << ", ";
+    }
+    out << "]";
+}
+
+void write_report_json(std::ostream& out, codegreen::EnergyMeter& meter,
+                       const std::vector<codegreen::EnergyMeter::CheckpointAggregate>& aggs) {
+    out << "{\"pid\": " << getpid() << ", \"parent_pid\": " << getppid() << ", \"measurements\": ";
+    write_checkpoints_array(out, meter);
+    if (!aggs.empty()) {
+        out << ", \"aggregates\": ";
+        write_aggregates_array(out, meter, aggs);
+    }
+    out << "}";
+}
+} // namespace
+
 extern "C" {
     static std::unique_ptr<codegreen::EnergyMeter> c_api_meter;
     static std::mutex c_api_mutex;
+    // c_api_meter once created; checkpoint entry points load it without the mutex
+    static std::atomic<codegreen::EnergyMeter*> c_api_live{nullptr};
+    static std::vector<codegreen::EnergyMeter::CheckpointRecord> c_api_records;
+    static codegreen::EnergyMeter::CheckpointDomains c_api_record_domains;
+    static codegreen::EnergyMeter::ReadingColumns c_api_readings;
+
+    void nemb_report_at_exit();
+
+    // A forked child inherits the parent's meter and markers but not its
+    // measurement thread. The child drops the meter without destroying it (the
+    // destructor would join threads that do not exist there) and creates its
+    // own on the next call.
+    static void c_api_prepare_fork() { c_api_mutex.lock(); }
+    static void c_api_parent_after_fork() { c_api_mutex.unlock(); }
+    static void c_api_child_after_fork() {
+        c_api_mutex.unlock();
+        c_api_live.store(nullptr, std::memory_order_release);
+        c_api_readings = {};
+        c_api_meter.release();
+        c_api_records.clear();
+        c_api_record_domains = {};
+    }
+
+    // Set once the meter could not be created (no usable provider); not retried
+    static bool c_api_meter_failed = false;
+
+    // Create the meter on first use (caller holds c_api_mutex). Returns false
+    // when it cannot be created: exceptions must not cross the C boundary.
+    // Only a meter created lazily by a checkpoint call reports at exit; a
+    // runtime that calls nemb_initialize first writes its own results.
+    static bool ensure_c_api_meter(bool report_at_exit) {
+        static bool fork_handlers_registered = false;
+        static bool exit_report_registered = false;
+        if (c_api_meter) return true;
+        if (c_api_meter_failed) return false;
+        try {
+            c_api_meter = std::make_unique<codegreen::EnergyMeter>();
+        } catch (const std::exception& e) {
+            std::cerr << "NEMB: energy meter unavailable: " << e.what() << std::endl;
+            c_api_meter_failed = true;
+            return false;
+        }
+        // The first measured process owns CODEGREEN_RESULT_FILE; children write shards
+        setenv("CODEGREEN_RESULT_OWNER", std::to_string(getpid()).c_str(), 0);
+        if (!fork_handlers_registered) {
+            fork_handlers_registered = true;
+            pthread_atfork(c_api_prepare_fork, c_api_parent_after_fork, c_api_child_after_fork);
+        }
+        if (report_at_exit && !exit_report_registered) {
+            exit_report_registered = true;
+            std::atexit(nemb_report_at_exit);
+        }
+        c_api_live.store(c_api_meter.get(), std::memory_order_release);
+        return true;
+    }
+
+    // Meter for the checkpoint entry points: one atomic load once it exists
+    // (null when no meter can be created, and the checkpoint is dropped)
+    static codegreen::EnergyMeter* c_api_checkpoint_meter() {
+        codegreen::EnergyMeter* meter = c_api_live.load(std::memory_order_acquire);
+        if (meter) return meter;
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        return ensure_c_api_meter(true) ? c_api_meter.get() : nullptr;
+    }
+
+    // Processes other than the result file's owner (forked or spawned children)
+    // write a shard beside it, tagged with their PID
+    static std::string result_path_for_process(const char* result_path) {
+        std::string path(result_path);
+        const char* owner = std::getenv("CODEGREEN_RESULT_OWNER");
+        std::string pid = std::to_string(getpid());
+        if (owner && pid != owner) path += "." + pid;
+        return path;
+    }
 
     int nemb_initialize() {
         std::lock_guard<std::mutex> l(c_api_mutex);
-        if(!c_api_meter) c_api_meter = std::make_unique<codegreen::EnergyMeter>();
+        if (!ensure_c_api_meter(false)) return 0;
         return c_api_meter->is_available() ? 1 : 0;
     }
     uint64_t nemb_start_session(const char* n) {
@@ -330,31 +1352,59 @@ extern "C" {
         return 0;
     }
 
+    // Results go to the file named by CODEGREEN_RESULT_FILE so they never mix with
+    // the program's own stdout; without it (standalone runs) they are printed.
     void nemb_report_at_exit() {
         std::lock_guard<std::mutex> l(c_api_mutex);
         if(!c_api_meter) return;
 
-        auto cps = c_api_meter->get_checkpoint_measurements();
-        if (cps.empty()) return;
+        auto aggs = c_api_meter->get_checkpoint_aggregates();
+        if (c_api_meter->checkpoint_count() == 0 && aggs.empty()) return;
 
-        std::cout << "\n--- CODEGREEN_RESULT_START ---" << std::endl;
-        std::cout << "{\"measurements\": [";
-        for(size_t i=0; i<cps.size(); ++i) {
-            std::cout << "{\"checkpoint_id\": \"" << cps[i].name << "\", \"timestamp\": " << cps[i].timestamp_ns
-               << ", \"joules\": " << cps[i].cumulative_energy_joules << ", \"watts\": " << cps[i].instantaneous_power_watts << "}";
-            if(i < cps.size()-1) std::cout << ", ";
+        const char* result_env = std::getenv("CODEGREEN_RESULT_FILE");
+        if (result_env && *result_env) {
+            std::string result_path = result_path_for_process(result_env);
+            // Write beside the target and rename so readers never see a partial file
+            std::string tmp_path = result_path + "." + std::to_string(getpid()) + ".tmp";
+            {
+                std::ofstream out(tmp_path, std::ios::trunc);
+                if (!out) return;
+                write_report_json(out, *c_api_meter, aggs);
+            }
+            std::rename(tmp_path.c_str(), result_path.c_str());
+            return;
         }
-        std::cout << "]}" << std::endl;
+
+        std::cout << "\n--- CODEGREEN_RESULT_START ---" << std::endl;
+        write_report_json(std::cout, *c_api_meter, aggs);
+        std::cout << std::endl;
         std::cout << "--- CODEGREEN_RESULT_END ---" << std::endl;
     }
 
     void nemb_mark_checkpoint(const char* n) {
+        if (auto* meter = c_api_checkpoint_meter()) meter->mark_checkpoint(n?n:"");
+    }
+
+    void nemb_mark_checkpoint_id(uint32_t id) {
+        if (auto* meter = c_api_checkpoint_meter()) meter->mark_checkpoint_id(id);
+    }
+
+    void nemb_mark_checkpoints_batch(const uint64_t* records, size_t count, uint64_t thread_key) {
+        if (auto* meter = c_api_checkpoint_meter()) meter->mark_checkpoints_batch(records, count, thread_key);
+    }
+
+    void nemb_hold_readings_from(uint64_t timestamp_ns) {
+        if (auto* meter = c_api_checkpoint_meter()) meter->hold_readings_from(timestamp_ns);
+    }
+
+    void nemb_mark_checkpoint_id_for(uint32_t id, uint64_t context_key) {
+        if (auto* meter = c_api_checkpoint_meter()) meter->mark_checkpoint_id_for(id, context_key);
+    }
+
+    void nemb_context_switch(uint64_t context_key, int state) {
         std::lock_guard<std::mutex> l(c_api_mutex);
-        if(!c_api_meter) {
-            c_api_meter = std::make_unique<codegreen::EnergyMeter>();
-            std::atexit(nemb_report_at_exit);
-        }
-        if(c_api_meter) c_api_meter->mark_checkpoint(n?n:"");
+        if(!c_api_meter || state < 0 || state > 2) return;
+        c_api_meter->mark_context_switch(context_key, static_cast<codegreen::EnergyMeter::ContextSwitch>(state));
     }
 
     // JNI Implementation for Java Runtime
@@ -375,18 +1425,138 @@ extern "C" {
     int nemb_get_checkpoints_json(char* b, int m) {
         std::lock_guard<std::mutex> l(c_api_mutex);
         if(!c_api_meter || !b || m <= 0) return 0;
-        auto cps = c_api_meter->get_checkpoint_measurements();
         std::ostringstream ss;
-        ss << "{\"checkpoints\": [";
-        for(size_t i=0; i<cps.size(); ++i) {
-            ss << "{\"checkpoint_id\": \"" << cps[i].name << "\", \"timestamp\": " << cps[i].timestamp_ns 
-               << ", \"joules\": " << cps[i].cumulative_energy_joules << ", \"watts\": " << cps[i].instantaneous_power_watts << "}";
-            if(i < cps.size()-1) ss << ", ";
-        }
-        ss << "]}";
+        write_checkpoints_json(ss, "checkpoints", *c_api_meter);
         std::string s = ss.str();
         if(s.length() >= (size_t)m) return -s.length();
         std::copy(s.begin(), s.end(), b); b[s.length()] = '\0';
         return s.length();
     }
+
+    // Binary checkpoint export: nemb_prepare_checkpoints() correlates once into a
+    // snapshot that the calls below page through until the next prepare.
+    static_assert(sizeof(codegreen::EnergyMeter::CheckpointRecord) == 40,
+                  "CheckpointRecord must match nemb_checkpoint_record");
+
+    size_t nemb_prepare_checkpoints() {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(!c_api_meter) { c_api_records.clear(); c_api_record_domains = {}; return 0; }
+        c_api_records = c_api_meter->get_checkpoint_records(&c_api_record_domains);
+        return c_api_records.size();
+    }
+
+    // Like nemb_prepare_checkpoints, but only for markers already covered by
+    // readings, which are then released together with the older readings
+    size_t nemb_drain_checkpoints(uint64_t until_ns, uint64_t* window_end_ns) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        uint64_t end_ns = 0;
+        if(!c_api_meter) { c_api_records.clear(); c_api_record_domains = {}; }
+        else { c_api_records = c_api_meter->drain_checkpoint_records(until_ns, end_ns, &c_api_record_domains); }
+        if(window_end_ns) *window_end_ns = end_ns;
+        return c_api_records.size();
+    }
+
+    size_t nemb_read_checkpoints(size_t cursor, codegreen::EnergyMeter::CheckpointRecord* out, size_t max_records) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(!out || cursor >= c_api_records.size()) return 0;
+        size_t n = std::min(max_records, c_api_records.size() - cursor);
+        std::copy_n(c_api_records.data() + cursor, n, out);
+        return n;
+    }
+
+    const codegreen::EnergyMeter::CheckpointRecord* nemb_checkpoint_records() {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        return c_api_records.empty() ? nullptr : c_api_records.data();
+    }
+
+    size_t nemb_checkpoint_domain_count() {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        return c_api_record_domains.names.size();
+    }
+
+    const double* nemb_checkpoint_domain(size_t index, char* b, int m) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(index >= c_api_record_domains.names.size()) return nullptr;
+        const std::string& s = c_api_record_domains.names[index];
+        if(b && m > 0) {
+            size_t n = std::min(s.length(), static_cast<size_t>(m - 1));
+            std::copy_n(s.begin(), n, b); b[n] = '\0';
+        }
+        return c_api_record_domains.joules[index].data();
+    }
+
+    void nemb_enable_aggregation(int enabled) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if (ensure_c_api_meter(true)) c_api_meter->enable_aggregation(enabled != 0);
+    }
+
+    void nemb_set_checkpoint_pairing(uint32_t first_id, const uint32_t* specs, size_t count) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(c_api_meter) c_api_meter->set_checkpoint_pairing(first_id, specs, count);
+    }
+
+    static_assert(sizeof(codegreen::EnergyMeter::CheckpointAggregate) == 80,
+                  "CheckpointAggregate must match nemb_checkpoint_aggregate");
+
+    size_t nemb_get_checkpoint_aggregates(codegreen::EnergyMeter::CheckpointAggregate* out, size_t max_records) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(!c_api_meter) return 0;
+        auto aggs = c_api_meter->get_checkpoint_aggregates();
+        if(out) std::copy_n(aggs.begin(), std::min(max_records, aggs.size()), out);
+        return aggs.size();
+    }
+
+    uint32_t nemb_intern_checkpoint(const char* n) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if (!ensure_c_api_meter(true)) return 0;
+        return c_api_meter->intern_checkpoint(n?n:"");
+    }
+
+    void nemb_discard_checkpoint(uint32_t id) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(c_api_meter) c_api_meter->discard_checkpoint(id);
+    }
+
+    // Reading columns of a snapshot that lives between acquire and release
+    struct nemb_reading_columns {
+        const uint64_t* timestamps_ns;
+        const double* energy_joules;
+        const double* power_watts;
+        size_t count;
+        size_t domain_count;
+    };
+    int nemb_acquire_readings(nemb_reading_columns* out) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(!c_api_meter || !out) return 0;
+        c_api_readings = c_api_meter->acquire_readings();
+        *out = {c_api_readings.timestamps_ns, c_api_readings.energy_joules, c_api_readings.power_watts,
+                c_api_readings.count, c_api_readings.domains.size()};
+        return 1;
+    }
+
+    const double* nemb_reading_domain(size_t index, char* b, int m) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(index >= c_api_readings.domains.size()) return nullptr;
+        const std::string& s = c_api_readings.domains[index];
+        if(b && m > 0) {
+            size_t n = std::min(s.length(), static_cast<size_t>(m - 1));
+            std::copy_n(s.begin(), n, b); b[n] = '\0';
+        }
+        return c_api_readings.domain_joules[index];
+    }
+
+    void nemb_release_readings() {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        c_api_readings = {};
+        if(c_api_meter) c_api_meter->release_readings();
+    }
+
+    int nemb_checkpoint_name(uint32_t id, char* b, int m) {
+        std::lock_guard<std::mutex> l(c_api_mutex);
+        if(!c_api_meter || !b || m <= 0) return 0;
+        std::string s = c_api_meter->get_checkpoint_name(id);
+        if(s.length() >= (size_t)m) return -static_cast<int>(s.length() + 1);
+        std::copy(s.begin(), s.end(), b); b[s.length()] = '\0';
+        return s.length();
+    }
 }
\ No newline at end of file
@@ -6,11 +6,19 @@
 #include <iostream>
 #include <iomanip>
 #include <future>
+#include <limits>
 
 namespace codegreen::nemb {
 
 MeasurementCoordinator::MeasurementCoordinator(const CoordinatorConfig& config)
-    : config_(config) {
+    : config_(config), readings_(config.measurement_buffer_size) {
+    if (config_.spill_readings) {
+        spill_ = std::make_unique<ReadingSpillStore>(config_.spill_directory);
+    }
+    if (!config_.record_path.empty()) {
+        recorder_ = std::make_unique<ReadingTraceWriter>();
+        if (!recorder_->open(config_.record_path)) recorder_.reset();
+    }
 }
 
 MeasurementCoordinator::~MeasurementCoordinator() {
@@ -128,6 +136,14 @@ void MeasurementCoordinator::stop_measurements() {
     
     // Wake up any waiting threads
     readings_condition_.notify_all();
+    {
+        std::lock_guard<std::mutex> lock(activity_mutex_);
+        activity_condition_.notify_all();
+    }
+    {
+        std::lock_guard<std::mutex> lock(health_mutex_);
+        health_condition_.notify_all();
+    }
     
     // Wait for threads to finish
     if (measurement_thread_.joinable()) {
@@ -138,6 +154,10 @@ void MeasurementCoordinator::stop_measurements() {
         provider_health_thread_.join();
     }
     
+    if (recorder_) {
+        recorder_->flush();
+    }
+    
     std::cout << "  ✅ Measurements stopped" << std::endl;
 }
 
@@ -228,35 +248,168 @@ bool MeasurementCoordinator::restart_provider(const std::string& provider_name)
     return false;
 }
 
-std::vector<SynchronizedReading> MeasurementCoordinator::get_buffered_readings() const {
-    std::lock_guard<std::mutex> lock(readings_mutex_);
+size_t ReadingView::lower_bound(uint64_t timestamp_ns) const {
+    size_t lo = 0, hi = size();
+    while (lo < hi) {
+        size_t mid = lo + (hi - lo) / 2;
+        if (this->timestamp_ns(mid) < timestamp_ns) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+}
 
-    std::vector<SynchronizedReading> result;
-    if (readings_buffer_.empty()) return result;
+size_t ReadingRange::lower_bound(uint64_t timestamp_ns) const {
+    return std::lower_bound(timestamps_ns.begin(), timestamps_ns.end(), timestamp_ns) - timestamps_ns.begin();
+}
 
-    result.reserve(readings_buffer_.size());
+// Indices [first, last) of the readings in [from_ns, to_ns] and the nearest one on either side
+static std::pair<size_t, size_t> bracketing_readings(const ReadingView& view, uint64_t from_ns, uint64_t to_ns) {
+    size_t first = view.lower_bound(from_ns);
+    if (first > 0) --first;
+    size_t last = first;
+    while (last < view.size() && view.timestamp_ns(last) <= to_ns) ++last;
+    if (last < view.size()) ++last;
+    return {first, last};
+}
 
-    if (!buffer_full_.load(std::memory_order_acquire)) {
-        // Simple case: just copy the readings
-        result.assign(readings_buffer_.begin(), readings_buffer_.end());
-    } else {
-        // Circular buffer: start from buffer_write_index_ and wrap around
-        size_t write_idx = buffer_write_index_.load(std::memory_order_acquire);
-        for (size_t i = 0; i < readings_buffer_.size(); ++i) {
-            result.push_back(readings_buffer_[(write_idx + i) % readings_buffer_.size()]);
+ReadingView MeasurementCoordinator::view_readings(uint64_t from_ns, uint64_t to_ns) const {
+    std::unique_lock<std::mutex> lock(readings_mutex_);
+
+    // Spilled readings are all older than the buffered ones and are only
+    // needed when the range reaches past the oldest buffered reading
+    std::vector<EnergySample> spilled;
+    if (spill_ && !spill_->empty() && (readings_.empty() || readings_.timestamp_ns(0) > from_ns)) {
+        spill_->read_range(from_ns, to_ns, spilled);
+    }
+    return ReadingView(std::move(lock), std::move(spilled), &readings_);
+}
+
+ReadingColumns MeasurementCoordinator::snapshot_readings() const {
+    ReadingColumns snapshot;
+    {
+        std::lock_guard<std::mutex> lock(readings_mutex_);
+        snapshot = readings_;
+    }
+    snapshot.linearize();
+    return snapshot;
+}
+
+std::vector<EnergySample> MeasurementCoordinator::get_energy_samples() const {
+    return get_energy_samples(0, std::numeric_limits<uint64_t>::max());
+}
+
+std::vector<EnergySample> MeasurementCoordinator::get_energy_samples(uint64_t from_ns, uint64_t to_ns) const {
+    auto view = view_readings(from_ns, to_ns);
+    auto [first, last] = bracketing_readings(view, from_ns, to_ns);
+
+    std::vector<EnergySample> samples;
+    samples.reserve(last - first);
+    size_t domains = view.domains().size();
+    for (size_t i = first; i < last; ++i) {
+        EnergySample& sample = samples.emplace_back();
+        sample.timestamp_ns = view.timestamp_ns(i);
+        sample.energy_joules = view.energy_joules(i);
+        sample.power_watts = view.power_watts(i);
+        sample.domain_joules.resize(domains);
+        for (size_t d = 0; d < domains; ++d) sample.domain_joules[d] = view.domain_joules(d, i);
+    }
+    return samples;
+}
+
+ReadingRange MeasurementCoordinator::copy_readings(uint64_t from_ns, uint64_t to_ns) const {
+    ReadingRange range;
+    auto view = view_readings(from_ns, to_ns);
+    auto [first, last] = bracketing_readings(view, from_ns, to_ns);
+
+    size_t count = last - first;
+    range.timestamps_ns.reserve(count);
+    range.energy_joules.reserve(count);
+    range.power_watts.reserve(count);
+    for (size_t i = first; i < last; ++i) {
+        range.timestamps_ns.push_back(view.timestamp_ns(i));
+        range.energy_joules.push_back(view.energy_joules(i));
+        range.power_watts.push_back(view.power_watts(i));
+    }
+    range.domains = view.domains();
+    range.domain_joules.resize(range.domains.size());
+    for (size_t d = 0; d < range.domains.size(); ++d) {
+        auto& column = range.domain_joules[d];
+        column.reserve(count);
+        for (size_t i = first; i < last; ++i) column.push_back(view.domain_joules(d, i));
+    }
+    return range;
+}
+
+bool MeasurementCoordinator::interpolate_energy_at(uint64_t timestamp_ns, double& energy_joules, double& power_watts) const {
+    auto view = view_readings(timestamp_ns, timestamp_ns);
+    size_t count = view.size();
+    if (count == 0) return false;
+
+    // First reading at or after timestamp_ns
+    size_t lo = view.lower_bound(timestamp_ns);
+    if (lo == count || lo == 0) {
+        size_t i = lo == count ? count - 1 : 0;
+        energy_joules = view.energy_joules(i);
+        power_watts = view.power_watts(i);
+        return true;
+    }
+
+    uint64_t t1 = view.timestamp_ns(lo - 1);
+    uint64_t dt = view.timestamp_ns(lo) - t1;
+    double ratio = (dt > 0) ? static_cast<double>(timestamp_ns - t1) / dt : 0.0;
+    energy_joules = view.energy_joules(lo - 1) + ratio * (view.energy_joules(lo) - view.energy_joules(lo - 1));
+    power_watts = view.power_watts(lo - 1) + ratio * (view.power_watts(lo) - view.power_watts(lo - 1));
+    return true;
+}
+
+size_t MeasurementCoordinator::discard_readings_before(uint64_t timestamp_ns) {
+    std::lock_guard<std::mutex> lock(readings_mutex_);
+
+    size_t count = readings_.size();
+    size_t spilled = 0;
+    if (spill_ && !spill_->empty()) {
+        if (count > 0 && readings_.timestamp_ns(0) <= timestamp_ns) {
+            // The buffer already holds the lower bound
+            spilled = spill_->size();
+            spill_->clear();
+        } else {
+            return spill_->discard_before(timestamp_ns);
         }
     }
+    if (count < 2) return spilled;
 
-    return result;
+    // Keep the newest reading at or before timestamp_ns
+    size_t first_after = 0, hi = count;
+    while (first_after < hi) {
+        size_t mid = first_after + (hi - first_after) / 2;
+        if (readings_.timestamp_ns(mid) <= timestamp_ns) first_after = mid + 1; else hi = mid;
+    }
+    size_t released = first_after == 0 ? 0 : first_after - 1;
+    readings_.discard_oldest(released);
+    return spilled + released;
+}
+
+size_t MeasurementCoordinator::discard_spilled_readings_before(uint64_t timestamp_ns) {
+    std::lock_guard<std::mutex> lock(readings_mutex_);
+    if (!spill_ || spill_->empty()) return 0;
+    if (!readings_.empty() && readings_.timestamp_ns(0) <= timestamp_ns) {
+        // The buffer already holds the lower bound
+        size_t spilled = spill_->size();
+        spill_->clear();
+        return spilled;
+    }
+    return spill_->discard_before(timestamp_ns);
+}
+
+size_t MeasurementCoordinator::spilled_reading_count() const {
+    std::lock_guard<std::mutex> lock(readings_mutex_);
+    return spill_ ? spill_->size() : 0;
 }
 
 void MeasurementCoordinator::set_buffer_size(size_t size) {
     std::lock_guard<std::mutex> lock(readings_mutex_);
 
-    readings_buffer_.clear();
-    readings_buffer_.reserve(size);
-    buffer_write_index_.store(0, std::memory_order_release);
-    buffer_full_.store(false, std::memory_order_release);
+    readings_.reset(size);
+    if (spill_) spill_->clear();
     config_.measurement_buffer_size = static_cast<uint32_t>(size);
 }
 
@@ -272,7 +425,21 @@ void MeasurementCoordinator::reset_statistics() {
 
 // Private methods
 
+void MeasurementCoordinator::signal_activity() {
+    // Sequentially consistent against the loop's idle_ store and predicate,
+    // so either the loop sees the activity or this sees the loop idle
+    activity_pending_.store(true);
+    if (idle_.load()) {
+        std::lock_guard<std::mutex> lock(activity_mutex_);
+        activity_condition_.notify_one();
+    }
+}
+
 void MeasurementCoordinator::measurement_loop() {
+    // Starts in a burst: measurements usually begin right before the workload
+    bool adaptive = config_.idle_interval > config_.measurement_interval;
+    auto last_activity = std::chrono::steady_clock::now();
+
     while (running_.load()) {
         auto start_time = std::chrono::steady_clock::now();
         
@@ -302,17 +469,41 @@ void MeasurementCoordinator::measurement_loop() {
         
         // Maintain target interval
         auto elapsed = std::chrono::steady_clock::now() - start_time;
-        auto sleep_time = config_.measurement_interval - elapsed;
-        
-        if (sleep_time > std::chrono::milliseconds::zero()) {
-            std::this_thread::sleep_for(sleep_time);
+        if (!adaptive) {
+            auto sleep_time = config_.measurement_interval - elapsed;
+            if (sleep_time > std::chrono::milliseconds::zero()) {
+                std::this_thread::sleep_for(sleep_time);
+            }
+            continue;
         }
+
+        // Burst while checkpoints keep arriving, otherwise idle until one does
+        if (activity_pending_.exchange(false, std::memory_order_relaxed)) last_activity = start_time;
+        if (start_time - last_activity < config_.burst_hold) {
+            auto sleep_time = config_.measurement_interval - elapsed;
+            if (sleep_time > std::chrono::milliseconds::zero()) {
+                std::this_thread::sleep_for(sleep_time);
+            }
+            continue;
+        }
+        std::unique_lock<std::mutex> lock(activity_mutex_);
+        idle_.store(true);
+        activity_condition_.wait_for(lock, config_.idle_interval - elapsed, [this] {
+            return activity_pending_.load() || !running_.load();
+        });
+        idle_.store(false);
     }
 }
 
 void MeasurementCoordinator::provider_health_loop() {
     while (running_.load()) {
-        std::this_thread::sleep_for(config_.provider_restart_interval);
+        {
+            std::unique_lock<std::mutex> lock(health_mutex_);
+            if (health_condition_.wait_for(lock, config_.provider_restart_interval,
+                                           [this] { return !running_.load(); })) {
+                break;
+            }
+        }
         
         if (config_.auto_restart_failed_providers) {
             check_provider_health();
@@ -460,16 +651,19 @@ void MeasurementCoordinator::apply_real_time_filtering(SynchronizedReading& read
 void MeasurementCoordinator::buffer_reading(const SynchronizedReading& reading) {
     std::lock_guard<std::mutex> lock(readings_mutex_);
 
-    if (readings_buffer_.size() < config_.measurement_buffer_size) {
-        readings_buffer_.push_back(reading);
-    } else {
-        // Circular buffer - overwrite oldest
-        size_t write_idx = buffer_write_index_.load(std::memory_order_relaxed);
-        readings_buffer_[write_idx] = reading;
-        buffer_write_index_.store((write_idx + 1) % config_.measurement_buffer_size, std::memory_order_release);
-        buffer_full_.store(true, std::memory_order_release);
+    // Columns keep totals and per-domain energy; the overwritten oldest
+    // reading moves to the spill store
+    EnergySample evicted;
+    if (readings_.push(reading.common_timestamp_ns, reading.total_system_energy_joules,
+                       reading.total_system_power_watts, reading.provider_readings, evicted) && spill_) {
+        spill_->append(evicted);
+    }
+    if (recorder_) {
+        recorder_->append(reading.common_timestamp_ns, reading.total_system_energy_joules,
+                          reading.total_system_power_watts, reading.provider_readings);
     }
 
+    latest_timestamp_ns_.store(reading.common_timestamp_ns, std::memory_order_release);
     readings_condition_.notify_one();
 }
 
@@ -0,0 +1,362 @@
+#include "../../../include/nemb/core/reading_store.hpp"
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <algorithm>
+#include <cstdlib>
+#include <cstring>
+#include <iostream>
+#include <limits>
+
+namespace codegreen::nemb {
+
+namespace {
+
+uint64_t zigzag(int64_t value) {
+    return (static_cast<uint64_t>(value) << 1) ^ static_cast<uint64_t>(value >> 63);
+}
+
+int64_t unzigzag(uint64_t value) {
+    return static_cast<int64_t>(value >> 1) ^ -static_cast<int64_t>(value & 1);
+}
+
+void put_varint(std::vector<uint8_t>& out, uint64_t value) {
+    while (value >= 0x80) {
+        out.push_back(static_cast<uint8_t>(value) | 0x80);
+        value >>= 7;
+    }
+    out.push_back(static_cast<uint8_t>(value));
+}
+
+// Decode one varint from [in, end); false if it runs past end or 64 bits
+bool get_varint(const uint8_t*& in, const uint8_t* end, uint64_t& value) {
+    value = 0;
+    for (int shift = 0; shift < 64 && in < end; shift += 7) {
+        uint8_t byte = *in++;
+        value |= static_cast<uint64_t>(byte & 0x7f) << shift;
+        if (!(byte & 0x80)) return true;
+    }
+    return false;
+}
+
+uint64_t bits_of(double value) {
+    uint64_t bits;
+    std::memcpy(&bits, &value, sizeof(bits));
+    return bits;
+}
+
+double double_of(uint64_t bits) {
+    double value;
+    std::memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
+// Cumulative energy grows in small steps, so consecutive bit patterns differ
+// by small integers; deltas of the raw bits are exact and compress well
+void encode_delta(std::vector<uint8_t>& out, uint64_t value, uint64_t previous) {
+    put_varint(out, zigzag(static_cast<int64_t>(value - previous)));
+}
+
+} // namespace
+
+void ReadingColumns::reset(size_t capacity) {
+    capacity_ = capacity;
+    head_ = 0;
+    timestamps_.clear();
+    energy_.clear();
+    power_.clear();
+    for (auto& column : domain_energy_) column.clear();
+}
+
+size_t ReadingColumns::domain_index(const std::string& provider_id, const std::string& domain) {
+    auto& provider = domain_ids_[provider_id];
+    auto it = provider.find(domain);
+    if (it != provider.end()) return it->second;
+
+    // New domain: earlier readings have no value for it
+    size_t index = domain_names_.size();
+    provider.emplace(domain, index);
+    domain_names_.push_back(provider_id + "/" + domain);
+    domain_energy_.emplace_back(timestamps_.size(), std::numeric_limits<double>::quiet_NaN());
+    return index;
+}
+
+bool ReadingColumns::push(uint64_t timestamp_ns, double energy_joules, double power_watts,
+                          const std::vector<EnergyReading>& providers, EnergySample& evicted) {
+    size_t row;
+    bool overwrite = capacity_ > 0 && timestamps_.size() >= capacity_;
+    if (overwrite) {
+        row = head_;
+        evicted.timestamp_ns = timestamps_[row];
+        evicted.energy_joules = energy_[row];
+        evicted.power_watts = power_[row];
+        evicted.domain_joules.resize(domain_energy_.size());
+        for (size_t d = 0; d < domain_energy_.size(); ++d) evicted.domain_joules[d] = domain_energy_[d][row];
+        head_ = head_ + 1 == timestamps_.size() ? 0 : head_ + 1;
+        timestamps_[row] = timestamp_ns;
+        energy_[row] = energy_joules;
+        power_[row] = power_watts;
+        for (auto& column : domain_energy_) column[row] = std::numeric_limits<double>::quiet_NaN();
+    } else {
+        row = timestamps_.size();
+        timestamps_.push_back(timestamp_ns);
+        energy_.push_back(energy_joules);
+        power_.push_back(power_watts);
+        for (auto& column : domain_energy_) column.push_back(std::numeric_limits<double>::quiet_NaN());
+    }
+
+    for (const auto& reading : providers) {
+        if (reading.provider_id.empty()) continue;
+        for (const auto& [domain, joules] : reading.domain_energy_joules) {
+            // Providers report a failed domain read as negative energy; it stays NaN
+            size_t column = domain_index(reading.provider_id, domain);
+            if (joules >= 0.0) domain_energy_[column][row] = joules;
+        }
+    }
+    return overwrite;
+}
+
+void ReadingColumns::linearize() {
+    if (head_ == 0) return;
+    std::rotate(timestamps_.begin(), timestamps_.begin() + head_, timestamps_.end());
+    std::rotate(energy_.begin(), energy_.begin() + head_, energy_.end());
+    std::rotate(power_.begin(), power_.begin() + head_, power_.end());
+    for (auto& column : domain_energy_) std::rotate(column.begin(), column.begin() + head_, column.end());
+    head_ = 0;
+}
+
+void ReadingColumns::discard_oldest(size_t n) {
+    n = std::min(n, timestamps_.size());
+    if (n == 0) return;
+    linearize();
+    timestamps_.erase(timestamps_.begin(), timestamps_.begin() + n);
+    energy_.erase(energy_.begin(), energy_.begin() + n);
+    power_.erase(power_.begin(), power_.begin() + n);
+    for (auto& column : domain_energy_) column.erase(column.begin(), column.begin() + n);
+}
+
+ReadingSpillStore::ReadingSpillStore(std::string directory)
+    : directory_(std::move(directory)) {
+    open_.reserve(kChunkSamples);
+}
+
+ReadingSpillStore::~ReadingSpillStore() {
+    if (map_) munmap(map_, map_size_);
+    if (fd_ != -1) close(fd_);
+}
+
+bool ReadingSpillStore::open_file() {
+    if (fd_ != -1) return true;
+    if (failed_) return false;
+
+    std::string directory = directory_;
+    if (directory.empty()) {
+        const char* tmp = std::getenv("TMPDIR");
+        directory = (tmp && *tmp) ? tmp : "/tmp";
+    }
+    std::string path = directory + "/codegreen-readings-XXXXXX";
+    fd_ = mkstemp(path.data());
+    if (fd_ == -1) {
+        std::cerr << "Cannot create reading spill file in " << directory
+                  << "; readings older than the buffer will be lost" << std::endl;
+        failed_ = true;
+        return false;
+    }
+    // Unlinked at once: the file lives exactly as long as the descriptor
+    unlink(path.c_str());
+    return true;
+}
+
+bool ReadingSpillStore::append(const EnergySample& sample) {
+    open_.push_back(sample);
+    ++size_;
+    if (open_.size() < kChunkSamples) return true;
+    return spill_open_chunk();
+}
+
+bool ReadingSpillStore::spill_open_chunk() {
+    // Layout: first sample verbatim, then per sample the zigzag varint deltas of
+    // timestamp, energy bits, power bits and each domain's energy bits against
+    // the previous sample. The domain table only grows, so the chunk has as
+    // many domain columns as its newest samples
+    size_t domains = 0;
+    for (const auto& sample : open_) domains = std::max(domains, sample.domain_joules.size());
+    encode_buffer_.clear();
+    const EnergySample* previous = nullptr;
+    for (const auto& sample : open_) {
+        if (!previous) {
+            put_varint(encode_buffer_, sample.timestamp_ns);
+            put_varint(encode_buffer_, bits_of(sample.energy_joules));
+            put_varint(encode_buffer_, bits_of(sample.power_watts));
+            for (size_t d = 0; d < domains; ++d) put_varint(encode_buffer_, bits_of(sample.domain(d)));
+        } else {
+            encode_delta(encode_buffer_, sample.timestamp_ns, previous->timestamp_ns);
+            encode_delta(encode_buffer_, bits_of(sample.energy_joules), bits_of(previous->energy_joules));
+            encode_delta(encode_buffer_, bits_of(sample.power_watts), bits_of(previous->power_watts));
+            for (size_t d = 0; d < domains; ++d) {
+                encode_delta(encode_buffer_, bits_of(sample.domain(d)), bits_of(previous->domain(d)));
+            }
+        }
+        previous = &sample;
+    }
+
+    Chunk chunk{open_.front().timestamp_ns, open_.back().timestamp_ns, file_size_,
+                static_cast<uint32_t>(encode_buffer_.size()), static_cast<uint32_t>(open_.size()),
+                static_cast<uint32_t>(domains)};
+    bool written = open_file();
+    for (size_t done = 0; written && done < encode_buffer_.size(); ) {
+        ssize_t n = pwrite(fd_, encode_buffer_.data() + done, encode_buffer_.size() - done, chunk.offset + done);
+        if (n <= 0) written = false;
+        else done += static_cast<size_t>(n);
+    }
+    open_.clear();
+    if (!written) {
+        size_ -= chunk.count;
+        return false;
+    }
+    file_size_ += chunk.bytes;
+    chunks_.push_back(chunk);
+    return true;
+}
+
+const uint8_t* ReadingSpillStore::mapped(uint64_t end) const {
+    if (end > map_size_) {
+        if (map_) munmap(map_, map_size_);
+        map_ = mmap(nullptr, file_size_, PROT_READ, MAP_SHARED, fd_, 0);
+        if (map_ == MAP_FAILED) {
+            map_ = nullptr;
+            map_size_ = 0;
+            return nullptr;
+        }
+        map_size_ = file_size_;
+    }
+    return static_cast<const uint8_t*>(map_);
+}
+
+void ReadingSpillStore::decode_chunk(const Chunk& chunk, std::vector<EnergySample>& out) const {
+    const uint8_t* base = mapped(chunk.offset + chunk.bytes);
+    if (!base) return;
+    const uint8_t* in = base + chunk.offset;
+    const uint8_t* end = in + chunk.bytes;
+
+    // A chunk that ends early (a damaged file) yields the samples decoded so far
+    EnergySample sample;
+    uint64_t energy_bits, power_bits;
+    std::vector<uint64_t> domain_bits(chunk.domains);
+    if (!get_varint(in, end, sample.timestamp_ns) || !get_varint(in, end, energy_bits) ||
+        !get_varint(in, end, power_bits)) {
+        return;
+    }
+    for (auto& bits : domain_bits) {
+        if (!get_varint(in, end, bits)) return;
+    }
+    sample.domain_joules.resize(chunk.domains);
+    auto set_values = [&] {
+        sample.energy_joules = double_of(energy_bits);
+        sample.power_watts = double_of(power_bits);
+        for (size_t d = 0; d < domain_bits.size(); ++d) sample.domain_joules[d] = double_of(domain_bits[d]);
+    };
+    set_values();
+    out.push_back(sample);
+    for (uint32_t i = 1; i < chunk.count; ++i) {
+        uint64_t timestamp_delta, energy_delta, power_delta;
+        if (!get_varint(in, end, timestamp_delta) || !get_varint(in, end, energy_delta) ||
+            !get_varint(in, end, power_delta)) {
+            return;
+        }
+        sample.timestamp_ns += unzigzag(timestamp_delta);
+        energy_bits += unzigzag(energy_delta);
+        power_bits += unzigzag(power_delta);
+        for (auto& bits : domain_bits) {
+            uint64_t delta;
+            if (!get_varint(in, end, delta)) return;
+            bits += unzigzag(delta);
+        }
+        set_values();
+        out.push_back(sample);
+    }
+}
+
+void ReadingSpillStore::read_range(uint64_t from_ns, uint64_t to_ns, std::vector<EnergySample>& out) const {
+    // First chunk ending at or after from_ns; the one before it holds the
+    // lower bound unless this chunk starts at or before from_ns
+    auto first = std::lower_bound(chunks_.begin(), chunks_.end(), from_ns,
+        [](const Chunk& c, uint64_t ts) { return c.last_ns < ts; });
+    if (first != chunks_.begin() && (first == chunks_.end() || first->first_ns > from_ns)) --first;
+    for (auto it = first; it != chunks_.end(); ++it) {
+        decode_chunk(*it, out);
+        // Stop once a decoded sample lies past the range: it is the upper bound
+        if (it->last_ns > to_ns) return;
+    }
+    out.insert(out.end(), open_.begin(), open_.end());
+}
+
+size_t ReadingSpillStore::discard_before(uint64_t timestamp_ns) {
+    // A chunk is redundant once the next chunk (or the open samples) also
+    // starts at or before timestamp_ns and so holds a newer lower bound
+    size_t dropped = 0;
+    size_t released = 0;
+    while (dropped < chunks_.size()) {
+        uint64_t next_first = dropped + 1 < chunks_.size() ? chunks_[dropped + 1].first_ns
+                            : open_.empty() ? UINT64_MAX : open_.front().timestamp_ns;
+        if (next_first > timestamp_ns) break;
+        release(chunks_[dropped]);
+        released += chunks_[dropped].count;
+        ++dropped;
+    }
+    chunks_.erase(chunks_.begin(), chunks_.begin() + dropped);
+    size_ -= released;
+    return released;
+}
+
+void ReadingSpillStore::clear() {
+    for (const auto& chunk : chunks_) release(chunk);
+    chunks_.clear();
+    open_.clear();
+    size_ = 0;
+}
+
+void ReadingSpillStore::release(const Chunk& chunk) {
+    // Long runs would otherwise keep every drained chunk on disk
+#ifdef FALLOC_FL_PUNCH_HOLE
+    fallocate(fd_, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, chunk.offset, chunk.bytes);
+#else
+    (void)chunk;
+#endif
+}
+
+uint64_t ReadingSpillStore::oldest_timestamp_ns() const {
+    if (!chunks_.empty()) return chunks_.front().first_ns;
+    return open_.empty() ? 0 : open_.front().timestamp_ns;
+}
+
+bool ReadingTraceWriter::open(const std::string& path) {
+    out_.open(path, std::ios::trunc);
+    if (!out_) {
+        std::cerr << "Cannot open reading trace " << path << "; readings are not recorded" << std::endl;
+        return false;
+    }
+    out_.precision(std::numeric_limits<double>::max_digits10);
+    out_ << kHeader << '\n';
+    return true;
+}
+
+void ReadingTraceWriter::append(uint64_t timestamp_ns, double energy_joules, double power_watts,
+                                const std::vector<EnergyReading>& providers) {
+    out_ << timestamp_ns << ' ' << energy_joules << ' ' << power_watts;
+    for (const auto& reading : providers) {
+        if (reading.provider_id.empty()) continue;
+        for (const auto& [domain, joules] : reading.domain_energy_joules) {
+            // Failed domain reads (negative) are left out, as in the columns
+            if (joules >= 0.0) out_ << ' ' << reading.provider_id << '/' << domain << '=' << joules;
+        }
+    }
+    out_ << '\n';
+}
+
+void ReadingTraceWriter::flush() {
+    out_.flush();
+}
+
+} // namespace codegreen::nemb
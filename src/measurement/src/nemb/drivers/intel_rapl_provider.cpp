@@ -9,6 +9,7 @@
 #include <chrono>
 #include <limits>
 #include <ctime>
+#include <cstdlib>
 
 namespace codegreen::nemb::drivers {
 
@@ -22,6 +23,8 @@ namespace {
 }
 
 IntelRAPLProvider::IntelRAPLProvider() {
+    const char* root = std::getenv("CODEGREEN_RAPL_ROOT");
+    powercap_root_ = (root && *root) ? root : "/sys/class/powercap";
 }
 
 IntelRAPLProvider::~IntelRAPLProvider() {
@@ -101,32 +104,27 @@ EnergyReading IntelRAPLProvider::get_reading() {
     double total_energy = 0.0;
     double total_power = 0.0;
     bool any_successful = false;
-    std::map<std::string, uint64_t> raw_values;
     
-    // Read energy from ALL available RAPL domains
-    for (const std::string& domain : available_domains_) {
-        try {
-            auto& reader = domain_file_readers_[domain];
-            uint64_t raw_energy_uj;
-            
-            // Use 10ms timeout for readings to prevent stalls
-            if (reader && reader->read_uint64_with_timeout(raw_energy_uj, std::chrono::milliseconds(10))) {
-                raw_values[domain] = raw_energy_uj;
-                any_successful = true;
-            } else {
-                 // Try to re-open if reading failed
-                 if (reader) reader->open_file();
-                 reading.domain_energy_joules[domain] = -1.0;
-            }
-        } catch (const std::exception& e) {
-            // Log error but continue with other domains
+    // Read energy from ALL available RAPL domains in one pass over open descriptors
+    for (size_t i = 0; i < available_domains_.size(); ++i) {
+        const std::string& domain = available_domains_[i];
+        utils::NonBlockingFileReader* reader = sample_readers_[i];
+        uint64_t raw_energy_uj;
+        
+        if (reader && reader->pread_uint64(raw_energy_uj)) {
+            raw_values_[domain] = raw_energy_uj;
+            any_successful = true;
+        } else {
+            // Try to re-open if reading failed
+            if (reader) reader->open_file();
+            raw_values_.erase(domain);
             reading.domain_energy_joules[domain] = -1.0;
         }
     }
     
     if (any_successful) {
         // Atomic update of all counters
-        auto accumulated_values = counter_manager_->update_counters(raw_values, reading.timestamp_ns);
+        auto accumulated_values = counter_manager_->update_counters(raw_values_, reading.timestamp_ns);
         
         // Calculate time delta for power calculation
         double dt = std::chrono::duration<double>(now - last_reading_time_).count();
@@ -235,6 +233,8 @@ void IntelRAPLProvider::shutdown() {
         }
     }
     domain_file_readers_.clear();
+    sample_readers_.clear();
+    raw_values_.clear();
     
     initialized_ = false;
 }
@@ -242,10 +242,11 @@ void IntelRAPLProvider::shutdown() {
 std::map<std::string, RAPLDomain> IntelRAPLProvider::get_available_domains() const {
     std::map<std::string, RAPLDomain> domains;
     
-    if (std::filesystem::exists("/sys/class/powercap/intel-rapl:0/energy_uj")) {
+    const std::string package_path = powercap_root_ + "/intel-rapl:0/energy_uj";
+    if (std::filesystem::exists(package_path)) {
         RAPLDomain package_domain;
         package_domain.name = "package";
-        package_domain.sysfs_path = "/sys/class/powercap/intel-rapl:0/energy_uj";
+        package_domain.sysfs_path = package_path;
         package_domain.available = true;
         domains["package"] = package_domain;
     }
@@ -262,14 +263,15 @@ bool IntelRAPLProvider::detect_rapl_domains() {
     
     // Check for different RAPL domains via sysfs interface
     const std::vector<std::pair<std::string, std::string>> domain_candidates = {
-        {"package", "/sys/class/powercap/intel-rapl:0/energy_uj"},
-        {"pp0", "/sys/class/powercap/intel-rapl:0:0/energy_uj"},      // CPU cores
-        {"pp1", "/sys/class/powercap/intel-rapl:0:1/energy_uj"},      // GPU (if integrated)
-        {"dram", "/sys/class/powercap/intel-rapl:0:2/energy_uj"},     // Memory
-        {"psys", "/sys/class/powercap/intel-rapl:1/energy_uj"}       // Platform/System
+        {"package", "intel-rapl:0"},
+        {"pp0", "intel-rapl:0:0"},      // CPU cores
+        {"pp1", "intel-rapl:0:1"},      // GPU (if integrated)
+        {"dram", "intel-rapl:0:2"},     // Memory
+        {"psys", "intel-rapl:1"}        // Platform/System
     };
     
-    for (const auto& [domain_name, path] : domain_candidates) {
+    for (const auto& [domain_name, zone] : domain_candidates) {
+        const std::string path = powercap_root_ + "/" + zone + "/energy_uj";
         if (std::filesystem::exists(path)) {
             available_domains_.push_back(domain_name);
             domain_paths_[domain_name] = path;
@@ -302,7 +304,7 @@ bool IntelRAPLProvider::query_energy_units() {
     // For now, use a reasonable default and try to infer from readings
     
     // Check if we can read the name file to get more info
-    std::string name_path = "/sys/class/powercap/intel-rapl:0/name";
+    std::string name_path = powercap_root_ + "/intel-rapl:0/name";
     if (std::filesystem::exists(name_path)) {
         std::ifstream name_file(name_path);
         std::string rapl_name;
@@ -350,6 +352,8 @@ bool IntelRAPLProvider::initialize_file_readers() {
     
     // Clear any existing readers
     domain_file_readers_.clear();
+    sample_readers_.clear();
+    raw_values_.clear();
     
     for (const std::string& domain : available_domains_) {
         const std::string& path = domain_paths_[domain];
@@ -361,6 +365,7 @@ bool IntelRAPLProvider::initialize_file_readers() {
             return false;
         }
         
+        sample_readers_.push_back(reader.get());
         domain_file_readers_[domain] = std::move(reader);
         std::cout << "✓ File reader initialized for domain: " << domain << std::endl;
     }
@@ -402,9 +407,7 @@ bool IntelRAPLProvider::take_initial_readings() {
 
 bool IntelRAPLProvider::query_energy_unit_from_hardware() {
     // Try to read energy unit from sysfs first (more reliable than MSR)
-    const std::string energy_unit_path = "/sys/class/powercap/intel-rapl/intel-rapl:0/energy_uj";
-    
-    if (std::filesystem::exists(energy_unit_path)) {
+    if (access_method_ == AccessMethod::SYSFS_POWERCAP) {
         // For sysfs interface, energy values are already in microjoules
         // The unit is implicitly 1 microjoule = 1e-6 joules
         energy_unit_joules_ = 1e-6; // 1 microjoule
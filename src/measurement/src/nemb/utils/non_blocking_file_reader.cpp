@@ -9,6 +9,29 @@
 
 namespace codegreen::nemb::utils {
 
+namespace {
+
+// Decimal value followed only by whitespace, parsed in place
+bool parse_uint64(const char* begin, const char* end, uint64_t& value) {
+    const char* p = begin;
+    uint64_t result = 0;
+    for (; p != end && *p >= '0' && *p <= '9'; ++p) {
+        result = result * 10 + static_cast<uint64_t>(*p - '0');
+    }
+    if (p == begin) {
+        return false;
+    }
+    for (; p != end; ++p) {
+        if (*p != ' ' && *p != '\t' && *p != '\n' && *p != '\r') {
+            return false;
+        }
+    }
+    value = result;
+    return true;
+}
+
+} // namespace
+
 NonBlockingFileReader::NonBlockingFileReader(const std::string& path) 
     : file_path_(path) {
 }
@@ -89,28 +112,23 @@ bool NonBlockingFileReader::read_uint64_with_timeout(uint64_t& value, std::chron
         return false;
     }
     
-    buffer[bytes_read] = '\0';
-    
-    // Parse the value - handle both newline and no-newline cases
-    char* endptr;
-    value = strtoull(buffer, &endptr, 10);
-    
-    if (endptr == buffer) {
-        // No digits found
+    // Accept values ending with newline, whitespace, or end of data
+    return parse_uint64(buffer, buffer + bytes_read, value);
+}
+
+bool NonBlockingFileReader::pread_uint64(uint64_t& value) const {
+    if (fd_ == -1) {
         return false;
     }
     
-    // Accept values ending with newline, whitespace, or end of string
-    while (*endptr == ' ' || *endptr == '\t' || *endptr == '\n' || *endptr == '\r') {
-        endptr++;
-    }
-    
-    if (*endptr != '\0') {
-        // Extra characters after number
+    // sysfs regenerates the attribute on every read at offset 0
+    char buffer[32];
+    ssize_t bytes_read = pread(fd_, buffer, sizeof(buffer), 0);
+    if (bytes_read <= 0) {
         return false;
     }
     
-    return true;
+    return parse_uint64(buffer, buffer + bytes_read, value);
 }
 
 } // namespace codegreen::nemb::utils
\ No newline at end of file
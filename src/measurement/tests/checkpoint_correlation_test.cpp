@@ -0,0 +1,305 @@
+/**
+ * Checkpoint recording and correlation through the public EnergyMeter API,
+ * against the replay provider so energy is a known function of time.
+ */
+#include "test_support.hpp"
+
+#include "nemb/codegreen_energy.hpp"
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <ctime>
+#include <memory>
+#include <thread>
+
+using codegreen::EnergyMeter;
+
+namespace {
+
+// Per-thread marker ring capacity in codegreen_energy.cpp
+constexpr int kRingCapacity = 8192;
+
+std::unique_ptr<EnergyMeter> replay_meter(const codegreen::NEMBConfig& config = codegreen::NEMBConfig{}) {
+    setenv("CODEGREEN_REPLAY", "constant:10", 1);
+    return std::make_unique<EnergyMeter>(config);
+}
+
+uint64_t monotonic_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return static_cast<uint64_t>(ts.tv_sec) * 1000000000ULL + ts.tv_nsec;
+}
+
+void settle() {
+    // Past the last marker, so a reading follows each of them
+    std::this_thread::sleep_for(std::chrono::milliseconds(30));
+}
+
+} // namespace
+
+NEMB_TEST(discarded_checkpoint_never_reaches_records) {
+    auto meter = replay_meter();
+    uint32_t calibration = meter->intern_checkpoint("codegreen:calibration");
+    uint32_t work = meter->intern_checkpoint("enter:work:1");
+    meter->discard_checkpoint(calibration);
+
+    // More than a ring's worth, so some are drained while the ring fills
+    for (int i = 0; i < 20000; ++i) meter->mark_checkpoint_id(calibration);
+    meter->mark_checkpoint_id(work);
+    uint64_t now = monotonic_ns();
+    uint64_t batch[] = {now, calibration, now, work};
+    meter->mark_checkpoints_batch(batch, 2, 7);
+    meter->mark_checkpoint_id_for(calibration, 8);
+    settle();
+
+    CHECK(meter->checkpoint_count() == 2);
+    auto records = meter->get_checkpoint_records();
+    CHECK(records.size() == 2);
+    CHECK(std::all_of(records.begin(), records.end(), [&](const EnergyMeter::CheckpointRecord& record) {
+        return record.checkpoint_id == work;
+    }));
+}
+
+NEMB_TEST(discarded_checkpoint_is_not_aggregated) {
+    auto meter = replay_meter();
+    meter->enable_aggregation(true);
+    uint32_t enter = meter->intern_checkpoint("enter:calibrated:1");
+    uint32_t exit = meter->intern_checkpoint("exit:calibrated:1");
+    meter->discard_checkpoint(enter);
+    meter->discard_checkpoint(exit);
+
+    meter->mark_checkpoint_id(enter);
+    meter->mark_checkpoint_id(exit);
+    settle();
+
+    CHECK(meter->get_checkpoint_aggregates().empty());
+}
+
+NEMB_TEST(acquired_readings_leave_sampling_and_correlation_running) {
+    auto meter = replay_meter();
+    settle();
+    auto columns = meter->acquire_readings();
+    size_t acquired = columns.count;
+    CHECK(acquired > 0);
+    CHECK(std::is_sorted(columns.timestamps_ns, columns.timestamps_ns + columns.count));
+
+    // Correlating while the snapshot is held used to deadlock on the reading lock
+    meter->mark_checkpoint("enter:work:1");
+    std::this_thread::sleep_for(std::chrono::milliseconds(120));
+    CHECK(meter->get_checkpoint_records().size() == 1);
+
+    // The snapshot is unchanged by later readings and can be freed from any thread
+    CHECK(columns.count == acquired);
+    std::thread([&] { meter->release_readings(); }).join();
+    CHECK(meter->acquire_readings().count > acquired);
+    meter->release_readings();
+}
+
+NEMB_TEST(sampling_continues_while_a_checkpoint_sink_runs) {
+    auto meter = replay_meter();
+    meter->mark_checkpoint("enter:work:1");
+    settle();
+
+    // The sink used to run under the reading lock, stalling the measurement thread
+    uint64_t sink_start_ns = 0, sink_end_ns = 0;
+    meter->for_each_checkpoint_measurement([&](const EnergyMeter::CorrelatedCheckpoint&) {
+        sink_start_ns = monotonic_ns();
+        std::this_thread::sleep_for(std::chrono::milliseconds(60));
+        sink_end_ns = monotonic_ns();
+    });
+    CHECK(sink_start_ns > 0);
+
+    auto columns = meter->acquire_readings();
+    size_t during_sink = std::count_if(columns.timestamps_ns, columns.timestamps_ns + columns.count,
+        [&](uint64_t ts) { return ts > sink_start_ns && ts < sink_end_ns; });
+    meter->release_readings();
+    CHECK(during_sink > 10);
+}
+
+NEMB_TEST(markers_past_the_ring_capacity_are_all_recorded) {
+    auto meter = replay_meter();
+    uint32_t work = meter->intern_checkpoint("loop:work:1");
+
+    // A full ring is drained by the marking thread, several times over
+    const int count = 3 * kRingCapacity + 5;
+    for (int i = 0; i < count; ++i) meter->mark_checkpoint_id(work);
+    settle();
+
+    CHECK(meter->checkpoint_count() == static_cast<size_t>(count));
+    auto records = meter->get_checkpoint_records();
+    CHECK(records.size() == static_cast<size_t>(count));
+    // In marking order, nothing dropped or repeated at the wrap-around
+    uint32_t expected = 0;
+    CHECK(std::all_of(records.begin(), records.end(), [&](const EnergyMeter::CheckpointRecord& record) {
+        return record.checkpoint_id == work && record.invocation == ++expected;
+    }));
+}
+
+NEMB_TEST(markers_of_an_exited_thread_are_drained) {
+    auto meter = replay_meter();
+    uint32_t main_work = meter->intern_checkpoint("enter:main:1");
+    uint32_t worker_work = meter->intern_checkpoint("enter:worker:1");
+    meter->mark_checkpoint_id(main_work);
+
+    // One full ring drained by the worker itself, the rest left behind when it exits
+    const int count = kRingCapacity + 100;
+    std::thread([&] {
+        for (int i = 0; i < count; ++i) meter->mark_checkpoint_id(worker_work);
+    }).join();
+    settle();
+
+    CHECK(meter->checkpoint_count() == static_cast<size_t>(count) + 1);
+    auto records = meter->get_checkpoint_records();
+    CHECK(records.size() == static_cast<size_t>(count) + 1);
+    auto main_record = std::find_if(records.begin(), records.end(), [&](const EnergyMeter::CheckpointRecord& record) {
+        return record.checkpoint_id == main_work;
+    });
+    CHECK(main_record != records.end());
+    if (main_record == records.end()) return;
+    uint64_t main_thread = main_record->thread_id;
+    uint64_t worker_thread = 0;
+    for (const auto& record : records) {
+        if (record.checkpoint_id == worker_work) worker_thread = record.thread_id;
+    }
+    CHECK(worker_thread != main_thread);
+    CHECK(std::count_if(records.begin(), records.end(), [&](const EnergyMeter::CheckpointRecord& record) {
+        return record.checkpoint_id == worker_work && record.thread_id == worker_thread;
+    }) == count);
+
+    // The drained ring is gone, the records stay
+    CHECK(meter->get_checkpoint_records().size() == records.size());
+}
+
+NEMB_TEST(markers_outside_the_readings_take_the_nearest_reading) {
+    auto meter = replay_meter();
+    uint32_t work = meter->intern_checkpoint("enter:work:1");
+    settle();
+    auto before = meter->acquire_readings();
+    uint64_t first_ns = before.timestamps_ns[0];
+    double first_joules = before.energy_joules[0];
+    double first_watts = before.power_watts[0];
+    double last_joules = before.energy_joules[before.count - 1];
+    meter->release_readings();
+
+    // Before the first reading and long after the last one
+    uint64_t batch[] = {first_ns - 1000000, work, monotonic_ns() + 60000000000ULL, work};
+    meter->mark_checkpoints_batch(batch, 2, 7);
+    auto records = meter->get_checkpoint_records();
+    auto after = meter->acquire_readings();
+    CHECK(records.size() == 2);
+    if (records.size() == 2) {
+        CHECK(records[0].cumulative_energy_joules == first_joules);
+        CHECK(records[0].instantaneous_power_watts == first_watts);
+        // A reading's own value, not one extrapolated past it
+        CHECK(records[1].cumulative_energy_joules >= last_joules);
+        CHECK(std::find(after.energy_joules, after.energy_joules + after.count,
+                        records[1].cumulative_energy_joules) != after.energy_joules + after.count);
+    }
+    meter->release_readings();
+}
+
+NEMB_TEST(markers_between_readings_are_interpolated) {
+    auto meter = replay_meter();
+    uint32_t work = meter->intern_checkpoint("enter:work:1");
+    settle();
+    auto columns = meter->acquire_readings();
+    CHECK(columns.count >= 3);
+    if (columns.count < 3) return meter->release_readings();
+    size_t i = columns.count / 2;
+    uint64_t t1 = columns.timestamps_ns[i], t2 = columns.timestamps_ns[i + 1];
+    double e1 = columns.energy_joules[i], e2 = columns.energy_joules[i + 1];
+    meter->release_readings();
+
+    // On a reading, and a quarter of the way to the next one
+    uint64_t quarter = t1 + (t2 - t1) / 4;
+    uint64_t batch[] = {t1, work, quarter, work};
+    meter->mark_checkpoints_batch(batch, 2, 7);
+    auto records = meter->get_checkpoint_records();
+    CHECK(records.size() == 2);
+    if (records.size() != 2) return;
+    CHECK(records[0].cumulative_energy_joules == e1);
+    double ratio = static_cast<double>(quarter - t1) / static_cast<double>(t2 - t1);
+    CHECK_NEAR(records[1].cumulative_energy_joules, e1 + ratio * (e2 - e1), 1e-12);
+}
+
+NEMB_TEST(markers_bracketed_by_spilled_readings_are_interpolated) {
+    // A small buffer: the readings around the early markers are on disk by
+    // the time they are correlated
+    codegreen::NEMBConfig config;
+    config.reading_buffer_size = 64;
+    auto meter = replay_meter(config);
+    uint32_t work = meter->intern_checkpoint("loop:work:1");
+    for (int i = 0; i < 300; ++i) {
+        meter->mark_checkpoint_id(work);
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+    settle();
+
+    codegreen::EnergyMeter::CheckpointDomains domains;
+    auto records = meter->get_checkpoint_records(&domains);
+    CHECK(records.size() == 300);
+    CHECK(!domains.names.empty());
+    if (records.size() != 300 || domains.names.empty()) return;
+    // Spilled readings keep their domains: the replay package domain is the total
+    size_t missing_domains = 0;
+    for (size_t i = 0; i < records.size(); ++i) {
+        missing_domains += !(std::fabs(domains.joules[0][i] - records[i].cumulative_energy_joules) < 1e-9);
+    }
+    CHECK(missing_domains == 0);
+
+    // Energy follows the constant 10 W across the spilled and buffered readings;
+    // the slack covers the replay provider reading its clock apart from the
+    // reading's timestamp, far below the 2.5 J a marker clamped to the oldest
+    // buffered reading would be off by
+    const auto& first = records.front();
+    size_t mismatches = 0;
+    for (const auto& record : records) {
+        double expected = 10.0 * static_cast<double>(record.timestamp_ns - first.timestamp_ns) / 1e9;
+        mismatches += std::fabs(record.cumulative_energy_joules - first.cumulative_energy_joules - expected) > 2e-3;
+    }
+    CHECK(mismatches == 0);
+}
+
+NEMB_TEST(aggregation_releases_spilled_readings_no_open_span_needs) {
+    codegreen::NEMBConfig config;
+    config.reading_buffer_size = 64;
+    auto meter = replay_meter(config);
+    meter->enable_aggregation(true);
+    uint32_t outer_enter = meter->intern_checkpoint("enter:outer:1");
+    uint32_t outer_exit = meter->intern_checkpoint("exit:outer:1");
+    uint32_t inner_enter = meter->intern_checkpoint("enter:inner:1");
+    uint32_t inner_exit = meter->intern_checkpoint("exit:inner:1");
+
+    // Short spans inside one long one until the spill shrinks
+    meter->mark_checkpoint_id(outer_enter);
+    auto spilled = [&] { return std::stoul(meter->get_diagnostics()["spilled_readings"]); };
+    size_t most_spilled = 0;
+    bool released = false;
+    auto start = std::chrono::steady_clock::now();
+    while (!released && std::chrono::steady_clock::now() - start < std::chrono::seconds(20)) {
+        meter->mark_checkpoint_id(inner_enter);
+        meter->mark_checkpoint_id(inner_exit);
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+        size_t now_spilled = spilled();
+        released = now_spilled < most_spilled;
+        most_spilled = std::max(most_spilled, now_spilled);
+    }
+    // The oldest readings went although the outer span is still open
+    CHECK(released);
+    meter->mark_checkpoint_id(outer_exit);
+    settle();
+
+    // Its enter energy was pinned before the readings around it were released
+    auto aggregates = meter->get_checkpoint_aggregates();
+    auto outer = std::find_if(aggregates.begin(), aggregates.end(), [&](const EnergyMeter::CheckpointAggregate& aggregate) {
+        return aggregate.checkpoint_id == outer_enter;
+    });
+    CHECK(outer != aggregates.end());
+    if (outer == aggregates.end()) return;
+    CHECK(outer->count == 1);
+    CHECK_NEAR(outer->energy_sum_joules, 10.0 * outer->duration_sum_ns / 1e9, 5e-3);
+}
+
+NEMB_TEST_MAIN()
@@ -0,0 +1,119 @@
+/**
+ * MeasurementCoordinator adaptive sampling, driven by the replay provider:
+ * the idle rate between bursts, the immediate wake on checkpoint activity,
+ * and the meter's parsing of the interval environment variables.
+ */
+#include "test_support.hpp"
+
+#include "nemb/codegreen_energy.hpp"
+#include "nemb/core/energy_provider.hpp"
+#include "nemb/core/measurement_coordinator.hpp"
+
+#include <chrono>
+#include <cstdlib>
+#include <memory>
+#include <thread>
+
+using namespace codegreen::nemb;
+using std::chrono::milliseconds;
+
+namespace {
+
+std::unique_ptr<MeasurementCoordinator> replay_coordinator(milliseconds idle_interval) {
+    setenv("CODEGREEN_REPLAY", "constant:10", 1);
+    CoordinatorConfig config;
+    config.measurement_interval = milliseconds(2);
+    config.idle_interval = idle_interval;
+    config.burst_hold = milliseconds(30);
+    config.spill_readings = false;
+    config.measurement_buffer_size = 100000;
+
+    auto coordinator = std::make_unique<MeasurementCoordinator>(config);
+    auto replay = EnergyProvider::create("replay");
+    CHECK(replay && replay->initialize());
+    if (replay) coordinator->add_provider(std::move(replay));
+    CHECK(coordinator->start_measurements());
+    return coordinator;
+}
+
+size_t reading_count(const MeasurementCoordinator& coordinator) {
+    return coordinator.get_energy_samples().size();
+}
+
+// Readings an EnergyMeter with the given environment takes in 300 ms, after settling
+size_t meter_readings_in_300ms(const char* idle_interval, const char* burst_hold) {
+    setenv("CODEGREEN_REPLAY", "constant:10", 1);
+    if (idle_interval) setenv("CODEGREEN_IDLE_INTERVAL_MS", idle_interval, 1);
+    if (burst_hold) setenv("CODEGREEN_BURST_HOLD_MS", burst_hold, 1);
+    codegreen::EnergyMeter meter;
+    unsetenv("CODEGREEN_IDLE_INTERVAL_MS");
+    unsetenv("CODEGREEN_BURST_HOLD_MS");
+
+    std::this_thread::sleep_for(milliseconds(300));
+    size_t start = meter.acquire_readings().count;
+    meter.release_readings();
+    std::this_thread::sleep_for(milliseconds(300));
+    size_t end = meter.acquire_readings().count;
+    meter.release_readings();
+    return end - start;
+}
+
+} // namespace
+
+NEMB_TEST(samples_at_the_idle_rate_between_bursts_and_wakes_on_activity) {
+    // An idle interval far longer than the test: no idle tick falls inside it
+    auto coordinator = replay_coordinator(milliseconds(10000));
+
+    // The startup burst ends after burst_hold and the loop goes idle
+    std::this_thread::sleep_for(milliseconds(200));
+    size_t idle_start = reading_count(*coordinator);
+    CHECK(idle_start > 0);
+    std::this_thread::sleep_for(milliseconds(200));
+    CHECK(reading_count(*coordinator) == idle_start);
+
+    // Activity wakes the loop at once rather than at the next idle tick
+    uint64_t before = coordinator->latest_reading_timestamp_ns();
+    auto notified = std::chrono::steady_clock::now();
+    coordinator->notify_activity();
+    while (coordinator->latest_reading_timestamp_ns() == before &&
+           std::chrono::steady_clock::now() - notified < milliseconds(1000)) {
+        std::this_thread::sleep_for(milliseconds(1));
+    }
+    CHECK(std::chrono::steady_clock::now() - notified < milliseconds(100));
+
+    // One burst at the fast rate, then idle again
+    std::this_thread::sleep_for(milliseconds(200));
+    size_t burst_end = reading_count(*coordinator);
+    CHECK(burst_end > idle_start + 2);
+    std::this_thread::sleep_for(milliseconds(200));
+    CHECK(reading_count(*coordinator) == burst_end);
+
+    // Stopping does not wait out the idle interval either
+    auto stopping = std::chrono::steady_clock::now();
+    coordinator->stop_measurements();
+    CHECK(std::chrono::steady_clock::now() - stopping < milliseconds(1000));
+}
+
+NEMB_TEST(without_an_idle_interval_sampling_never_pauses) {
+    auto coordinator = replay_coordinator(milliseconds(0));
+    std::this_thread::sleep_for(milliseconds(200));
+    size_t start = reading_count(*coordinator);
+    std::this_thread::sleep_for(milliseconds(200));
+    // 2 ms interval: about 100 readings, far more than an idle loop takes
+    CHECK(reading_count(*coordinator) > start + 20);
+}
+
+NEMB_TEST(idle_sampling_is_opt_in) {
+    // Unset: every 1 ms throughout, about 300 readings
+    CHECK(meter_readings_in_300ms(nullptr, nullptr) > 100);
+    // 50 ms while idle: about 6 readings
+    CHECK(meter_readings_in_300ms("50", nullptr) <= 20);
+}
+
+NEMB_TEST(malformed_interval_variables_keep_the_defaults) {
+    // strtol would read "20ms" as 20 and "fast" as 0; both keep the default
+    CHECK(meter_readings_in_300ms("fast", nullptr) > 100);
+    CHECK(meter_readings_in_300ms("50", "20ms") <= 20);
+}
+
+NEMB_TEST_MAIN()
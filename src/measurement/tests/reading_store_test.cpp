@@ -0,0 +1,149 @@
+/**
+ * ReadingSpillStore: compression round trip (per-domain energy included),
+ * range bracketing, discarding and the behaviour when the spill file cannot
+ * be written.
+ */
+#include "test_support.hpp"
+
+#include "nemb/core/reading_store.hpp"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <vector>
+
+using codegreen::nemb::EnergySample;
+using codegreen::nemb::ReadingSpillStore;
+
+namespace {
+
+constexpr size_t kChunk = ReadingSpillStore::kChunkSamples;
+constexpr uint64_t kStepNs = 1000;
+
+// Irregular energy and power so deltas are not all alike. A package domain
+// misses every fifth reading, and a dram domain joins the table mid-chunk
+EnergySample sample_at(size_t i) {
+    EnergySample sample;
+    sample.timestamp_ns = 1000000 + i * kStepNs;
+    sample.energy_joules = 0.001 * static_cast<double>(i) + 1e-7 * static_cast<double>(i % 7);
+    sample.power_watts = 10.0 + std::sin(static_cast<double>(i));
+    double package = i % 5 == 4 ? std::numeric_limits<double>::quiet_NaN() : 0.8 * sample.energy_joules;
+    sample.domain_joules.push_back(package);
+    if (i >= kChunk / 2) sample.domain_joules.push_back(0.1 * sample.energy_joules);
+    return sample;
+}
+
+void fill(ReadingSpillStore& store, size_t count) {
+    for (size_t i = 0; i < count; ++i) store.append(sample_at(i));
+}
+
+bool same_value(double a, double b) {
+    return a == b || (std::isnan(a) && std::isnan(b));
+}
+
+// Domains missing from either sample count as NaN
+bool same(const EnergySample& a, const EnergySample& b) {
+    if (a.timestamp_ns != b.timestamp_ns || a.energy_joules != b.energy_joules || a.power_watts != b.power_watts) {
+        return false;
+    }
+    for (size_t d = 0; d < std::max(a.domain_joules.size(), b.domain_joules.size()); ++d) {
+        if (!same_value(a.domain(d), b.domain(d))) return false;
+    }
+    return true;
+}
+
+// The range's neighbours on both sides are included, and nothing is skipped
+void check_brackets(const std::vector<EnergySample>& out, uint64_t from_ns, uint64_t to_ns) {
+    CHECK(!out.empty());
+    if (out.empty()) return;
+    CHECK(out.front().timestamp_ns <= from_ns);
+    CHECK(out.back().timestamp_ns >= to_ns);
+    for (size_t i = 1; i < out.size(); ++i) CHECK(out[i].timestamp_ns == out[i - 1].timestamp_ns + kStepNs);
+}
+
+} // namespace
+
+NEMB_TEST(round_trip_is_exact_across_chunk_boundaries) {
+    ReadingSpillStore store;
+    size_t count = 3 * kChunk + 100;
+    fill(store, count);
+    CHECK(store.size() == count);
+    CHECK(store.oldest_timestamp_ns() == sample_at(0).timestamp_ns);
+
+    std::vector<EnergySample> out;
+    store.read_range(0, std::numeric_limits<uint64_t>::max(), out);
+    CHECK(out.size() == count);
+    size_t mismatches = 0;
+    for (size_t i = 0; i < out.size() && i < count; ++i) mismatches += !same(out[i], sample_at(i));
+    CHECK(mismatches == 0);
+}
+
+NEMB_TEST(read_range_brackets_both_ends) {
+    ReadingSpillStore store;
+    fill(store, 3 * kChunk + 100);
+    uint64_t chunk_end = sample_at(kChunk - 1).timestamp_ns;
+    uint64_t next_chunk = sample_at(kChunk).timestamp_ns;
+
+    // Inside a chunk, on a chunk's first sample, and between two chunks
+    struct { uint64_t from, to; } ranges[] = {
+        {sample_at(10).timestamp_ns + 1, sample_at(20).timestamp_ns + 1},
+        {next_chunk, next_chunk},
+        {chunk_end + 1, chunk_end + 1},
+        {sample_at(2 * kChunk - 5).timestamp_ns, sample_at(2 * kChunk + 5).timestamp_ns},
+        // Reaching into the samples not yet compressed
+        {sample_at(3 * kChunk - 1).timestamp_ns + 1, sample_at(3 * kChunk + 50).timestamp_ns},
+    };
+    for (const auto& range : ranges) {
+        std::vector<EnergySample> out;
+        store.read_range(range.from, range.to, out);
+        check_brackets(out, range.from, range.to);
+        // Whole chunks at most on either side of the range
+        CHECK(out.size() <= 3 * kChunk);
+    }
+
+    // Before the first and after the last sample: everything up to the nearest one
+    std::vector<EnergySample> before;
+    store.read_range(0, 0, before);
+    CHECK(!before.empty() && same(before.front(), sample_at(0)));
+    std::vector<EnergySample> after;
+    uint64_t past = sample_at(3 * kChunk + 200).timestamp_ns;
+    store.read_range(past, past, after);
+    CHECK(!after.empty() && same(after.back(), sample_at(3 * kChunk + 99)));
+}
+
+NEMB_TEST(discard_before_keeps_the_lower_bound) {
+    ReadingSpillStore store;
+    fill(store, 3 * kChunk + 100);
+    uint64_t cut = sample_at(2 * kChunk + 10).timestamp_ns;
+
+    // The first two chunks start before the third one, which still holds cut's lower bound
+    CHECK(store.discard_before(cut) == 2 * kChunk);
+    CHECK(store.size() == kChunk + 100);
+    CHECK(store.oldest_timestamp_ns() == sample_at(2 * kChunk).timestamp_ns);
+
+    std::vector<EnergySample> out;
+    store.read_range(cut, cut, out);
+    check_brackets(out, cut, cut);
+
+    // Nothing newer than the cut's lower bound is dropped again
+    CHECK(store.discard_before(cut) == 0);
+    store.clear();
+    CHECK(store.empty());
+}
+
+NEMB_TEST(append_reports_an_unwritable_spill_file) {
+    ReadingSpillStore store("/nonexistent/codegreen-spill");
+    bool all_written = true;
+    for (size_t i = 0; i < kChunk; ++i) all_written &= store.append(sample_at(i));
+
+    // The chunk that could not be spilled is dropped, later samples still count
+    CHECK(!all_written);
+    CHECK(store.empty());
+    CHECK(store.append(sample_at(kChunk)));
+    CHECK(store.size() == 1);
+    std::vector<EnergySample> out;
+    store.read_range(0, std::numeric_limits<uint64_t>::max(), out);
+    CHECK(out.size() == 1 && same(out.front(), sample_at(kChunk)));
+}
+
+NEMB_TEST_MAIN()
@@ -0,0 +1,73 @@
+#pragma once
+/**
+ * Minimal test harness for the NEMB unit tests (no framework dependency).
+ *
+ * NEMB_TEST(name) { ... } registers a test; CHECK() records a failure and
+ * carries on, so one run reports every broken expectation. Each test
+ * executable ends with NEMB_TEST_MAIN() and exits non-zero on any failure,
+ * which is all ctest looks at.
+ */
+#include <cmath>
+#include <cstdlib>
+#include <iostream>
+#include <vector>
+
+namespace nemb_test {
+
+struct TestCase {
+    const char* name;
+    void (*run)();
+};
+
+inline std::vector<TestCase>& registry() {
+    static std::vector<TestCase> cases;
+    return cases;
+}
+
+inline int& failures() {
+    static int count = 0;
+    return count;
+}
+
+struct Registrar {
+    Registrar(const char* name, void (*run)()) { registry().push_back({name, run}); }
+};
+
+inline int run_all() {
+    for (const auto& test : registry()) {
+        int before = failures();
+        test.run();
+        std::cout << (failures() == before ? "PASS " : "FAIL ") << test.name << std::endl;
+    }
+    return failures() == 0 ? EXIT_SUCCESS : EXIT_FAILURE;
+}
+
+} // namespace nemb_test
+
+#define NEMB_TEST(name)                                                   \
+    static void name();                                                   \
+    static nemb_test::Registrar name##_registrar(#name, name);            \
+    static void name()
+
+#define CHECK(condition)                                                  \
+    do {                                                                  \
+        if (!(condition)) {                                               \
+            ++nemb_test::failures();                                      \
+            std::cerr << __FILE__ << ":" << __LINE__                      \
+                      << ": CHECK(" #condition ") failed" << std::endl;   \
+        }                                                                 \
+    } while (0)
+
+#define CHECK_NEAR(actual, expected, tolerance)                           \
+    do {                                                                  \
+        double nemb_actual = (actual), nemb_expected = (expected);        \
+        if (!(std::fabs(nemb_actual - nemb_expected) <= (tolerance))) {   \
+            ++nemb_test::failures();                                      \
+            std::cerr << __FILE__ << ":" << __LINE__ << ": " #actual " = " \
+                      << nemb_actual << ", expected " << nemb_expected    \
+                      << std::endl;                                       \
+        }                                                                 \
+    } while (0)
+
+#define NEMB_TEST_MAIN()                                                  \
+    int main() { return nemb_test::run_all(); }
@@ -0,0 +1,195 @@
+"""
+Shared fixtures for the Python runtime tests.
+
+FakeNEMB stands in for libcodegreen-nemb behind a real NEMBClient, so the
+tests go through the client's own ctypes handling rather than a stub of it.
+"""
+
+import ctypes
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the Python runtime to path
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+sys.path.insert(0, str(RUNTIME_DIR))
+
+import codegreen_backend
+import codegreen_runtime
+from codegreen_runtime import CheckpointRecord, NEMBClient
+
+NAMED_ID = codegreen_backend._NAMED_CHECKPOINT_FLAG
+
+
+class FakeNEMB:
+    """
+    Stands in for libcodegreen-nemb.
+
+    Records what the runtime hands it (marks, context switches, batches,
+    discards) and serves what a test prepares: an export snapshot, drain
+    windows, aggregates and a reading buffer. The energy counter rises by
+    ``joules_per_read`` on every read.
+    """
+
+    def __init__(self):
+        # ('mark', checkpoint_id, key) and ('switch', state, key)
+        self.events = []
+        # (thread_key, [(timestamp_ns, checkpoint_id), ...])
+        self.batches = []
+        # Timestamps the runtime held readings from
+        self.holds = []
+        self.names = []
+        self.discarded = []
+        self.pairing = {}
+        self.aggregating = False
+        self.energy = 0.0
+        self.joules_per_read = 1.0
+        self.watts = 5.0
+        self.records = (CheckpointRecord * 0)()
+        self.domains = []
+        # Page sizes served by nemb_read_checkpoints
+        self.reads = []
+        # (window_end_ns, [CheckpointRecord, ...]) served by drains, and the limits asked for
+        self.windows = []
+        self.until = []
+        self.aggregates = []
+        self.readings = None
+        self.held = False
+
+    def export(self, records, domains=None):
+        """Make ``records`` the export snapshot, with per-domain energy columns"""
+        self.records = (CheckpointRecord * len(records))(*records)
+        self.domains = [(name.encode(), (ctypes.c_double * len(values))(*values))
+                        for name, values in (domains or {}).items()]
+
+    def buffer_readings(self, timestamps, joules, watts, domains=()):
+        """Fill the reading buffer handed out by nemb_acquire_readings"""
+        self.readings = (
+            (ctypes.c_uint64 * len(timestamps))(*timestamps),
+            (ctypes.c_double * len(joules))(*joules),
+            (ctypes.c_double * len(watts))(*watts),
+            [(name.encode(), (ctypes.c_double * len(values))(*values)) for name, values in domains],
+        )
+
+    def nemb_initialize(self):
+        return 1
+
+    def nemb_read_current(self, energy, power):
+        self.energy += self.joules_per_read
+        energy._obj.value = self.energy
+        power._obj.value = self.watts
+        return 1
+
+    def nemb_mark_checkpoint(self, name):
+        self.events.append(('mark', name.decode(), 0))
+
+    def nemb_mark_checkpoint_id(self, checkpoint_id):
+        self.events.append(('mark', checkpoint_id, 0))
+
+    def nemb_mark_checkpoint_id_for(self, checkpoint_id, key):
+        self.events.append(('mark', checkpoint_id, key))
+
+    def nemb_context_switch(self, key, state):
+        self.events.append(('switch', state, key))
+
+    def nemb_mark_checkpoints_batch(self, address, count, thread_key):
+        values = (ctypes.c_uint64 * (2 * count)).from_address(address)
+        self.batches.append((thread_key, [(values[2 * i], values[2 * i + 1]) for i in range(count)]))
+
+    def nemb_intern_checkpoint(self, name):
+        name = name.decode()
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name) | NAMED_ID
+
+    def nemb_discard_checkpoint(self, checkpoint_id):
+        self.discarded.append(checkpoint_id)
+
+    def nemb_hold_readings_from(self, timestamp_ns):
+        self.holds.append(timestamp_ns)
+
+    def nemb_prepare_checkpoints(self):
+        return len(self.records)
+
+    def nemb_checkpoint_records(self):
+        return ctypes.addressof(self.records) if len(self.records) else None
+
+    def nemb_read_checkpoints(self, cursor, out, max_records):
+        n = max(0, min(max_records, len(self.records) - cursor))
+        size = ctypes.sizeof(CheckpointRecord)
+        ctypes.memmove(out, ctypes.addressof(self.records) + cursor * size, n * size)
+        self.reads.append(n)
+        return n
+
+    def nemb_checkpoint_domain_count(self):
+        return len(self.domains)
+
+    def nemb_checkpoint_domain(self, index, buf, max_len):
+        name, column = self.domains[index]
+        buf.value = name[:max_len - 1]
+        return ctypes.addressof(column)
+
+    def nemb_checkpoint_name(self, checkpoint_id, buf, max_len):
+        name = self.names[checkpoint_id & ~NAMED_ID].encode()
+        if len(name) >= max_len:
+            return -(len(name) + 1)
+        buf.value = name
+        return len(name)
+
+    def nemb_drain_checkpoints(self, until_ns, window_end):
+        self.until.append(until_ns)
+        end, records = self.windows.pop(0) if self.windows else (0, [])
+        self.export(records)
+        window_end._obj.value = end
+        return len(records)
+
+    def nemb_enable_aggregation(self, enabled):
+        self.aggregating = bool(enabled)
+
+    def nemb_set_checkpoint_pairing(self, first_id, specs, count):
+        for i in range(count):
+            self.pairing[first_id + i] = specs[i]
+
+    def nemb_get_checkpoint_aggregates(self, out, max_records):
+        for i, record in enumerate(self.aggregates[:max_records]):
+            out[i] = record
+        return len(self.aggregates)
+
+    def nemb_acquire_readings(self, header):
+        if self.readings is None:
+            return 0
+        timestamps, joules, watts, domains = self.readings
+        header = header._obj
+        header.timestamps_ns = ctypes.addressof(timestamps)
+        header.energy_joules = ctypes.addressof(joules)
+        header.power_watts = ctypes.addressof(watts)
+        header.count = len(timestamps)
+        header.domain_count = len(domains)
+        self.held = True
+        return 1
+
+    def nemb_reading_domain(self, index, buf, max_len):
+        name, values = self.readings[3][index]
+        buf.value = name[:max_len - 1]
+        return ctypes.addressof(values)
+
+    def nemb_release_readings(self):
+        self.held = False
+
+
+@pytest.fixture
+def nemb(monkeypatch):
+    """
+    A NEMBClient over a FakeNEMB with every backend feature available,
+    returned by codegreen_runtime._get_nemb_client(). Tests turn features
+    off through the client's has_* flags.
+    """
+    monkeypatch.setattr(codegreen_backend, '_find_nemb_library', lambda: None)
+    client = NEMBClient()
+    client.lib = FakeNEMB()
+    for flag in vars(client):
+        if flag.startswith('has_'):
+            setattr(client, flag, True)
+    monkeypatch.setattr(codegreen_runtime, '_get_nemb_client', lambda: client)
+    return client
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for asyncio task attribution in the Python runtime
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+import codegreen_runtime
+import codegreen_tasks
+from src.cli.cli import _defines_coroutines
+
+
+@pytest.fixture
+def tracking(nemb, monkeypatch):
+    nemb.has_checkpoint_batches = False
+    monkeypatch.setattr(codegreen_tasks, '_task_tracking', False)
+    monkeypatch.setattr(codegreen_runtime, 'mark', codegreen_runtime.mark)
+    # enable_task_tracking() wraps these; restore them afterwards
+    monkeypatch.setattr(asyncio.events, 'new_event_loop', asyncio.events.new_event_loop)
+    monkeypatch.setattr(asyncio, 'new_event_loop', asyncio.new_event_loop)
+    assert codegreen_runtime.enable_task_tracking()
+    return nemb.lib
+
+
+def test_interleaved_tasks_mark_under_their_own_keys(tracking):
+    async def worker(enter_id, exit_id):
+        codegreen_runtime.mark(enter_id)
+        await asyncio.sleep(0)
+        codegreen_runtime.mark(exit_id)
+
+    async def main():
+        await asyncio.gather(worker(0, 1), worker(2, 3))
+
+    codegreen_runtime.mark(9)
+    asyncio.run(main())
+
+    marks = [(cp, key) for kind, cp, key in tracking.events if kind == 'mark']
+    assert marks[0] == (9, 0)
+    keys = {cp: key for cp, key in marks[1:]}
+    # Outside a task the thread key is used; each task keeps one key across awaits
+    assert keys[0] == keys[1] and keys[2] == keys[3]
+    assert len({keys[1], keys[3], 0}) == 3
+
+
+def test_task_steps_report_resume_suspend_and_finish(tracking):
+    async def worker():
+        codegreen_runtime.mark(5)
+        await asyncio.sleep(0)
+        codegreen_runtime.mark(6)
+
+    async def main():
+        await asyncio.create_task(worker())
+
+    asyncio.run(main())
+
+    _, _, key = next(e for e in tracking.events if e[:2] == ('mark', 5))
+    steps = [e[:2] for e in tracking.events if e[2] == key]
+    assert steps == [
+        ('switch', codegreen_tasks._CONTEXT_RESUMED),
+        ('mark', 5),
+        ('switch', codegreen_tasks._CONTEXT_SUSPENDED),
+        ('switch', codegreen_tasks._CONTEXT_RESUMED),
+        ('mark', 6),
+        ('switch', codegreen_tasks._CONTEXT_FINISHED),
+    ]
+
+
+def test_application_task_factory_is_kept(tracking):
+    def factory(loop, coro, **kwargs):
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.get_task_factory() is codegreen_tasks._task_factory
+        loop.set_task_factory(factory)
+        codegreen_tasks._install_task_factory(loop)
+        assert loop.get_task_factory() is factory
+    finally:
+        loop.close()
+
+
+def test_cli_detects_coroutine_definitions(tmp_path):
+    script = tmp_path / 'service.py'
+    script.write_text('import asyncio\n\nclass S:\n    async def handle(self):\n        pass\n')
+    assert _defines_coroutines(script)
+    script.write_text('def handle():\n    return "async def"\n')
+    assert not _defines_coroutines(script)
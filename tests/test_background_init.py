@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for background backend initialisation in the Python runtime
+"""
+
+import threading
+
+import pytest
+
+import codegreen_calibration
+import codegreen_regions
+import codegreen_runtime
+import codegreen_tasks
+
+
+@pytest.fixture
+def client(nemb, monkeypatch):
+    nemb.has_interned_checkpoints = False
+    monkeypatch.setattr(codegreen_runtime, '_nemb_client', None)
+    monkeypatch.setattr(codegreen_runtime, '_init_thread', object())
+    monkeypatch.setattr(codegreen_runtime, 'mark', codegreen_runtime.mark)
+    monkeypatch.setattr(codegreen_runtime, '_pending_marks', {})
+    monkeypatch.setattr(codegreen_runtime, '_calibrate_at_exit', False)
+    monkeypatch.setattr(codegreen_runtime, '_thread_state', threading.local())
+    monkeypatch.setattr(codegreen_runtime, '_thread_buffers', {})
+    monkeypatch.setattr(codegreen_runtime, '_AGGREGATE', False)
+    monkeypatch.setattr(codegreen_tasks, '_ASYNC_TASKS', False)
+    monkeypatch.setattr(codegreen_calibration, '_CALIBRATION_CALLS', 0)
+    return nemb
+
+
+def test_checkpoints_before_init_are_handed_over_with_timestamps(client, monkeypatch):
+    codegreen_runtime.mark(3)
+    worker = threading.Thread(target=codegreen_runtime.mark, args=(4,))
+    worker.start()
+    worker.join()
+    assert codegreen_runtime.mark is codegreen_runtime._mark_pending
+    assert client.lib.batches == []
+
+    monkeypatch.setattr(codegreen_runtime, '_nemb_client', client)
+    codegreen_runtime._initialize_backend()
+
+    # One batch per thread, stamped when the checkpoints were taken
+    (main_key, [(main_ns, main_id)]), (worker_key, [(worker_ns, worker_id)]) = client.lib.batches
+    assert main_key == threading.get_ident() and worker_key == worker.ident
+    assert main_id == 3 and worker_id == 4
+    assert main_ns <= worker_ns
+    # Later checkpoints stay on the batched path under the same thread key
+    assert codegreen_runtime.mark is codegreen_runtime._mark_batched
+    assert codegreen_runtime._calibrate_at_exit
+    codegreen_runtime.mark(5)
+    codegreen_runtime._flush_thread_buffers()
+    key, pairs = client.lib.batches[-1]
+    assert key == main_key and [cid for _, cid in pairs] == [5]
+
+
+def test_checkpoints_after_init_bind_the_native_path(client, monkeypatch):
+    monkeypatch.setattr(codegreen_runtime, '_nemb_client', client)
+    monkeypatch.setattr(codegreen_runtime, '_CHECKPOINT_MODE', 'direct')
+
+    codegreen_runtime.mark(1)
+    codegreen_runtime._initialize_backend()
+
+    assert client.lib.events == [('mark', 1, 0)]
+    assert client.lib.batches == []
+    assert not codegreen_runtime._calibrate_at_exit
+
+
+def test_regions_opened_before_init_do_not_wait_for_the_backend(client, monkeypatch):
+    client.has_interned_checkpoints = True
+    monkeypatch.setattr(codegreen_regions, '_regions', {})
+
+    def still_initialising():
+        raise AssertionError('region() waited for the backend')
+
+    monkeypatch.setattr(codegreen_runtime, '_get_nemb_client', still_initialising)
+    span = codegreen_runtime.region('load')
+
+    @codegreen_runtime.measured
+    def parse():
+        pass
+
+    with span:
+        parse()
+    assert client.lib.names == []
+
+    monkeypatch.setattr(codegreen_runtime, '_get_nemb_client', lambda: client)
+    monkeypatch.setattr(codegreen_runtime, '_nemb_client', client)
+    codegreen_runtime._initialize_backend()
+
+    # Buffered by name, interned on the handover, in the order they were taken
+    (_, pairs), = client.lib.batches
+    names = [client.lib.names[cid & 0xFFFF] for _, cid in pairs]
+    assert names == ['enter:load:region', 'enter:test_regions_opened_before_init_do_not_wait_for_the_backend.'
+                     '<locals>.parse:region', 'exit:test_regions_opened_before_init_do_not_wait_for_the_backend.'
+                     '<locals>.parse:region', 'exit:load:region']
+    # Afterwards the region marks its interned IDs
+    with span:
+        pass
+    codegreen_runtime._flush_thread_buffers()
+    key, pairs = client.lib.batches[-1]
+    assert [cid for _, cid in pairs] == [span.enter_id, span.exit_id]
+    assert client.lib.names[span.enter_id & 0xFFFF] == 'enter:load:region'
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the binary, paged checkpoint export in the Python runtime
+"""
+
+import ctypes
+
+import codegreen_backend
+from codegreen_runtime import CheckpointRecord
+
+
+def test_record_layout_matches_native_struct():
+    assert ctypes.sizeof(CheckpointRecord) == 40
+    assert CheckpointRecord.joules.offset == 24
+
+
+def test_final_measurements_page_through_snapshot(nemb, monkeypatch):
+    monkeypatch.setattr(codegreen_backend, '_EXPORT_PAGE_SIZE', 2)
+    long_name = 'enter:' + 'x' * 300 + ':cp'
+    named_id = nemb.intern_checkpoint(long_name)
+    nemb.lib.export([
+        CheckpointRecord(100, 0, 1, 77, 1.5, 10.0),
+        CheckpointRecord(200, 1, 1, 77, 2.0, 11.0),
+        CheckpointRecord(300, named_id, 3, 78, 2.5, 12.0),
+    ])
+
+    measurements = nemb.get_final_measurements()
+
+    assert nemb.lib.reads == [2, 1]
+    assert [m['checkpoint_id'] for m in measurements] == [
+        '0#inv_1_t77', '1#inv_1_t77', f'{long_name}#inv_3_t78',
+    ]
+    assert measurements[2] == {
+        'checkpoint_id': f'{long_name}#inv_3_t78',
+        'timestamp': 300, 'joules': 2.5, 'watts': 12.0,
+    }
+
+
+def test_checkpoint_records_view_backend_memory(nemb):
+    nemb.lib.export([CheckpointRecord(5, 2, 1, 9, 0.25, 3.0)])
+
+    records = nemb.get_checkpoint_records()
+
+    assert ctypes.addressof(records) == ctypes.addressof(nemb.lib.records)
+    assert (records[0].checkpoint_id, records[0].joules) == (2, 0.25)
+
+
+def test_measurements_carry_known_domain_energy(nemb, monkeypatch):
+    monkeypatch.setattr(codegreen_backend, '_EXPORT_PAGE_SIZE', 2)
+    nan = float('nan')
+    nemb.lib.export(
+        [
+            CheckpointRecord(100, 0, 1, 77, 1.5, 10.0),
+            CheckpointRecord(200, 1, 1, 77, 2.0, 11.0),
+            CheckpointRecord(300, 2, 1, 77, 2.5, 12.0),
+        ],
+        domains={'intel_rapl/package': [1.5, 2.0, 2.5], 'intel_rapl/dram': [0.25, nan, 0.5]},
+    )
+
+    measurements = nemb.get_final_measurements()
+
+    assert measurements[0]['domains'] == {'intel_rapl/package': 1.5, 'intel_rapl/dram': 0.25}
+    # Unknown values are left out rather than reported as NaN
+    assert measurements[1]['domains'] == {'intel_rapl/package': 2.0}
+    assert measurements[2]['domains'] == {'intel_rapl/package': 2.5, 'intel_rapl/dram': 0.5}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for integer checkpoint IDs and the sidecar checkpoint manifest
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from src.instrumentation.language_engine import LanguageEngine, load_checkpoint_manifest
+from src.cli.cli import _resolve_checkpoint_names
+
+SOURCE = '''def add(a, b):
+    total = a + b
+    return total
+
+def scale(values, factor):
+    result = [v * factor for v in values]
+    return result
+
+print(scale([add(1, 2)], 3))
+'''
+
+
+def test_instrument_code_assigns_dense_ids_and_writes_manifest(tmp_path):
+    engine = LanguageEngine()
+    result = engine.analyze_code(SOURCE, language='python', filename='sample.py')
+    if not result.metadata.get('parser_available'):
+        pytest.skip('requires the tree-sitter Python grammar')
+    assert result.success and result.instrumentation_points
+
+    manifest_path = tmp_path / 'sample_instrumented.manifest.json'
+    instrumented = engine.instrument_code(
+        SOURCE, result.instrumentation_points, 'python',
+        manifest_path=manifest_path, source_file='sample.py'
+    )
+
+    manifest = json.loads(manifest_path.read_text())
+    ids = [entry['id'] for entry in manifest['checkpoints']]
+    assert ids == list(range(len(ids)))
+    assert manifest['source_file'] == 'sample.py'
+
+    # Instrumented code carries only integers, never the string signal names
+    for entry in manifest['checkpoints']:
+        assert f"_codegreen_rt.mark({entry['id']})" in instrumented
+        assert entry['checkpoint_id'] not in instrumented
+
+
+def test_resolve_checkpoint_names_from_manifest(tmp_path):
+    manifest_path = tmp_path / 'app_instrumented.manifest.json'
+    manifest_path.write_text(json.dumps({
+        'version': 1,
+        'language': 'python',
+        'source_file': 'app.py',
+        'checkpoints': [
+            {'id': 0, 'checkpoint_id': 'function_enter_main_3_0', 'type': 'enter',
+             'point_type': 'function_enter', 'name': 'main', 'line': 3, 'column': 0, 'file': 'app.py'},
+        ],
+    }))
+    assert load_checkpoint_manifest(manifest_path)[0]['name'] == 'main'
+
+    measurements = [
+        {'checkpoint_id': '0#inv_2_t77', 'timestamp': 1, 'joules': 0.5, 'watts': 10.0},
+        {'checkpoint_id': 'exit:legacy:function_exit_legacy_9#inv_1_t77', 'timestamp': 2},
+    ]
+    _resolve_checkpoint_names(measurements, manifest_path)
+
+    assert measurements[0]['checkpoint_id'] == 'enter:main:function_enter_main_3_0#inv_2_t77'
+    assert measurements[0]['line'] == 3
+    assert measurements[1]['checkpoint_id'] == 'exit:legacy:function_exit_legacy_9#inv_1_t77'
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for CODEGREEN_DISABLED, which turns instrumented code off without removing it
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+PYTHON_CONFIG = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'configs' / 'python.json'
+
+
+def run_instrumented(body, tmp_path, **env):
+    """Run ``body`` after the import lines the instrumenter emits and return its stdout"""
+    config = json.loads(PYTHON_CONFIG.read_text())['instrumentation_config']
+    script = tmp_path / 'instrumented.py'
+    script.write_text(f"{config['import_statement']}\n{body}")
+    result = subprocess.run(
+        [sys.executable, str(script)],
+        env={**os.environ, 'PYTHONPATH': str(RUNTIME_DIR), **env},
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    return result.stdout
+
+
+def test_disabled_runtime_starts_nothing_and_reports_nothing(tmp_path):
+    result_path = tmp_path / 'result.json'
+    checkpoint = json.loads(PYTHON_CONFIG.read_text())['instrumentation_config']['templates']['function_enter']
+    body = f"""
+import threading
+
+def work():
+    {checkpoint.format(numeric_id=0)}
+    _codegreen_rt.checkpoint('cp', 'work', 'enter')
+    with _codegreen_rt.region('block'):
+        return 1
+
+work()
+print(_codegreen_on, _codegreen_rt.mark is id, _codegreen_rt.measured(work) is work, threading.active_count())
+"""
+
+    output = run_instrumented(body, tmp_path, CODEGREEN_DISABLED='1', CODEGREEN_RESULT_FILE=str(result_path))
+
+    assert output.split() == ['False', 'True', 'True', '1']
+    assert not result_path.exists()
+
+
+def test_runtime_modules_import_in_any_order():
+    # Each codegreen_* module may be the first one imported, and still sees the runtime's state
+    for module in ('codegreen_backend', 'codegreen_sysfs', 'codegreen_calibration', 'codegreen_tasks', 'codegreen_regions'):
+        subprocess.run(
+            [sys.executable, '-c', f'import {module}, codegreen_runtime\n'
+                                   f'assert getattr({module}, "runtime", codegreen_runtime) is codegreen_runtime'],
+            env={**os.environ, 'PYTHONPATH': str(RUNTIME_DIR), 'CODEGREEN_DISABLED': '1'},
+            timeout=60, check=True,
+        )
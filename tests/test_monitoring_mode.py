@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the sys.monitoring (PEP 669) measurement mode
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from src.instrumentation.language_engine import LanguageEngine
+
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+
+SOURCE = '''def work(n):
+    return sum(range(n))
+
+def numbers():
+    for i in range(3):
+        yield i
+
+def fails():
+    raise ValueError
+
+def ignored():
+    return 0
+
+for _ in range(5):
+    work(10)
+list(numbers())
+try:
+    fails()
+except ValueError:
+    pass
+ignored()
+'''
+
+# Replaces mark() with a recorder so checkpoints can be checked without NEMB
+RECORDING_BOOTSTRAP = '''
+import atexit, json, sys, codegreen_runtime
+marks = []
+codegreen_runtime.mark = marks.append
+atexit.register(lambda: print(json.dumps(marks)))
+codegreen_runtime.run_monitored(sys.argv[1], sys.argv[2:])
+'''
+
+
+def test_monitoring_manifest_selects_analyzed_functions(tmp_path):
+    engine = LanguageEngine()
+    result = engine.analyze_code(SOURCE, language='python', filename='app.py')
+    manifest_path = engine.write_monitoring_manifest(
+        tmp_path / 'app_monitored.manifest.json', result.instrumentation_points, 'python', source_file='app.py'
+    )
+
+    manifest = json.loads(manifest_path.read_text())
+    assert manifest['mode'] == 'monitoring'
+    assert manifest['checkpoints'] == []
+    assert set(manifest['functions']) <= {'work', 'numbers', 'fails', 'ignored'}
+    assert manifest['functions'] == sorted(manifest['functions'])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="sys.monitoring requires Python 3.12+")
+def test_monitored_run_pairs_checkpoints_and_honours_budget(tmp_path):
+    script = tmp_path / 'app.py'
+    script.write_text(SOURCE)
+    manifest_path = tmp_path / 'app_monitored.manifest.json'
+    manifest_path.write_text(json.dumps({
+        'version': 1, 'language': 'python', 'source_file': str(script), 'mode': 'monitoring',
+        'functions': ['work', 'numbers', 'fails'], 'checkpoints': [],
+    }))
+
+    completed = subprocess.run(
+        [sys.executable, '-c', RECORDING_BOOTSTRAP, str(script)],
+        capture_output=True, text=True, check=True,
+        env={'PYTHONPATH': str(RUNTIME_DIR), 'CODEGREEN_MANIFEST_FILE': str(manifest_path),
+             'CODEGREEN_MONITOR_BUDGET': '3'},
+    )
+    marks = json.loads(completed.stdout.splitlines()[-1])
+    entries = {e['id']: e for e in json.loads(manifest_path.read_text())['checkpoints']}
+
+    names = [(entries[m]['type'], entries[m]['name']) for m in marks]
+    assert {name for _, name in names} == {'work', 'numbers', 'fails'}
+    # Budget of 3 enters per code object; generator resumes count as enters
+    assert names.count(('enter', 'work')) == names.count(('exit', 'work')) == 3
+    assert names.count(('enter', 'numbers')) == names.count(('exit', 'numbers')) == 3
+    # Exceptions leaving a function still close it
+    assert names.count(('enter', 'fails')) == names.count(('exit', 'fails')) == 1
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for online enter/exit aggregation in the Python runtime
+"""
+
+import ctypes
+
+import codegreen_runtime
+from codegreen_runtime import CheckpointAggregate
+
+UNPAIRED = 0xFFFFFFFF
+
+
+def test_aggregate_layout_matches_native_struct():
+    assert ctypes.sizeof(CheckpointAggregate) == 80
+    assert CheckpointAggregate.duration_sum_ns.offset == 48
+
+
+def test_exits_pair_with_nearest_preceding_enter():
+    entries = [
+        {'id': 0, 'type': 'enter', 'name': 'run', 'line': 3},
+        {'id': 1, 'type': 'exit', 'name': 'run', 'line': 5},
+        {'id': 2, 'type': 'enter', 'name': 'run', 'line': 10},
+        {'id': 3, 'type': 'exit', 'name': 'run', 'line': 12},
+        {'id': 4, 'type': 'exit', 'name': 'run', 'line': 14},
+        {'id': 5, 'type': 'loop_start', 'name': 'for', 'line': 11},
+    ]
+
+    specs = codegreen_runtime._pairing_specs(entries)
+
+    assert specs == [0 << 1, (0 << 1) | 1, 2 << 1, (2 << 1) | 1, (2 << 1) | 1, UNPAIRED]
+    assert codegreen_runtime._pairing_specs([]) == []
+
+
+def test_aggregates_follow_result_schema(nemb):
+    named_id = nemb.intern_checkpoint('enter:main:cp_1')
+    nemb.lib.aggregates = [
+        CheckpointAggregate(2, 0, 4, 2.0, 0.25, 1.0, 0.1, 4000.0, 500.0, 2000.0, 10.0),
+        CheckpointAggregate(named_id, 0, 1, 0.5, 0.5, 0.5, 0.0, 100.0, 100.0, 100.0, 0.0),
+    ]
+
+    aggregates = nemb.get_checkpoint_aggregates()
+
+    assert [a['checkpoint_id'] for a in aggregates] == ['2', 'enter:main:cp_1']
+    assert aggregates[0]['count'] == 4
+    assert aggregates[0]['energy_joules'] == {
+        'sum': 2.0, 'min': 0.25, 'max': 1.0, 'mean': 0.5, 'variance': 0.1,
+    }
+    assert aggregates[0]['duration_ns']['mean'] == 1000.0
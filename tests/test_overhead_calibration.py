@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for checkpoint overhead calibration and its compensation in the report
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+import codegreen_runtime
+from codegreen_runtime import CheckpointRecord
+from src.cli.cli import _apply_overhead_compensation, _function_energy
+
+
+def checkpoint(kind, function, invocation, timestamp, joules, thread=1):
+    return {
+        'checkpoint_id': f'{kind}:{function}:{kind}_{function}#inv_{invocation}_t{thread}',
+        'timestamp': timestamp,
+        'joules': joules,
+        'watts': 1.0,
+    }
+
+
+def test_calibration_uses_bound_fast_path_and_interned_id(nemb, monkeypatch):
+    calls = []
+    monkeypatch.setattr(codegreen_runtime, 'mark', calls.append)
+    monkeypatch.setattr(codegreen_runtime, '_result_sections', {})
+
+    calibration = codegreen_runtime.calibrate_overhead(500)
+
+    assert calls == [0x80000000] * 500
+    # The backend drops the calibration markers before correlation
+    assert nemb.lib.discarded == [0x80000000]
+    assert nemb.lib.names == ['codegreen:calibration']
+    assert calibration['calls'] == 500
+    assert calibration['checkpoint_ns'] > 0
+    # 1 J over the timed loop
+    assert calibration['checkpoint_joules'] == pytest.approx(calibration['watts'] * calibration['checkpoint_ns'] / 1e9)
+    assert codegreen_runtime._result_sections['calibration']() == calibration
+
+
+def test_calibration_checkpoints_are_dropped_on_export_without_backend_discard(nemb, monkeypatch):
+    nemb.has_discarded_checkpoints = False
+    monkeypatch.setattr(codegreen_runtime, 'mark', lambda checkpoint_id: None)
+    monkeypatch.setattr(codegreen_runtime, '_result_sections', {})
+
+    codegreen_runtime.calibrate_overhead(10)
+    nemb.lib.export([
+        CheckpointRecord(100, 0x80000000, 1, 1, 1.0, 5.0),
+        CheckpointRecord(200, 3, 1, 1, 2.0, 5.0),
+    ])
+
+    assert nemb.lib.discarded == []
+    assert [m['checkpoint_id'] for m in nemb.get_final_measurements()] == ['3#inv_1_t1']
+
+
+def test_function_energy_subtracts_overhead_inclusive_and_exclusive():
+    # outer() calls inner() once; inner records one loop checkpoint
+    checkpoints = [
+        checkpoint('enter', 'outer', 1, 0, 0.0),
+        checkpoint('enter', 'inner', 1, 100, 1.0),
+        checkpoint('loop_start', 'inner', 1, 150, 1.5),
+        checkpoint('exit', 'inner', 1, 200, 3.0),
+        checkpoint('exit', 'outer', 1, 400, 10.0),
+    ]
+
+    functions = {f['name']: f for f in _function_energy(checkpoints, {'checkpoint_joules': 0.5, 'checkpoint_ns': 10})}
+
+    # inner: 2 J raw, its own checkpoint pair and the loop checkpoint inside
+    assert functions['inner']['inclusive_joules'] == pytest.approx(1.0)
+    assert functions['inner']['exclusive_joules'] == pytest.approx(1.0)
+    assert functions['inner']['inclusive_ns'] == pytest.approx(80)
+    # outer: 10 J raw, its own pair and the three checkpoints inside
+    assert functions['outer']['raw_joules'] == pytest.approx(10.0)
+    assert functions['outer']['inclusive_joules'] == pytest.approx(8.0)
+    assert functions['outer']['exclusive_joules'] == pytest.approx(7.0)
+
+
+def test_function_energy_breaks_down_by_domain():
+    def with_domains(cp, package, dram=None):
+        cp['domains'] = {'intel_rapl/package': package}
+        if dram is not None:
+            cp['domains']['intel_rapl/dram'] = dram
+        return cp
+
+    checkpoints = [
+        with_domains(checkpoint('enter', 'outer', 1, 0, 0.0), 0.0, 0.0),
+        with_domains(checkpoint('enter', 'inner', 1, 100, 1.0), 1.0, 0.25),
+        with_domains(checkpoint('exit', 'inner', 1, 200, 3.0), 3.0, 1.25),
+        # No DRAM reading around this exit: outer gets no DRAM figure
+        with_domains(checkpoint('exit', 'outer', 1, 400, 10.0), 10.0),
+    ]
+
+    functions = {f['name']: f for f in _function_energy(checkpoints, {'checkpoint_joules': 0.0, 'checkpoint_ns': 0})}
+
+    assert functions['inner']['domains'] == {
+        'intel_rapl/dram': {'inclusive_joules': pytest.approx(1.0), 'exclusive_joules': pytest.approx(1.0)},
+        'intel_rapl/package': {'inclusive_joules': pytest.approx(2.0), 'exclusive_joules': pytest.approx(2.0)},
+    }
+    assert functions['outer']['domains'] == {
+        'intel_rapl/package': {'inclusive_joules': pytest.approx(10.0), 'exclusive_joules': pytest.approx(8.0)},
+    }
+
+
+def test_compensation_applies_to_aggregates():
+    aggregate = {
+        'checkpoint_id': 'enter:work:cp_1',
+        'count': 4,
+        'energy_joules': {'sum': 4.0, 'min': 0.5, 'max': 2.0, 'mean': 1.0, 'variance': 0.1},
+        'duration_ns': {'sum': 400.0, 'min': 50.0, 'max': 200.0, 'mean': 100.0, 'variance': 10.0},
+    }
+    measurement = {'checkpoints': [], 'aggregates': [aggregate],
+                   'calibration': {'checkpoint_joules': 0.25, 'checkpoint_ns': 10}}
+
+    _apply_overhead_compensation(measurement)
+
+    assert aggregate['energy_joules']['sum'] == pytest.approx(3.0)
+    assert aggregate['energy_joules']['mean'] == pytest.approx(0.75)
+    assert aggregate['duration_ns']['min'] == pytest.approx(40.0)
+    assert aggregate['energy_joules']['variance'] == 0.1
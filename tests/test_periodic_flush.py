@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the rolling-window periodic flush in the Python runtime
+"""
+
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import codegreen_runtime
+from codegreen_runtime import CheckpointRecord, FileSink, PrometheusPushSink, SQLiteSink
+
+
+def measurement(checkpoint_id, timestamp, joules):
+    return {'checkpoint_id': checkpoint_id, 'timestamp': timestamp, 'joules': joules, 'watts': 10.0}
+
+
+def test_windows_are_contiguous_and_written_as_json_lines(nemb, tmp_path):
+    enter, exit_ = nemb.intern_checkpoint('enter:run:cp_1'), nemb.intern_checkpoint('exit:run:cp_2')
+    nemb.lib.windows = [
+        (200, [CheckpointRecord(150, enter, 1, 7, 1.0, 10.0)]),
+        (300, []),
+        (400, [CheckpointRecord(350, exit_, 1, 7, 3.0, 10.0)]),
+    ]
+    path = tmp_path / 'windows.jsonl'
+    flusher = codegreen_runtime._FlushThread(60.0, FileSink(str(path)))
+    flusher.window_start_ns = 100
+
+    for _ in range(3):
+        flusher.flush()
+
+    windows = [json.loads(line) for line in path.read_text().splitlines()]
+    # Empty windows are skipped but still advance the window start
+    assert [(w['window_start_ns'], w['window_end_ns']) for w in windows] == [(100, 200), (300, 400)]
+    assert windows[1]['measurements'] == [measurement('exit:run:cp_2#inv_1_t7', 350, 3.0)]
+
+
+def test_window_stops_at_oldest_buffered_record(nemb, monkeypatch):
+    buffer = codegreen_runtime._CheckpointBuffer(4, thread_key=1)
+    buffer.records[0], buffer.records[1] = 500, 3
+    buffer.count = 2
+    monkeypatch.setattr(codegreen_runtime, '_thread_buffers', {1: buffer})
+
+    codegreen_runtime._FlushThread(60.0, FileSink('unused')).flush()
+
+    assert nemb.lib.until == [500]
+
+
+def test_sqlite_sink_stores_one_row_per_checkpoint(tmp_path):
+    path = tmp_path / 'energy.db'
+    sink = SQLiteSink(str(path))
+    sink.write({'window_start_ns': 0, 'window_end_ns': 900, 'measurements': [
+        measurement('3#inv_1_t7', 100, 0.5),
+        measurement('4#inv_1_t7', 800, 0.75),
+    ]})
+    sink.close()
+
+    rows = sqlite3.connect(str(path)).execute('SELECT * FROM checkpoints ORDER BY timestamp_ns').fetchall()
+    assert rows == [(900, '3#inv_1_t7', 100, 0.5, 10.0), (900, '4#inv_1_t7', 800, 0.75, 10.0)]
+
+
+def test_prometheus_sink_pairs_spans_across_windows(monkeypatch):
+    entries = [
+        {'id': 0, 'type': 'enter', 'name': 'handle', 'line': 1},
+        {'id': 1, 'type': 'exit', 'name': 'handle', 'line': 4},
+    ]
+    sink = PrometheusPushSink('http://unused', entries)
+    monkeypatch.setattr(sink, 'push', lambda: None)
+
+    sink.write({'measurements': [
+        measurement('0#inv_1_t7', 1_000_000_000, 1.0),
+        measurement('enter:util:cp#inv_1_t8', 1_000_000_000, 1.0),
+    ]})
+    sink.write({'measurements': [
+        measurement('1#inv_1_t7', 3_000_000_000, 4.0),
+        measurement('exit:util:cp#inv_1_t8', 2_000_000_000, 1.5),
+    ]})
+
+    assert sink.totals == {'handle': [1, 3.0, 2_000_000_000], 'util': [1, 0.5, 1_000_000_000]}
+    text = sink.render()
+    assert 'codegreen_function_energy_joules_total{function="handle"} 3.0' in text
+    assert 'codegreen_function_duration_seconds_total{function="handle"} 2.0' in text
+    assert sink.pairer.open_frames == {}
+
+
+def test_prometheus_sink_pushes_with_put():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_PUT(self):
+            received.append((self.path, self.rfile.read(int(self.headers['Content-Length'])).decode()))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+    try:
+        sink = PrometheusPushSink(f'http://127.0.0.1:{server.server_port}/metrics/job/app')
+        sink.write({'measurements': [], 'aggregates': [{
+            'checkpoint_id': 'enter:main:cp', 'count': 2,
+            'energy_joules': {'sum': 1.5}, 'duration_ns': {'sum': 4e9},
+        }]})
+    finally:
+        thread.join()
+        server.server_close()
+
+    assert received[0][0] == '/metrics/job/app'
+    assert 'codegreen_function_calls_total{function="main"} 2' in received[0][1]
+
+
+def test_open_sink_rejects_unknown_specs():
+    assert isinstance(codegreen_runtime.open_sink('sqlite:/tmp/x.db'), SQLiteSink)
+    with pytest.raises(ValueError):
+        codegreen_runtime.open_sink('kafka:topic')
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for fork handling and per-process result shards in the Python runtime
+"""
+
+import json
+import os
+
+import pytest
+
+import codegreen_runtime
+from codegreen_runtime import CheckpointRecord
+
+MEASUREMENTS = [{'checkpoint_id': '0#inv_1_t1', 'timestamp': 10, 'joules': 1.0, 'watts': 5.0}]
+
+
+def run_in_child(body):
+    """Fork, run ``body`` in the child and return its PID and exit status"""
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            body()
+            status = 0
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    return pid, os.waitstatus_to_exitcode(status)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_children_write_result_shards(nemb, tmp_path, monkeypatch):
+    result_path = tmp_path / 'result.json'
+    nemb.lib.export([CheckpointRecord(10, 0, 1, 1, 1.0, 5.0)])
+    monkeypatch.setenv('CODEGREEN_RESULT_FILE', str(result_path))
+    monkeypatch.setenv('CODEGREEN_RESULT_OWNER', str(os.getpid()))
+
+    child_pid, status = run_in_child(codegreen_runtime._report_at_exit)
+    codegreen_runtime._report_at_exit()
+
+    assert status == 0
+    shard = json.loads((tmp_path / f'result.json.{child_pid}').read_text())
+    assert shard['pid'] == child_pid
+    assert shard['parent_pid'] == os.getpid()
+    assert shard['measurements'] == MEASUREMENTS
+    assert json.loads(result_path.read_text())['pid'] == os.getpid()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_child_starts_with_empty_buffers(nemb, tmp_path, monkeypatch):
+    monkeypatch.setattr(codegreen_runtime, '_BATCH_CAPACITY', 64)
+    for numeric_id in range(3):
+        codegreen_runtime._mark_batched(numeric_id)
+    marker = tmp_path / 'child.json'
+
+    def child():
+        # The parent's pending records must not be reported twice
+        codegreen_runtime._flush_thread_buffers()
+        marker.write_text(json.dumps({
+            'batches': nemb.lib.batches,
+            'buffers': len(codegreen_runtime._thread_buffers),
+        }))
+
+    _, status = run_in_child(child)
+
+    assert status == 0
+    assert json.loads(marker.read_text()) == {'batches': [], 'buffers': 1}
+    codegreen_runtime._flush_thread_buffers()
+    assert [len(pairs) for _, pairs in nemb.lib.batches] == [3]
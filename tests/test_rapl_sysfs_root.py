@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the Intel RAPL provider reading a powercap tree from CODEGREEN_RAPL_ROOT
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+
+ZONES = {'package': 'intel-rapl:0', 'pp0': 'intel-rapl:0:0', 'dram': 'intel-rapl:0:2'}
+
+# Counters rise by these microjoules every millisecond; after "corrupt" the
+# pp0 file carries trailing garbage, which the provider must reject
+SCRIPT = """
+import json, os, threading, time
+ZONES = %r
+RATES = {'package': 1000, 'pp0': 600, 'dram': 250}
+root = os.environ['CODEGREEN_RAPL_ROOT']
+files = {d: os.open(os.path.join(root, z, 'energy_uj'), os.O_WRONLY) for d, z in ZONES.items()}
+stop = threading.Event()
+corrupt = threading.Event()
+
+def tick():
+    values = dict.fromkeys(ZONES, 1000000)
+    while not stop.is_set():
+        for domain, rate in RATES.items():
+            values[domain] += rate
+            suffix = b'x' if domain == 'pp0' and corrupt.is_set() else b' '
+            os.pwrite(files[domain], b'%%012d' %% values[domain] + suffix + b'\\n', 0)
+        time.sleep(0.001)
+
+ticker = threading.Thread(target=tick)
+ticker.start()
+import codegreen_runtime
+client = codegreen_runtime._get_nemb_client()
+if getattr(client, 'lib', None) is None:
+    stop.set()
+    raise SystemExit(print('RAPL null'))
+time.sleep(0.3)
+client.mark_checkpoint('enter:work:1')
+time.sleep(0.2)
+client.mark_checkpoint('loop:work:2')
+# The middle checkpoint is interpolated up to the first reading after it,
+# which must still see a valid pp0 counter
+marked_ns = time.monotonic_ns()
+while True:
+    with client.reading_columns() as columns:
+        if columns['timestamp_ns'][len(columns['timestamp_ns']) - 1] > marked_ns:
+            break
+    time.sleep(0.005)
+corrupt.set()
+time.sleep(0.2)
+client.mark_checkpoint('exit:work:3')
+time.sleep(0.2)
+stop.set()
+ticker.join()
+print('RAPL ' + json.dumps(client.get_final_measurements()))
+""" % ZONES
+
+
+def test_rapl_domains_are_read_from_the_configured_root(tmp_path):
+    for zone in ZONES.values():
+        (tmp_path / zone).mkdir()
+        (tmp_path / zone / 'energy_uj').write_text('%012d \n' % 1000000)
+    (tmp_path / 'intel-rapl:0' / 'name').write_text('package-0\n')
+
+    # The runtime is only imported in the child: importing it here would start a backend
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        env={**os.environ, 'PYTHONPATH': str(RUNTIME_DIR), 'CODEGREEN_RAPL_ROOT': str(tmp_path)},
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    line = next(l for l in result.stdout.splitlines() if l.startswith('RAPL '))
+    measurements = json.loads(line[len('RAPL '):])
+    if measurements is None:
+        pytest.skip('requires libcodegreen-nemb')
+    enter, middle, exit_ = sorted(measurements, key=lambda m: m['timestamp'])
+
+    def delta(domain):
+        key = f'intel_rapl/{domain}'
+        return middle['domains'][key] - enter['domains'][key]
+
+    assert {'intel_rapl/package', 'intel_rapl/pp0', 'intel_rapl/dram'} <= set(enter['domains'])
+    assert delta('package') > 0
+    assert delta('pp0') / delta('package') == pytest.approx(0.6, rel=0.05)
+    assert delta('dram') / delta('package') == pytest.approx(0.25, rel=0.05)
+    # "<digits>x" is not a counter value: pp0 drops out, the other domains go on
+    assert 'intel_rapl/pp0' not in exit_['domains']
+    assert exit_['domains']['intel_rapl/package'] > middle['domains']['intel_rapl/package']
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for zero-copy access to the backend's reading columns
+"""
+
+import ctypes
+import math
+
+import pytest
+
+
+def test_columns_address_backend_memory_until_released(nemb):
+    lib = nemb.lib
+    lib.buffer_readings([10, 20, 30], [1.0, 1.5, 2.5], [50.0, 50.0, 100.0],
+                        [('intel_rapl/package', [0.8, 1.2, 2.0]), ('intel_rapl/dram', [math.nan, 0.1, 0.2])])
+
+    with nemb.reading_columns() as columns:
+        assert lib.held
+        assert ctypes.addressof(columns['joules']) == ctypes.addressof(lib.readings[1])
+        assert list(columns['timestamp_ns']) == [10, 20, 30]
+        assert list(columns['domains']) == ['intel_rapl/package', 'intel_rapl/dram']
+        assert math.isnan(columns['domains']['intel_rapl/dram'][0])
+        assert columns['domains']['intel_rapl/package'][2] == 2.0
+    assert not lib.held
+
+
+def test_numpy_columns_share_memory_and_release_on_error(nemb):
+    np = pytest.importorskip('numpy')
+    lib = nemb.lib
+    lib.buffer_readings([10, 20], [1.0, 2.0], [5.0, 6.0])
+
+    with pytest.raises(RuntimeError):
+        with nemb.reading_columns(as_numpy=True) as columns:
+            assert columns['watts'].dtype == np.float64
+            lib.readings[2][1] = 7.0
+            assert columns['watts'][1] == 7.0
+            raise RuntimeError
+    assert not lib.held
+
+
+def test_no_backend_yields_none(nemb):
+    nemb.lib = None
+    with nemb.reading_columns() as columns:
+        assert columns is None
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the region context manager and @measured decorator
+"""
+
+import asyncio
+
+import pytest
+
+import codegreen_regions
+import codegreen_runtime
+
+
+@pytest.fixture
+def marks(nemb, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(codegreen_regions, '_regions', {})
+    monkeypatch.setattr(codegreen_runtime, 'mark', lambda checkpoint_id: recorded.append(nemb.lib.names[checkpoint_id & 0xFFFF]))
+    return recorded
+
+
+def test_regions_nest_and_close_on_exceptions(marks):
+    with pytest.raises(ValueError):
+        with codegreen_runtime.region('outer'):
+            with codegreen_runtime.region('inner'):
+                raise ValueError
+
+    assert marks == ['enter:outer:region', 'enter:inner:region', 'exit:inner:region', 'exit:outer:region']
+    # Names are interned once
+    assert codegreen_runtime.region('outer') is codegreen_runtime.region('outer')
+
+
+def test_measured_decorates_functions_and_coroutines(marks):
+    @codegreen_runtime.measured
+    def parse(value):
+        return value * 2
+
+    @codegreen_runtime.measured(name='fetch')
+    async def fetch():
+        await asyncio.sleep(0)
+        return parse(3)
+
+    assert asyncio.run(fetch()) == 6
+    assert parse.__name__ == 'parse'
+    assert marks == [
+        'enter:fetch:region',
+        'enter:test_measured_decorates_functions_and_coroutines.<locals>.parse:region',
+        'exit:test_measured_decorates_functions_and_coroutines.<locals>.parse:region',
+        'exit:fetch:region',
+    ]
+
+
+def test_regions_are_inert_without_interning(nemb, monkeypatch):
+    nemb.has_interned_checkpoints = False
+    monkeypatch.setattr(codegreen_regions, '_regions', {})
+
+    def work():
+        return 1
+
+    with codegreen_runtime.region('idle'):
+        pass
+    assert codegreen_runtime.measured(work) is work
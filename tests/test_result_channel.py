@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the side-channel result file between the runtime and the CLI
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+import codegreen_runtime
+import pytest
+from codegreen_runtime import CheckpointRecord
+from src.cli.cli import Language, _merge_process_results, _run_energy_measurement
+
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+MEASUREMENTS = [{'checkpoint_id': '0#inv_1_t1', 'timestamp': 10, 'joules': 1.0, 'watts': 5.0}]
+
+
+def test_report_at_exit_writes_result_file(nemb, tmp_path, monkeypatch, capsys):
+    result_path = tmp_path / 'result.json'
+    nemb.lib.export([CheckpointRecord(10, 0, 1, 1, 1.0, 5.0)])
+    monkeypatch.setenv('CODEGREEN_RESULT_FILE', str(result_path))
+
+    codegreen_runtime._report_at_exit()
+
+    results = json.loads(result_path.read_text())
+    assert results['measurements'] == MEASUREMENTS
+    assert results['pid'] == os.getpid()
+    assert capsys.readouterr().out == ''
+
+
+def test_cli_streams_output_and_reads_result_file(tmp_path, capfd):
+    # User output that looks like the old markers must not affect the result
+    script = tmp_path / 'app.py'
+    script.write_text(
+        'import json, os\n'
+        'print("--- CODEGREEN_RESULT_START ---")\n'
+        'print("{not json}")\n'
+        'print("--- CODEGREEN_RESULT_END ---")\n'
+        f'json.dump({{"measurements": {MEASUREMENTS!r}}}, open(os.environ["CODEGREEN_RESULT_FILE"], "w"))\n'
+    )
+
+    result = _run_energy_measurement(script, Language.python, None, False, 30, None)
+
+    assert result['success']
+    assert result['checkpoints'] == MEASUREMENTS
+    assert '{not json}' in capfd.readouterr().out
+
+
+def test_child_shards_are_merged_by_process(tmp_path):
+    result_path = tmp_path / 'result.json'
+    result_path.write_text(json.dumps({'pid': 100, 'parent_pid': 1, 'measurements': MEASUREMENTS}))
+    child = [dict(m, timestamp=m['timestamp'] + i * 10**9, joules=m['joules'] + i) for i, m in enumerate(MEASUREMENTS * 2)]
+    (tmp_path / 'result.json.101').write_text(json.dumps({'pid': 101, 'parent_pid': 100, 'measurements': child}))
+    # Not a process shard
+    (tmp_path / 'result.json.101.tmp').write_text('{partial')
+
+    merged = _merge_process_results(result_path)
+
+    assert [m['pid'] for m in merged['measurements']] == [100, 101, 101]
+    assert [(p['pid'], p['parent_pid'], p['checkpoints']) for p in merged['processes']] == [(100, 1, 1), (101, 100, 2)]
+    assert merged['processes'][1]['duration_s'] == 1.0
+    assert merged['processes'][1]['energy_joules'] == 1.0
+
+
+def test_native_backend_leaves_the_python_report_in_place(tmp_path):
+    # The Python runtime initialises the native meter, so only its own atexit report may write the file
+    result_path = tmp_path / 'result.json'
+    script = (
+        'import time, codegreen_runtime\n'
+        'if getattr(codegreen_runtime._get_nemb_client(), "lib", None) is None:\n'
+        '    raise SystemExit(print("NOLIB"))\n'
+        'codegreen_runtime.mark(0)\n'
+        'time.sleep(0.1)\n'
+        'codegreen_runtime.mark(1)\n'
+        'time.sleep(0.05)\n'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        env={**os.environ, 'PYTHONPATH': str(RUNTIME_DIR), 'CODEGREEN_REPLAY': 'constant:10',
+             'CODEGREEN_RESULT_FILE': str(result_path), 'CODEGREEN_CALIBRATION_CALLS': '500'},
+        capture_output=True, text=True, timeout=60,
+    )
+    if 'NOLIB' in result.stdout:
+        pytest.skip('requires libcodegreen-nemb')
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(result_path.read_text())
+    merged = _merge_process_results(result_path)
+
+    assert {'measurements', 'calibration', 'threads', 'pid', 'parent_pid'} <= set(report)
+    assert {'measurements', 'calibration', 'threads'} <= set(merged)
+    assert merged['calibration']['calls'] == 500
+    assert all(t['pid'] == report['pid'] for t in merged['threads'])
+    assert [m['checkpoint_id'].split('#')[0] for m in merged['measurements']] == ['0', '1']
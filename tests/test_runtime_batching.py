@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-thread batched checkpoint buffers in the Python runtime
+"""
+
+import threading
+
+import codegreen_runtime
+
+
+def test_batches_flush_when_full_and_at_thread_exit(nemb, monkeypatch):
+    lib = nemb.lib
+    monkeypatch.setattr(codegreen_runtime, '_BATCH_CAPACITY', 4)
+
+    thread_keys = []
+
+    def worker():
+        thread_keys.append(threading.get_ident())
+        for numeric_id in range(6):
+            codegreen_runtime._mark_batched(numeric_id)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    # One full batch of 4, then the remaining 2 flushed when the thread ended
+    assert [len(pairs) for _, pairs in lib.batches] == [4, 2]
+    assert all(key == thread_keys[0] for key, _ in lib.batches)
+    ids = [cid for _, pairs in lib.batches for _, cid in pairs]
+    assert ids == list(range(6))
+    timestamps = [ts for _, pairs in lib.batches for ts, _ in pairs]
+    assert timestamps == sorted(timestamps)
+    assert thread_keys[0] not in codegreen_runtime._thread_buffers
+
+
+def test_flush_thread_buffers_drains_live_threads(nemb, monkeypatch):
+    lib = nemb.lib
+    monkeypatch.setattr(codegreen_runtime, '_BATCH_CAPACITY', 64)
+
+    marked = threading.Event()
+    release = threading.Event()
+
+    def worker():
+        codegreen_runtime._mark_batched(7)
+        marked.set()
+        release.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    marked.wait()
+
+    codegreen_runtime._flush_thread_buffers()
+    assert [cid for _, pairs in lib.batches for _, cid in pairs] == [7]
+
+    release.set()
+    thread.join()
+    assert len(lib.batches) == 1
+
+
+def test_flushes_hold_readings_for_records_still_buffered(nemb, monkeypatch):
+    lib = nemb.lib
+    monkeypatch.setattr(codegreen_runtime, '_BATCH_CAPACITY', 4)
+    monkeypatch.setattr(codegreen_runtime, '_readings_held', False)
+
+    marked = threading.Event()
+    release = threading.Event()
+    buffered = []
+
+    def idle_worker():
+        codegreen_runtime._mark_batched(1)
+        buffered.append(codegreen_runtime._thread_state.buffer.records[0])
+        marked.set()
+        release.wait()
+
+    thread = threading.Thread(target=idle_worker)
+    thread.start()
+    marked.wait()
+    # The first buffer holds the readings before any record is taken
+    assert len(lib.holds) == 1 and lib.holds[0] <= buffered[0]
+
+    def busy_worker():
+        for numeric_id in range(4):
+            codegreen_runtime._mark_batched(numeric_id)
+
+    busy = threading.Thread(target=busy_worker)
+    busy.start()
+    busy.join()
+    # The busy thread's flushes leave the idle thread's record held
+    assert len(lib.holds) > 1 and all(hold <= buffered[0] for hold in lib.holds)
+
+    release.set()
+    thread.join()
+    # Nothing is buffered once the idle thread has flushed too
+    assert lib.holds[-1] > buffered[0]
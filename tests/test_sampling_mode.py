@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the power-weighted statistical sampling mode
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+RUNTIME_DIR = Path(__file__).parent.parent / 'src' / 'instrumentation' / 'language_runtimes' / 'python'
+sys.path.insert(0, str(RUNTIME_DIR))
+
+import codegreen_runtime
+from src.cli.cli import Language, MeasureMode, _run_energy_measurement
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_splits_interval_energy_across_sampled_stacks(nemb):
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,))
+    worker.start()
+
+    sampler = codegreen_runtime._EnergySampler(0.001)
+    sampler.start()
+    time.sleep(0.2)
+    stop.set()
+    profile = sampler.summary()
+    worker.join()
+
+    assert profile['samples'] > 0
+    # Every interval contributes exactly 1 J, shared by the threads sampled
+    assert profile['total_joules'] == pytest.approx(profile['samples'])
+    assert sum(f['self_joules'] for f in profile['functions']) == pytest.approx(profile['total_joules'])
+    assert sum(l['joules'] for l in profile['lines']) == pytest.approx(profile['total_joules'])
+    spin_entry = next(f for f in profile['functions'] if f['name'] == 'spin')
+    assert spin_entry['total_samples'] == profile['samples']
+    assert spin_entry['total_joules'] >= spin_entry['self_joules'] > 0
+
+
+def test_cli_sampling_mode_reports_profile(tmp_path, monkeypatch):
+    # Source tree layout: the runtime is not staged under bin/runtime
+    monkeypatch.setenv('PYTHONPATH', str(RUNTIME_DIR))
+    script = tmp_path / 'busy.py'
+    script.write_text(
+        'import time\n'
+        'def busy():\n'
+        '    end = time.monotonic() + 0.3\n'
+        '    while time.monotonic() < end:\n'
+        '        pass\n'
+        'busy()\n'
+    )
+
+    result = _run_energy_measurement(
+        script, Language.python, None, False, 30, None, json_output=True, mode=MeasureMode.sampling
+    )
+
+    assert result['success']
+    names = [f['name'] for f in result['sampling']['functions']]
+    assert 'busy' in names
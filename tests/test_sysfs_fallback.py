@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the pure-Python RAPL sysfs fallback client
+"""
+
+import threading
+from array import array
+
+import pytest
+
+import codegreen_backend
+import codegreen_runtime
+import codegreen_sysfs
+from codegreen_runtime import SysfsEnergyClient
+
+
+def write_zone(root, entry, energy_uj, max_range_uj=1_000_000, name='package-0'):
+    zone = root / entry
+    zone.mkdir(exist_ok=True)
+    (zone / 'name').write_text(f'{name}\n')
+    (zone / 'energy_uj').write_text(f'{energy_uj}\n')
+    (zone / 'max_energy_range_uj').write_text(f'{max_range_uj}\n')
+
+
+@pytest.fixture
+def powercap(tmp_path):
+    write_zone(tmp_path, 'intel-rapl:0', 100)
+    write_zone(tmp_path, 'intel-rapl:1', 500, name='package-1')
+    # Part of package 0, a duplicate of it and the platform around both: none is summed
+    write_zone(tmp_path, 'intel-rapl:0:0', 50, name='core')
+    write_zone(tmp_path, 'intel-rapl-mmio:0', 100)
+    write_zone(tmp_path, 'intel-rapl:2', 900, name='psys')
+    return tmp_path
+
+
+def open_client(root, monkeypatch):
+    # Sample by hand only
+    monkeypatch.setattr(SysfsEnergyClient, 'start', lambda self: self.sample())
+    return SysfsEnergyClient.open(str(root))
+
+
+def test_sums_top_level_zones_and_handles_wraparound(powercap, monkeypatch):
+    client = open_client(powercap, monkeypatch)
+    assert [zone.name for zone in client.zones] == ['intel-rapl:0', 'intel-rapl:1']
+
+    write_zone(powercap, 'intel-rapl:0', 300_100)
+    write_zone(powercap, 'intel-rapl:1', 1_000, name='package-1')
+    write_zone(powercap, 'intel-rapl:2', 500_900, name='psys')
+    assert client.read_energy()[0] == pytest.approx(0.3005)
+
+    # Package 0 wraps at 1 J: 699_900 uJ up to the wrap, then 50_000
+    write_zone(powercap, 'intel-rapl:0', 50_000)
+    assert client.read_energy()[0] == pytest.approx(0.3005 + 0.7499)
+
+
+def test_missing_or_unreadable_root_gives_no_client(tmp_path):
+    assert SysfsEnergyClient.open(str(tmp_path / 'absent')) is None
+
+
+def test_checkpoints_are_interpolated_and_drained(powercap, monkeypatch):
+    client = open_client(powercap, monkeypatch)
+    client.count = 0
+    client.total_joules = 0.0
+    with client.lock:
+        client._append_sample(1000, 10.0)
+        client._append_sample(2000, 20.0)
+        client._append_sample(3000, 40.0)
+    region = client.intern_checkpoint('enter:parse:region')
+    records = array('Q', [1500, 7, 2500, region, 3500, 7])
+    client.mark_checkpoints_batch(records, 3, 42)
+
+    window_end, drained = client.drain_measurements(2600)
+
+    assert window_end == 2600
+    assert [(m['checkpoint_id'], m['joules']) for m in drained] == [
+        ('7#inv_1_t42', 15.0),
+        ('enter:parse:region#inv_1_t42', 30.0),
+    ]
+    assert drained[1]['watts'] == pytest.approx(1.5e7)
+    # Later checkpoints stay for the next window and keep counting invocations
+    assert client.carried == [(3500, 7, 42)]
+    monkeypatch.setattr(client, 'sample', lambda: None)
+    final = client.get_final_measurements()
+    assert [(m['checkpoint_id'], m['joules']) for m in final] == [('7#inv_2_t42', 40.0)]
+
+def test_threads_mark_into_their_own_lists(powercap, monkeypatch):
+    client = open_client(powercap, monkeypatch)
+    # Both workers alive at once, so their thread idents differ
+    barrier = threading.Barrier(2)
+
+    def work(numeric_id):
+        barrier.wait()
+        client.mark_checkpoint_id(numeric_id)
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in (1, 2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    client.mark_checkpoint_id(3)
+
+    assert sorted(client.thread_markers) == sorted([threading.get_ident()] + [w.ident for w in workers])
+    monkeypatch.setattr(client, 'sample', lambda: None)
+    final = client.get_final_measurements()
+    assert sorted(m['checkpoint_id'].partition('#')[0] for m in final[:2]) == ['1', '2']
+    assert final[2]['checkpoint_id'] == f'3#inv_1_t{threading.get_ident()}'
+
+
+def test_runtime_falls_back_without_native_library(powercap, monkeypatch):
+    monkeypatch.setattr(codegreen_backend, '_find_nemb_library', lambda: None)
+    monkeypatch.setattr(codegreen_sysfs, '_RAPL_ROOT', str(powercap))
+    monkeypatch.setattr(codegreen_runtime, '_nemb_client', None)
+    monkeypatch.setattr(SysfsEnergyClient, 'start', lambda self: self.sample())
+
+    assert isinstance(codegreen_runtime._get_nemb_client(), SysfsEnergyClient)
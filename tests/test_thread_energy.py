@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the runtime's thread table and the per-thread energy breakdown
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+import codegreen_tasks
+from src.cli.cli import _thread_energy, _thread_tags
+
+
+def checkpoint(name, thread, timestamp, joules, pid=10):
+    return {'checkpoint_id': f'{name}#inv_1_t{thread}', 'timestamp': timestamp, 'joules': joules, 'pid': pid}
+
+
+def test_thread_tags_are_parsed_in_order():
+    ids = ['enter:work:cp#inv_3_t140001', 'unresolved', '', 'exit:work:cp#inv_12_t7']
+    assert _thread_tags(ids) == ['140001', '', '', '7']
+    assert _thread_tags([]) == []
+
+
+def test_ended_threads_keep_their_name_and_cpu_time(monkeypatch):
+    monkeypatch.setattr(codegreen_tasks, '_threads', [])
+
+    def spin():
+        threading.current_thread().name = 'Renamed_0'
+        deadline = time.thread_time() + 0.02
+        while time.thread_time() < deadline:
+            pass
+
+    worker = threading.Thread(target=spin, name='Worker_0')
+    worker.start()
+    worker.join()
+
+    table = codegreen_tasks._thread_table()
+    ended = [entry for entry in table if entry['key'] == worker.ident and entry['native_id'] == worker.native_id]
+    assert len(ended) == 1
+    assert ended[0]['name'] == 'Renamed_0'
+    assert ended[0]['cpu_ns'] >= 20_000_000
+    # The calling thread is reported while it runs
+    assert any(entry['key'] == threading.get_ident() for entry in table)
+
+
+def test_energy_is_split_by_cpu_time_and_grouped_by_pool():
+    checkpoints = [
+        checkpoint('enter:main:cp', 1, 0, 0.0),
+        checkpoint('enter:fetch:cp', 2, 10, 1.0),
+        checkpoint('exit:fetch:cp', 2, 60, 6.0),
+        checkpoint('enter:fetch:cp', 3, 20, 2.0),
+        checkpoint('exit:fetch:cp', 3, 40, 4.0),
+        checkpoint('exit:main:cp', 1, 100, 10.0),
+    ]
+    threads = [
+        {'key': 1, 'name': 'MainThread', 'native_id': 100, 'cpu_ns': 2_000_000_000, 'pid': 10},
+        {'key': 2, 'name': 'ThreadPoolExecutor-0_0', 'native_id': 101, 'cpu_ns': 5_000_000_000, 'pid': 10},
+        {'key': 3, 'name': 'ThreadPoolExecutor-0_1', 'native_id': 102, 'cpu_ns': 2_000_000_000, 'pid': 10},
+        {'key': 0, 'name': 'nemb-coordinator', 'native_id': 103, 'cpu_ns': 1_000_000_000, 'pid': 10},
+    ]
+
+    result = _thread_energy(checkpoints, threads)
+
+    by_name = {t['thread']: t for t in result['threads']}
+    assert by_name['ThreadPoolExecutor-0_0']['joules'] == pytest.approx(5.0)
+    assert by_name['ThreadPoolExecutor-0_0']['span_joules'] == pytest.approx(5.0)
+    assert by_name['MainThread']['cpu_share'] == pytest.approx(0.2)
+    assert by_name['nemb-coordinator']['checkpoints'] == 0
+    assert sum(t['joules'] for t in result['threads']) == pytest.approx(10.0)
+    pool = result['pools'][0]
+    assert (pool['pool'], pool['threads'], pool['checkpoints']) == ('ThreadPoolExecutor-0', 2, 4)
+    assert pool['joules'] == pytest.approx(7.0)